@@ -1,9 +1,12 @@
 locals {
   online_store_namespace_name = "online-store"
 
-  online_store_directory_path            = "../../online_store"
-  online_store_docker_images_name_prefix = "${var.base_name}-online-store"
-  online_store_otel_directory_path       = "../../online_store/otel"
+  online_store_directory_path             = "../../online_store"
+  online_store_docker_images_name_prefix  = "${var.base_name}-online-store"
+  online_store_otel_directory_path        = "../../online_store/otel"
+  online_store_database_directory_path    = "../../online_store/database"
+  online_store_http_client_directory_path = "../../online_store/http_client"
+  online_store_faults_directory_path      = "../../online_store/faults"
 
   order_service_url   = "http://order.${local.online_store_namespace_name}.svc.cluster.local"
   user_service_url    = "http://user.${local.online_store_namespace_name}.svc.cluster.local"
@@ -16,8 +16,10 @@ resource "docker_image" "online_store_order" {
   }
 
   triggers = {
-    dir_sha1      = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_order_directory_path}/*") : filesha1(f)]))
-    dir_sha1_otel = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1             = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_order_directory_path}/*") : filesha1(f)]))
+    dir_sha1_otel        = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1_database    = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_database_directory_path}/*") : filesha1(f)]))
+    dir_sha1_http_client = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_http_client_directory_path}/*") : filesha1(f)]))
   }
 }
 
@@ -26,8 +28,10 @@ resource "docker_registry_image" "online_store_order" {
   keep_remotely = true
 
   triggers = {
-    dir_sha1      = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_order_directory_path}/*") : filesha1(f)]))
-    dir_sha1_otel = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1             = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_order_directory_path}/*") : filesha1(f)]))
+    dir_sha1_otel        = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1_database    = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_database_directory_path}/*") : filesha1(f)]))
+    dir_sha1_http_client = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_http_client_directory_path}/*") : filesha1(f)]))
   }
 }
 
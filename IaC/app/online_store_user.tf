@@ -16,8 +16,9 @@ resource "docker_image" "online_store_user" {
   }
 
   triggers = {
-    dir_sha1      = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_user_directory_path}/*") : filesha1(f)]))
-    dir_sha1_otel = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1          = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_user_directory_path}/*") : filesha1(f)]))
+    dir_sha1_otel     = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1_database = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_database_directory_path}/*") : filesha1(f)]))
   }
 }
 
@@ -26,8 +27,9 @@ resource "docker_registry_image" "online_store_user" {
   keep_remotely = true
 
   triggers = {
-    dir_sha1      = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_user_directory_path}/*") : filesha1(f)]))
-    dir_sha1_otel = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1          = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_user_directory_path}/*") : filesha1(f)]))
+    dir_sha1_otel     = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_otel_directory_path}/*") : filesha1(f)]))
+    dir_sha1_database = sha1(join("", [for f in fileset(path.cwd, "${local.online_store_database_directory_path}/*") : filesha1(f)]))
   }
 }
 
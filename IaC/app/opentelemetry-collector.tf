@@ -43,7 +43,9 @@ resource "local_file" "otel_collector_config" {
     kusto_database    = "observabilitydb",
     application_id  = azuread_service_principal.otel.client_id,
     application_key = azuread_service_principal_password.otel.value,
-    tenant_id       = data.azuread_client_config.current.tenant_id
+    tenant_id       = data.azuread_client_config.current.tenant_id,
+    trace_sampling_percentage = var.trace_sampling_percentage,
+    trace_slow_threshold_ms   = var.trace_slow_threshold_ms
   })
 }
 
@@ -31,3 +31,15 @@ variable "is_fabric" {
   type        = bool
   default     = false
 }
+
+variable "trace_sampling_percentage" {
+  description = "Percentage of the traces that neither failed nor were slow kept by the OTEL Collector tail sampling."
+  type        = number
+  default     = 100
+}
+
+variable "trace_slow_threshold_ms" {
+  description = "Traces taking at least this many milliseconds are always kept by the OTEL Collector tail sampling."
+  type        = number
+  default     = 1000
+}
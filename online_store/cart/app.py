@@ -1,13 +1,31 @@
 import os
 import sqlite3
-from fastapi import FastAPI, HTTPException, Request
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 import uvicorn
 from online_store.otel.otel import configure_telemetry, trace_span
+from online_store.database.pool import ConnectionPool
+from online_store.database.bootstrap import bootstrap_database
+from online_store.database.executor import DatabaseExecutor, executor_workers_from_env
+from online_store.database.idempotency import (
+    MAX_KEY_LENGTH, IdempotencyKeyReusedError, IdempotencyStore, create_idempotency_table, request_fingerprint
+)
+from online_store.http_client.client import ServiceClient
+from online_store.cart.reaper import REAPER_ENABLED, CartReaper
 
 SERVICE_VERSION = "1.0.0"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    if REAPER_ENABLED:
+        cart_reaper.start()
+    yield
+    await cart_reaper.stop()
+    await product_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 instruments = configure_telemetry(app, "Cart Service", SERVICE_VERSION)
 
 # Get instruments
@@ -24,6 +42,24 @@ request_counter = meter.create_counter(
 
 DATABASE = os.path.join(os.getcwd(), 'online_store/db/online_store.db')
 print(f"DB=={DATABASE}")
+db_pool = ConnectionPool(DATABASE, "cart", meter=meter)
+# Async handlers run their database work here instead of on the event loop.
+db_executor = DatabaseExecutor("cart", meter=meter, max_workers=executor_workers_from_env("cart"))
+# Responses of POST /cart by Idempotency-Key, so retried requests add an item only once.
+add_item_idempotency = IdempotencyStore(db_pool, "POST /cart")
+
+# Most operations accepted by one PATCH /cart request.
+MAX_BATCH_SIZE = 1000
+
+PRODUCT_SERVICE_URL = os.environ.get("PRODUCT_SERVICE_URL", "http://127.0.0.1:5001")
+product_client = ServiceClient("product", PRODUCT_SERVICE_URL, meter=meter)
+# Deletes abandoned carts and returns their stock, see reaper.py.
+cart_reaper = CartReaper(db_pool, db_executor, product_client, logger, meter=meter)
+
+# Served from idx_cart_items_user alone, see init_db().
+CART_ITEMS_BY_USER_QUERY = '''
+    SELECT id, user_id, product_id, product_name, quantity FROM cart_items WHERE user_id = ?
+'''
 
 @trace_span("init_db for Cart Service", tracer)
 def init_db():
@@ -36,51 +72,103 @@ def init_db():
       - product_id: identifier for the product added to the cart
       - product_name: name of the product
       - quantity: number of units for the product
+      - created_at, updated_at: when the item was added and last changed, in seconds since the epoch
     """
     db_dir = os.path.dirname(DATABASE)
     if not os.path.exists(db_dir):
         raise Exception(f"Database directory {db_dir} does not exist. Try running the service from the project root folder.")
 
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('''
-                CREATE TABLE IF NOT EXISTS cart_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                product_id TEXT NOT NULL,
-                product_name TEXT NOT NULL,
-                quantity INTEGER NOT NULL
-            )''')
-        conn.commit()
+        journal_mode = bootstrap_database(db_pool)
+        logger.info("Database journal mode: %s", journal_mode)
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS cart_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    product_name TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    created_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0),
+                    updated_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+                )''')
+            add_cart_item_timestamps(conn)
+            # Covering index for listing a user's cart, so the lookup reads only that user's
+            # entries instead of scanning the carts of all users.
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_cart_items_user
+                ON cart_items (user_id, product_id, product_name, quantity)
+            ''')
+            # Finds abandoned carts for the reaper; user_id makes it cover its "recently
+            # active users" subquery.
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cart_items_updated_at ON cart_items (updated_at, user_id)')
+            create_idempotency_table(conn)
+            conn.commit()
+        merged = db_pool.run_write(make_cart_items_unique)
+        if merged:
+            logger.info("Merged %d duplicate cart items", merged)
     except sqlite3.Error as e:
-        conn.close()
         logger.error("Error initializing database: %s", e)
         raise HTTPException(status_code=500, detail="Cart database initialization failed") from e
-    finally:
-        conn.close()
 
-@trace_span("list_cart_items", tracer)
+def add_cart_item_timestamps(conn):
+    """
+    Add the created_at and updated_at columns to a cart_items table created without them.
+    Existing items are stamped with the current time, so they expire one TTL from now.
+    """
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(cart_items)")}
+    if 'updated_at' in columns:
+        return
+    # ALTER TABLE only accepts constant defaults.
+    conn.execute("ALTER TABLE cart_items ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE cart_items ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+    now = time.time()
+    conn.execute("UPDATE cart_items SET created_at = ?, updated_at = ?", (now, now))
+    conn.commit()
+
+def make_cart_items_unique(conn):
+    """
+    Create the unique (user_id, product_id) index that adding to the cart upserts on.
+    Carts created before it may hold several rows for the same product; these are first
+    merged into the oldest row, which keeps the summed quantity.
+    Returns the number of rows merged away, 0 once the index exists.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_cart_items_user_product'").fetchone()
+    if exists:
+        return 0
+    conn.execute('''
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(duplicate.quantity) FROM cart_items duplicate
+            WHERE duplicate.user_id = cart_items.user_id AND duplicate.product_id = cart_items.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    ''')
+    merged = conn.execute('''
+        DELETE FROM cart_items
+        WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)
+    ''').rowcount
+    conn.execute('CREATE UNIQUE INDEX uq_cart_items_user_product ON cart_items (user_id, product_id)')
+    return merged
+
 @app.get("/cart")
+@trace_span("list_cart_items", tracer, attributes={"cart.user_id": "userId"})
 def list_cart_items(userId: str = None):
     """
     ListCartItems API.
     Returns a list of cart items in JSON format.
     You can filter items by providing a query parameter 'userId'.
     """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    if userId:
-        cursor.execute('''
-            SELECT id, user_id, product_id, product_name, quantity FROM cart_items WHERE user_id = ?
-        ''', (userId,))
-    else:
-        cursor.execute('''
-            SELECT id, user_id, product_id, product_name, quantity FROM cart_items
-        ''')
-    rows = cursor.fetchall()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        if userId:
+            cursor.execute(CART_ITEMS_BY_USER_QUERY, (userId,))
+        else:
+            cursor.execute('''
+                SELECT id, user_id, product_id, product_name, quantity FROM cart_items
+            ''')
+        rows = cursor.fetchall()
 
     cart_items = []
     for row in rows:
@@ -98,12 +186,23 @@ async def add_cart_item(request: Request):
     """
     AddCartItem API.
     Expects a JSON payload with: userId, productId, productName, and quantity.
+    A cart holds one item per product: adding a product that is already in the cart adds
+    to the quantity of the existing item. Returns the id and the new quantity of the item.
     This endpoint calls the Product service's RemoveProductFromStock method.
     RemoveProductFromStock will attempt to decrease the product's stock by the required quantity.
     If the product doesn't have the required quantity in stock, it returns an error.
+    Requests with an Idempotency-Key header are applied once; repeating the request with
+    the same key returns the original response with an Idempotent-Replayed header.
     """
     request_counter.add(1, attributes={"route": "/cart", "method": "POST" })
     
+    idempotency_key = request.headers.get("idempotency-key")
+    fingerprint = request_fingerprint(await request.body())
+    if idempotency_key is not None:
+        replayed = await replay_add_cart_item(idempotency_key, fingerprint)
+        if replayed is not None:
+            return replayed
+
     data = await request.json()
     user_id = data.get('userId')
     product_id = data.get('productId')
@@ -123,22 +222,51 @@ async def add_cart_item(request: Request):
         if not all([user_id, product_id, quantity]):
             raise HTTPException(status_code=400, detail="Missing required fields")
 
-        conn = sqlite3.connect(DATABASE)
+        content = {'message': 'Cart item added successfully'}
+        def insert_cart_item(conn):
+            now = time.time()
+            row = conn.execute('''
+                INSERT INTO cart_items (user_id, product_id, product_name, quantity, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, product_id)
+                DO UPDATE SET quantity = quantity + excluded.quantity, product_name = excluded.product_name,
+                              updated_at = excluded.updated_at
+                RETURNING id, quantity
+            ''', (user_id, product_id, product_name, quantity, now, now)).fetchone()
+            content['id'] = row['id']
+            content['quantity'] = row['quantity']
+            if idempotency_key is not None:
+                add_item_idempotency.save(conn, idempotency_key, fingerprint, 201, content)
+
         try:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO cart_items (user_id, product_id, product_name, quantity)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, product_id, product_name, quantity))
-            conn.commit()
+            await db_executor.run(db_pool.run_write, insert_cart_item)
+        except sqlite3.IntegrityError as e:
+            # A concurrent request with the same key committed first, replay its response.
+            if idempotency_key is not None:
+                replayed = await replay_add_cart_item(idempotency_key, fingerprint)
+                if replayed is not None:
+                    return replayed
+            logger.error(f"Error adding item to cart: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to add item to cart: {str(e)}")
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error adding item to cart: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to add item to cart: {str(e)}")
-        finally:
-            conn.close()
 
-        return JSONResponse(content={'message': 'Cart item added successfully'}, status_code=201)
+        return JSONResponse(content=content, status_code=201)
+
+async def replay_add_cart_item(idempotency_key, fingerprint):
+    """Return the stored response of an earlier POST /cart with the same key, or None."""
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    try:
+        stored = await db_executor.run(add_item_idempotency.find, idempotency_key, fingerprint)
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if stored is None:
+        return None
+    logger.info(f"Replaying response for Idempotency-Key {idempotency_key}")
+    return JSONResponse(content=stored.content, status_code=stored.status_code,
+                        headers={"Idempotent-Replayed": "true"})
 
 @app.put("/cart/{item_id}")
 async def update_cart_item(item_id: int, request: Request):
@@ -154,20 +282,97 @@ async def update_cart_item(item_id: int, request: Request):
             raise HTTPException(status_code=400, detail="Missing quantity field")
         
         logger.info(f"Updating item in cart: {item_id}, {quantity}")
-        conn = sqlite3.connect(DATABASE)
+        def set_quantity(conn):
+            conn.execute('UPDATE cart_items SET quantity = ?, updated_at = ? WHERE id = ?',
+                         (quantity, time.time(), item_id))
+
         try:
-            cursor = conn.cursor()
-            cursor.execute('UPDATE cart_items SET quantity = ? WHERE id = ?', (quantity, item_id))
-            conn.commit()
+            await db_executor.run(db_pool.run_write, set_quantity)
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error updating cart item: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to update cart item: {str(e)}")
-        finally:
-            conn.close()
 
         return JSONResponse(content={'message': 'Cart item updated successfully'}, status_code=200)
 
+@app.patch("/cart")
+async def update_cart_items(request: Request):
+    """
+    UpdateCartItems API.
+    Expects a JSON list of operations on cart items, each either
+    {"id": <item id>, "quantity": <new quantity>} or {"id": <item id>, "delete": true}.
+    All operations are applied in one transaction: if any item does not exist or any
+    operation is invalid, nothing is changed and the error names the failing operation.
+    Returns the number of updated and deleted items.
+    """
+    with tracer.start_as_current_span("update_cart_items") as span:
+        ops = await request.json()
+        if not isinstance(ops, list) or not ops:
+            raise HTTPException(status_code=400, detail="Expected a non-empty list of cart item operations")
+        if len(ops) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} operations per request")
+        span.set_attribute("cart.batch_size", len(ops))
+
+        updates, deletes = [], []
+        for index, op in enumerate(ops):
+            # JSON true and false are ints to isinstance, they are not valid ids or quantities.
+            if not isinstance(op, dict) or not isinstance(op.get('id'), int) or isinstance(op['id'], bool):
+                raise HTTPException(status_code=400, detail=f"Op {index}: missing or invalid id")
+            if op.get('delete'):
+                deletes.append((index, op['id']))
+                continue
+            quantity = op.get('quantity')
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+                raise HTTPException(status_code=400, detail=f"Op {index}: quantity must be a positive integer")
+            updates.append((index, op['id'], quantity))
+
+        logger.info(f"Updating cart items: {len(updates)} updates, {len(deletes)} deletes")
+        def apply_ops(conn):
+            now = time.time()
+            # One statement per op to tell which item is missing; they still commit together.
+            for index, item_id, quantity in updates:
+                cursor = conn.execute('UPDATE cart_items SET quantity = ?, updated_at = ? WHERE id = ?',
+                                      (quantity, now, item_id))
+                if cursor.rowcount == 0:
+                    raise HTTPException(status_code=404, detail=f"Op {index}: cart item {item_id} not found")
+            for index, item_id in deletes:
+                cursor = conn.execute('DELETE FROM cart_items WHERE id = ?', (item_id,))
+                if cursor.rowcount == 0:
+                    raise HTTPException(status_code=404, detail=f"Op {index}: cart item {item_id} not found")
+
+        try:
+            await db_executor.run(db_pool.run_write, apply_ops)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error updating cart items: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to update cart items: {str(e)}")
+
+        return JSONResponse(content={'updated': len(updates), 'deleted': len(deletes)}, status_code=200)
+
+@app.delete("/cart")
+async def clear_cart(userId: str = Query(..., description="User ID")):
+    """
+    ClearCart API.
+    Deletes all items in the cart of the given user and returns how many were deleted.
+    """
+    with tracer.start_as_current_span("clear_cart") as span:
+        span.set_attribute("user.id", userId)
+        if not userId:
+            raise HTTPException(status_code=400, detail="User ID is required")
+
+        logger.info(f"Clearing cart of user: {userId}")
+        def remove_cart_items(conn):
+            return conn.execute('DELETE FROM cart_items WHERE user_id = ?', (userId,)).rowcount
+
+        try:
+            deleted = await db_executor.run(db_pool.run_write, remove_cart_items)
+        except Exception as e:
+            logger.error(f"Error clearing cart: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to clear cart: {str(e)}")
+        span.set_attribute("cart.deleted_items", deleted)
+
+        return JSONResponse(content={'message': 'Cart cleared successfully', 'deleted': deleted}, status_code=200)
+
 @app.delete("/cart/{item_id}")
 def delete_cart_item(item_id: int):
     """
@@ -178,17 +383,14 @@ def delete_cart_item(item_id: int):
         span.set_attribute("item.id", item_id)
 
         logger.info(f"Deleting item from cart: {item_id}")
+        def remove_cart_item(conn):
+            conn.execute('DELETE FROM cart_items WHERE id = ?', (item_id,))
+
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM cart_items WHERE id = ?', (item_id,))
-            conn.commit()
+            db_pool.run_write(remove_cart_item)
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error deleting cart item: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to delete cart item: {str(e)}")
-        finally:
-            conn.close()
             
         return JSONResponse(content={'message': 'Cart item deleted successfully'}, status_code=200)
 
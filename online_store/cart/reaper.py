@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+import httpx
+
+# Carts untouched for this long are abandoned; their items are deleted and the
+# reserved stock is returned to the Product Service.
+CART_TTL = float(os.environ.get("CART_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+REAPER_ENABLED = os.environ.get("CART_REAPER_ENABLED", "true").lower() == "true"
+REAPER_INTERVAL = float(os.environ.get("CART_REAPER_INTERVAL_SECONDS", "300"))
+REAPER_BATCH_SIZE = int(os.environ.get("CART_REAPER_BATCH_SIZE", "100"))
+# Bounds the work of one run, the remaining carts are reaped by the next runs.
+REAPER_MAX_BATCHES_PER_RUN = int(os.environ.get("CART_REAPER_MAX_BATCHES_PER_RUN", "10"))
+
+
+def claim_expired_items(conn, cutoff, batch_size):
+    """
+    Delete up to batch_size items of carts whose every item is older than cutoff,
+    oldest first, and return them. Items of a cart touched since cutoff are kept.
+    """
+    return conn.execute('''
+        DELETE FROM cart_items WHERE id IN (
+            SELECT id FROM cart_items
+            WHERE updated_at < ?
+              AND user_id NOT IN (SELECT user_id FROM cart_items WHERE updated_at >= ?)
+            ORDER BY updated_at
+            LIMIT ?
+        )
+        RETURNING id, user_id, product_id, product_name, quantity, created_at, updated_at
+    ''', (cutoff, cutoff, batch_size)).fetchall()
+
+
+def restore_items(conn, items):
+    """Put claimed items back, merging into items the user added again since."""
+    conn.executemany('''
+        INSERT INTO cart_items (id, user_id, product_id, product_name, quantity, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+    ''', [(item['id'], item['user_id'], item['product_id'], item['product_name'], item['quantity'],
+           item['created_at'], item['updated_at']) for item in items])
+
+
+class CartReaper:
+    """
+    Background task deleting abandoned carts in small batches.
+    Each batch is claimed by deleting it in one transaction, so concurrent reapers (one
+    per replica) never return the same stock twice, and the stock of the whole batch is
+    then returned with a single batch stock update. If that is rejected, stock is returned
+    product by product instead, skipping products that no longer exist; items whose stock
+    could not be returned are restored and retried by a later run.
+    """
+
+    def __init__(self, db_pool, db_executor, product_client, logger, meter=None,
+                 ttl: float = CART_TTL, interval: float = REAPER_INTERVAL, batch_size: int = REAPER_BATCH_SIZE,
+                 max_batches_per_run: int = REAPER_MAX_BATCHES_PER_RUN):
+        self.db_pool = db_pool
+        self.db_executor = db_executor
+        self.product_client = product_client
+        self.logger = logger
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches_per_run = max_batches_per_run
+        self._task = None
+        self._stopping = None
+
+        self._reaped_counter = None
+        self._run_histogram = None
+        self._failure_counter = None
+        if meter is not None:
+            self._reaped_counter = meter.create_counter(
+                name="cart_items_reaped_total",
+                description="Total number of items of abandoned carts deleted by the cart reaper",
+                unit="1"
+            )
+            self._run_histogram = meter.create_histogram(
+                name="cart_reaper_items_per_run",
+                description="Number of abandoned cart items deleted per cart reaper run",
+                unit="1"
+            )
+            self._failure_counter = meter.create_counter(
+                name="cart_reaper_failures_total",
+                description="Total number of cart reaper batches restored because returning their stock failed",
+                unit="1"
+            )
+
+    async def _return_stock(self, items) -> list:
+        """Return the stock held by the items, returns the items whose stock was not returned."""
+        by_product = {}
+        for item in items:
+            by_product.setdefault((item['product_id'], item['product_name']), []).append(item)
+        changes = [{'productId': product_id, 'productName': product_name,
+                    'qty_change': sum(item['quantity'] for item in product_items)}
+                   for (product_id, product_name), product_items in by_product.items()]
+        try:
+            response = await self.product_client.post("/products/update_stock/batch", json=changes)
+        except httpx.HTTPError as e:
+            self.logger.error("Returning stock of reaped cart items failed: %r", e)
+            return items
+        if response.status_code == 200:
+            return []
+
+        # The batch is all-or-nothing, find out which products it failed for.
+        self.logger.warning("Batch stock return for reaped cart items failed (%d), returning per product",
+                            response.status_code)
+        failed = []
+        for change, product_items in zip(changes, by_product.values()):
+            try:
+                response = await self.product_client.post("/products/update_stock", json=change)
+            except httpx.HTTPError as e:
+                self.logger.error("Returning stock of product %s failed: %r", change['productId'], e)
+                failed.extend(product_items)
+                continue
+            if response.status_code == 404:
+                self.logger.warning("Product %s no longer exists, dropping its reaped cart items", change['productId'])
+            elif response.status_code != 200:
+                self.logger.error("Returning stock of product %s failed: %s", change['productId'], response.text)
+                failed.extend(product_items)
+        return failed
+
+    async def reap_batch(self, cutoff) -> int:
+        """Reap one batch of items last updated before cutoff, returns the number reaped."""
+        items = await self.db_executor.run(self.db_pool.run_write, claim_expired_items, cutoff, self.batch_size)
+        if not items:
+            return 0
+        failed = await self._return_stock(items)
+        if failed:
+            if self._failure_counter is not None:
+                self._failure_counter.add(1)
+            await self.db_executor.run(self.db_pool.run_write, restore_items, failed)
+            raise RuntimeError(f"Stock of {len(failed)} reaped cart items could not be returned, restored them")
+        return len(items)
+
+    async def reap_once(self) -> int:
+        """Run one reaper pass, returns the number of items reaped."""
+        cutoff = time.time() - self.ttl
+        reaped = 0
+        try:
+            for _ in range(self.max_batches_per_run):
+                batch = await self.reap_batch(cutoff)
+                reaped += batch
+                if batch < self.batch_size:
+                    break
+        finally:
+            if reaped:
+                self.logger.info("Reaped %d items of abandoned carts", reaped)
+            if self._reaped_counter is not None:
+                self._reaped_counter.add(reaped)
+                self._run_histogram.record(reaped)
+        return reaped
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.reap_once()
+            except Exception as e:
+                self.logger.error("Cart reaper run failed: %s", e, exc_info=True)
+
+    def start(self):
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the reaper, letting a running pass finish so no claimed batch is lost."""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
@@ -0,0 +1,23 @@
+import os
+
+# The services of a deployment share the database file over a network volume (Azure Files)
+# from different hosts, where only the rollback journal is safe, so DELETE is the default.
+# WAL lets readers run concurrently with a writer, but relies on shared memory between the
+# processes using the database: set it for local runs, where all services share one host.
+JOURNAL_MODE = os.environ.get("ONLINE_STORE_DB_JOURNAL_MODE", "DELETE")
+# Pages written to the WAL before it is checkpointed back into the database file.
+WAL_AUTOCHECKPOINT = int(os.environ.get("ONLINE_STORE_DB_WAL_AUTOCHECKPOINT", "1000"))
+
+
+def bootstrap_database(db_pool, journal_mode: str = JOURNAL_MODE) -> str:
+    """
+    Apply the database-wide settings shared by all services using the file.
+    Must be called from every service's init_db() before its schema is created.
+    Returns the journal mode reported by SQLite, which may differ from the requested
+    one if the file system does not support it.
+    """
+    with db_pool.connection() as conn:
+        applied_mode = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+        if applied_mode.lower() == "wal":
+            conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT}")
+    return applied_mode
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+import weakref
+from collections import namedtuple
+
+# An immutable view of the cached collection: the items keyed by their id, the
+# pre-serialized JSON body served to clients and its strong ETag.
+Snapshot = namedtuple("Snapshot", ["version", "items", "body", "etag"])
+
+
+def serialize_json(content) -> bytes:
+    """Serialize content exactly like FastAPI's JSONResponse does."""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def compute_etag(body: bytes) -> str:
+    """Return a strong ETag for a response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+# The caches of a service share one lookup counter per meter, labelled with the cache name.
+_lookup_counters = weakref.WeakKeyDictionary()
+_lookup_counters_lock = threading.Lock()
+
+
+def _lookup_counter(meter):
+    with _lookup_counters_lock:
+        counter = _lookup_counters.get(meter)
+        if counter is None:
+            counter = meter.create_counter(
+                name="cache_lookups_total",
+                description="Total number of cache lookups, labelled with the lookup result",
+                unit="1"
+            )
+            _lookup_counters[meter] = counter
+        return counter
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Return True if an If-None-Match header value matches the given ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison, so W/"x" matches "x".
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class SnapshotCache:
+    """
+    A process-local, thread-safe cache of a collection read from the database.
+    Items are keyed by key_field and the whole collection is serialized once per
+    version, so unchanged reads are served without touching SQLite or re-encoding JSON.
+    Writers call invalidate() after committing; a load that raced with an invalidation
+    is returned to its caller but never stored.
+    """
+
+    def __init__(self, name: str, key_field: str, meter=None):
+        self.name = name
+        self.key_field = key_field
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot = None
+        self._attributes = {"cache.name": name}
+
+        self._lookup_counter = _lookup_counter(meter) if meter is not None else None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _count(self, result: str):
+        if self._lookup_counter is not None:
+            self._lookup_counter.add(1, attributes={**self._attributes, "cache.result": result})
+
+    def get(self):
+        """Return the current snapshot, or None if it must be (re)loaded."""
+        snapshot = self._snapshot
+        self._count("hit" if snapshot is not None else "miss")
+        return snapshot
+
+    def load(self, loader) -> Snapshot:
+        """
+        Build a snapshot from loader(), a callable returning the list of items,
+        and store it unless the cache was invalidated while loading.
+        """
+        with self._lock:
+            version = self._version
+        items = loader()
+        body = serialize_json(items)
+        snapshot = Snapshot(
+            version=version,
+            items={item[self.key_field]: item for item in items},
+            body=body,
+            etag=compute_etag(body),
+        )
+        with self._lock:
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        """Drop the cached snapshot after the underlying data changed."""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from online_store.database.pool import DEFAULT_POOL_SIZE
+
+
+def executor_workers_from_env(service: str, default: int = DEFAULT_POOL_SIZE) -> int:
+    """Read the executor size for a service from <SERVICE>_DB_EXECUTOR_WORKERS."""
+    return int(os.environ.get(f"{service.upper()}_DB_EXECUTOR_WORKERS", str(default)))
+
+
+class DatabaseExecutor:
+    """
+    Runs blocking SQLite work from async handlers on a dedicated, bounded thread pool
+    so a slow query does not stall the event loop. The current OpenTelemetry context is
+    carried into the worker thread so database spans stay parented to the request span.
+    """
+
+    def __init__(self, name: str, meter=None, max_workers: int = DEFAULT_POOL_SIZE):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-db")
+        self._attributes = {"db.executor.name": name}
+
+        self._queue_depth_counter = None
+        self._queue_wait_histogram = None
+        if meter is not None:
+            self._queue_depth_counter = meter.create_up_down_counter(
+                name="db_executor_queue_depth",
+                description="Number of database calls waiting for a free executor thread",
+                unit="1"
+            )
+            self._queue_wait_histogram = meter.create_histogram(
+                name="db_executor_queue_wait_duration_seconds",
+                description="Time database calls spend queued before an executor thread picks them up",
+                unit="s"
+            )
+
+    def _call(self, submitted_at, func, args, kwargs):
+        if self._queue_depth_counter is not None:
+            self._queue_depth_counter.add(-1, attributes=self._attributes)
+            self._queue_wait_histogram.record(time.perf_counter() - submitted_at, attributes=self._attributes)
+        return func(*args, **kwargs)
+
+    def _on_done(self, future):
+        # A call cancelled while still queued never reaches _call.
+        if future.cancelled() and self._queue_depth_counter is not None:
+            self._queue_depth_counter.add(-1, attributes=self._attributes)
+
+    async def run(self, func, *args, **kwargs):
+        """Await func(*args, **kwargs) executed on the database executor."""
+        context = contextvars.copy_context()
+        if self._queue_depth_counter is not None:
+            self._queue_depth_counter.add(1, attributes=self._attributes)
+        future = self._executor.submit(context.run, self._call, time.perf_counter(), func, args, kwargs)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+# How long a stored response is replayed for a repeated Idempotency-Key.
+IDEMPOTENCY_TTL = float(os.environ.get("ONLINE_STORE_IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+# Expired keys are deleted by the writers, at most this often and this many at a time.
+COMPACTION_INTERVAL = float(os.environ.get("ONLINE_STORE_IDEMPOTENCY_COMPACTION_INTERVAL", "60"))
+COMPACTION_BATCH_SIZE = int(os.environ.get("ONLINE_STORE_IDEMPOTENCY_COMPACTION_BATCH_SIZE", "500"))
+MAX_KEY_LENGTH = 255
+
+StoredResponse = namedtuple("StoredResponse", ["status_code", "content"])
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when an Idempotency-Key is replayed with a different request body."""
+
+
+def request_fingerprint(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def create_idempotency_table(conn):
+    """Create the idempotency_keys table shared by all services. Call from init_db()."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (scope, key)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expiry ON idempotency_keys (scope, created_at)')
+
+
+class IdempotencyStore:
+    """
+    Remembers the successful responses of a write endpoint by Idempotency-Key, so a
+    retried request gets the original response instead of repeating the write.
+    save() must run in the same transaction as the write it records: a concurrent
+    duplicate then fails on the primary key and rolls back its own write.
+    """
+
+    def __init__(self, db_pool, scope: str, ttl: float = IDEMPOTENCY_TTL):
+        self.db_pool = db_pool
+        self.scope = scope
+        self.ttl = ttl
+        self._next_compaction = 0.0
+
+    def find(self, key: str, fingerprint: str):
+        """
+        Return the StoredResponse for the key, or None if it was not used recently.
+        Raises IdempotencyKeyReusedError if the key was used for a different request.
+        """
+        with self.db_pool.connection() as conn:
+            row = conn.execute('''
+                SELECT fingerprint, status_code, response FROM idempotency_keys
+                WHERE scope = ? AND key = ? AND created_at >= ?
+            ''', (self.scope, key, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        if row['fingerprint'] != fingerprint:
+            raise IdempotencyKeyReusedError(f"Idempotency-Key {key} was already used for a different request")
+        return StoredResponse(row['status_code'], json.loads(row['response']))
+
+    def save(self, conn, key: str, fingerprint: str, status_code: int, content):
+        """
+        Record the response for the key on the connection of the write transaction.
+        Raises sqlite3.IntegrityError if a concurrent request with the same key committed first.
+        """
+        now = time.time()
+        # An expired record for the key may not have been compacted yet.
+        conn.execute('DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND created_at < ?',
+                     (self.scope, key, now - self.ttl))
+        conn.execute('''
+            INSERT INTO idempotency_keys (scope, key, fingerprint, status_code, response, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (self.scope, key, fingerprint, status_code, json.dumps(content), now))
+        if now >= self._next_compaction:
+            self._next_compaction = now + COMPACTION_INTERVAL
+            self.compact(conn, now)
+
+    def compact(self, conn, now: float = None) -> int:
+        """Delete one batch of expired keys of this scope, returns the number deleted."""
+        cutoff = (now or time.time()) - self.ttl
+        return conn.execute('''
+            DELETE FROM idempotency_keys WHERE rowid IN (
+                SELECT rowid FROM idempotency_keys WHERE scope = ? AND created_at < ? LIMIT ?
+            )
+        ''', (self.scope, cutoff, COMPACTION_BATCH_SIZE)).rowcount
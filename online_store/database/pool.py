@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from online_store.database.bootstrap import JOURNAL_MODE
+from online_store.database.retry import WriteRetryPolicy
+
+# Pool sizing can be tuned per deployment without touching the services.
+DEFAULT_POOL_SIZE = int(os.environ.get("ONLINE_STORE_DB_POOL_SIZE", "5"))
+DEFAULT_POOL_TIMEOUT = float(os.environ.get("ONLINE_STORE_DB_POOL_TIMEOUT", "30"))
+DEFAULT_STATEMENT_CACHE_SIZE = int(os.environ.get("ONLINE_STORE_DB_STATEMENT_CACHE_SIZE", "128"))
+
+# Per-connection pragmas applied once when a pooled connection is opened.
+# The journal mode is a database-wide setting and is applied by bootstrap_database().
+DEFAULT_PRAGMAS = {
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    # NORMAL is durable in WAL mode except for the last transactions on power loss,
+    # the rollback journal needs FULL not to risk corrupting the database.
+    "synchronous": os.environ.get("ONLINE_STORE_DB_SYNCHRONOUS", "NORMAL" if JOURNAL_MODE.upper() == "WAL" else "FULL"),
+    # Milliseconds a connection waits on a locked database before failing with "database is locked".
+    "busy_timeout": int(os.environ.get("ONLINE_STORE_DB_BUSY_TIMEOUT_MS", "5000")),
+    # Negative values are in KiB, so this is a 16 MiB page cache per connection.
+    "cache_size": int(os.environ.get("ONLINE_STORE_DB_CACHE_SIZE", "-16384")),
+    # Memory-mapped I/O is unsafe on network volumes, so it is off unless set, e.g. to 134217728
+    # (128 MiB) for local runs in WAL mode.
+    "mmap_size": int(os.environ.get("ONLINE_STORE_DB_MMAP_SIZE", "0")),
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of SQLite connections.
+    Connections are opened lazily up to max_size, configured with the given pragmas
+    and reuse sqlite3's per-connection prepared statement cache across requests.
+    Writes issued through run_write() are retried according to retry_policy when
+    the database is locked by another writer.
+    """
+
+    def __init__(self, database: str, name: str, meter=None, max_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_POOL_TIMEOUT, statement_cache_size: int = DEFAULT_STATEMENT_CACHE_SIZE,
+                 pragmas: dict = None, retry_policy: WriteRetryPolicy = None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.database = database
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.retry_policy = retry_policy or WriteRetryPolicy(name=name, meter=meter)
+
+        # The semaphore bounds checked out connections, idle ones are reused most recent first.
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._attributes = {"db.pool.name": name}
+
+        self._wait_histogram = None
+        self._checkout_counter = None
+        self._in_use_counter = None
+        if meter is not None:
+            self._wait_histogram = meter.create_histogram(
+                name="db_pool_wait_duration_seconds",
+                description="Time spent waiting to check out a pooled database connection",
+                unit="s"
+            )
+            self._checkout_counter = meter.create_counter(
+                name="db_pool_checkouts_total",
+                description="Total number of pooled database connection checkouts",
+                unit="1"
+            )
+            self._in_use_counter = meter.create_up_down_counter(
+                name="db_pool_connections_in_use",
+                description="Number of pooled database connections currently checked out",
+                unit="1"
+            )
+
+    def _open(self):
+        # Looked up on the module at call time so the sqlite3 auto-instrumentation applies.
+        # Implicit transactions are IMMEDIATE as well, so a writer waits on busy_timeout
+        # at BEGIN instead of failing when upgrading a stale read snapshot.
+        conn = sqlite3.connect(
+            self.database,
+            check_same_thread=False,
+            isolation_level="IMMEDIATE",
+            cached_statements=self.statement_cache_size
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(
+                f"Timed out after {self.timeout}s waiting for a connection from pool {self.name}"
+            )
+        try:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError(f"Connection pool {self.name} is closed")
+                if self._idle:
+                    return self._idle.pop()
+            return self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        except sqlite3.Error:
+            # The connection is no longer usable, drop it so a fresh one gets opened.
+            pass
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the with-block.
+        Any transaction left open (e.g. after an exception) is rolled back before
+        the connection is returned to the pool.
+        """
+        start_time = time.perf_counter()
+        conn = self._acquire()
+        if self._wait_histogram is not None:
+            self._wait_histogram.record(time.perf_counter() - start_time, attributes=self._attributes)
+            self._checkout_counter.add(1, attributes=self._attributes)
+            self._in_use_counter.add(1, attributes=self._attributes)
+        try:
+            yield conn
+        finally:
+            if self._in_use_counter is not None:
+                self._in_use_counter.add(-1, attributes=self._attributes)
+            self._release(conn)
+
+    def run_write(self, func, *args, **kwargs):
+        """
+        Run func(conn, *args, **kwargs) in a single write transaction and commit it.
+        The transaction starts before func runs, so reads made by func are consistent
+        with its writes. The whole transaction is retried with backoff while the
+        database is locked, so func must not have side effects outside the database.
+        """
+        def attempt():
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                result = func(conn, *args, **kwargs)
+                conn.commit()
+                return result
+        return self.retry_policy.run(attempt)
+
+    def close(self):
+        """Close all idle connections; connections still checked out are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
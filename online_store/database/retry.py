@@ -0,0 +1,59 @@
+import os
+import random
+import sqlite3
+import time
+
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("ONLINE_STORE_DB_WRITE_MAX_ATTEMPTS", "5"))
+DEFAULT_BASE_DELAY = float(os.environ.get("ONLINE_STORE_DB_WRITE_BASE_DELAY", "0.05"))
+DEFAULT_MAX_DELAY = float(os.environ.get("ONLINE_STORE_DB_WRITE_MAX_DELAY", "1.0"))
+
+
+def is_lock_error(error: Exception) -> bool:
+    """Return True if the error is SQLite reporting a locked or busy database."""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class WriteRetryPolicy:
+    """
+    Retries a write when SQLite reports the database as locked.
+    Delays grow exponentially from base_delay up to max_delay with full jitter, so
+    concurrent writers queue up behind each other instead of failing the request.
+    """
+
+    def __init__(self, name: str, meter=None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._attributes = {"db.pool.name": name}
+
+        self._retry_counter = None
+        if meter is not None:
+            self._retry_counter = meter.create_counter(
+                name="db_write_retries_total",
+                description="Total number of database writes retried because the database was locked",
+                unit="1"
+            )
+
+    def backoff(self, attempt: int) -> float:
+        """Delay in seconds before retrying after the given (1-based) failed attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def run(self, func, *args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt >= self.max_attempts or not is_lock_error(e):
+                    raise
+            if self._retry_counter is not None:
+                self._retry_counter.add(1, attributes=self._attributes)
+            time.sleep(self.backoff(attempt))
+            attempt += 1
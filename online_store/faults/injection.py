@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+from fastapi import APIRouter, Depends, HTTPException, Request
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+# Rules are a JSON list, read from FAULT_INJECTION_RULES or from the file named by
+# FAULT_INJECTION_RULES_FILE. For example, to bring back the old demo behaviour of a
+# slow product update and a product that can never be deleted:
+#
+#   [{"method": "PUT", "route": "/products/{product_id}", "delayMs": 5000},
+#    {"method": "DELETE", "route": "/products/{product_id}",
+#     "pathParams": {"product_id": "FAIL_DELETE"}, "errorRate": 1.0}]
+#
+# With no rules configured the injector is a no-op.
+FAULT_INJECTION_RULES = os.environ.get("FAULT_INJECTION_RULES", "")
+FAULT_INJECTION_RULES_FILE = os.environ.get("FAULT_INJECTION_RULES_FILE", "")
+# The /admin/faults endpoints let rules be changed at runtime; keep them off in production.
+FAULT_INJECTION_ADMIN_ENABLED = os.environ.get("FAULT_INJECTION_ADMIN_ENABLED", "false").lower() == "true"
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "exponential")
+
+
+class FaultRule:
+    """
+    Latency and/or an error injected into the requests of one route.
+    route is the route template as declared on the app (e.g. /products/{product_id}) and
+    method "*" matches any method. pathParams narrows the rule to given path parameter values.
+    The delay is drawn from distribution: "fixed" delayMs, "uniform" delayMs +- jitterMs,
+    "normal" with mean delayMs and standard deviation jitterMs, or "exponential" with mean
+    delayMs; it is applied with the given probability and capped at maxDelayMs.
+    errorRate is the probability of failing the request with errorStatus after the delay.
+    """
+
+    def __init__(self, route: str, method: str = "*", path_params: dict = None,
+                 delay_ms: float = 0, jitter_ms: float = 0, distribution: str = "fixed",
+                 probability: float = 1.0, max_delay_ms: float = 60000,
+                 error_rate: float = 0.0, error_status: int = 500):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown delay distribution: {distribution}")
+        if not 0 <= probability <= 1 or not 0 <= error_rate <= 1:
+            raise ValueError("probability and errorRate must be between 0 and 1")
+        if delay_ms < 0 or jitter_ms < 0 or max_delay_ms < 0:
+            raise ValueError("delayMs, jitterMs and maxDelayMs must not be negative")
+        if not 400 <= error_status <= 599:
+            raise ValueError("errorStatus must be an HTTP error status")
+        self.route = route
+        self.method = method.upper()
+        self.path_params = {key: str(value) for key, value in (path_params or {}).items()}
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.probability = probability
+        self.max_delay_ms = max_delay_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FaultRule":
+        if not isinstance(data, dict) or not data.get("route"):
+            raise ValueError("Every fault rule needs a route")
+        return cls(
+            route=data["route"],
+            method=data.get("method", "*"),
+            path_params=data.get("pathParams"),
+            delay_ms=float(data.get("delayMs", 0)),
+            jitter_ms=float(data.get("jitterMs", 0)),
+            distribution=data.get("distribution", "fixed"),
+            probability=float(data.get("probability", 1.0)),
+            max_delay_ms=float(data.get("maxDelayMs", 60000)),
+            error_rate=float(data.get("errorRate", 0.0)),
+            error_status=int(data.get("errorStatus", 500)),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "route": self.route,
+            "method": self.method,
+            "pathParams": self.path_params,
+            "delayMs": self.delay_ms,
+            "jitterMs": self.jitter_ms,
+            "distribution": self.distribution,
+            "probability": self.probability,
+            "maxDelayMs": self.max_delay_ms,
+            "errorRate": self.error_rate,
+            "errorStatus": self.error_status,
+        }
+
+    def matches(self, method: str, route: str, path_params: dict) -> bool:
+        if self.route != route or self.method not in ("*", method):
+            return False
+        return all(str(path_params.get(key)) == value for key, value in self.path_params.items())
+
+    def sample_delay(self) -> float:
+        """Draw a delay in seconds, 0 if no delay should be injected this time."""
+        if self.delay_ms <= 0 or random.random() >= self.probability:
+            return 0.0
+        if self.distribution == "uniform":
+            delay_ms = random.uniform(self.delay_ms - self.jitter_ms, self.delay_ms + self.jitter_ms)
+        elif self.distribution == "normal":
+            delay_ms = random.gauss(self.delay_ms, self.jitter_ms)
+        elif self.distribution == "exponential":
+            delay_ms = random.expovariate(1.0 / self.delay_ms)
+        else:
+            delay_ms = self.delay_ms
+        return min(max(delay_ms, 0.0), self.max_delay_ms) / 1000.0
+
+    def sample_error(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def parse_rules(data) -> list:
+    if not isinstance(data, list):
+        raise ValueError("Fault rules must be a JSON list")
+    return [FaultRule.from_dict(item) for item in data]
+
+
+def rules_from_env() -> list:
+    if FAULT_INJECTION_RULES_FILE:
+        with open(FAULT_INJECTION_RULES_FILE) as f:
+            return parse_rules(json.load(f))
+    if FAULT_INJECTION_RULES:
+        return parse_rules(json.loads(FAULT_INJECTION_RULES))
+    return []
+
+
+class FaultInjector:
+    """
+    A FastAPI dependency that injects the configured faults into matching requests.
+    It runs inside the request span, so injected delays and errors show up in traces
+    and in the request duration metrics just like real ones.
+    """
+
+    def __init__(self, service: str, meter=None, rules: list = None):
+        self.service = service
+        self._lock = threading.Lock()
+        self._rules = list(rules or [])
+
+        self._fault_counter = None
+        if meter is not None:
+            self._fault_counter = meter.create_counter(
+                name="fault_injections_total",
+                description="Total number of requests with an injected delay or error",
+                unit="1"
+            )
+
+    @property
+    def rules(self) -> list:
+        return self._rules
+
+    def set_rules(self, rules: list):
+        with self._lock:
+            self._rules = list(rules)
+        logger.warning("Fault injection rules for %s set to %s", self.service, [rule.to_dict() for rule in rules])
+
+    def _count(self, route: str, kind: str):
+        if self._fault_counter is not None:
+            self._fault_counter.add(1, attributes={"http.route": route, "fault.kind": kind})
+
+    async def __call__(self, request: Request):
+        rules = self._rules
+        if not rules:
+            return
+        route = getattr(request.scope.get("route"), "path", None)
+        if route is None:
+            return
+        for rule in rules:
+            if not rule.matches(request.method, route, request.path_params):
+                continue
+            span = trace.get_current_span()
+            delay = rule.sample_delay()
+            if delay > 0:
+                span.set_attribute("fault.delay_ms", delay * 1000)
+                self._count(route, "delay")
+                await asyncio.sleep(delay)
+            if rule.sample_error():
+                span.set_attribute("fault.error_status", rule.error_status)
+                self._count(route, "error")
+                logger.error("Injected fault: %s %s failed with status %d", request.method, route, rule.error_status)
+                raise HTTPException(status_code=rule.error_status, detail="Injected fault")
+
+
+def admin_router(injector: FaultInjector) -> APIRouter:
+    router = APIRouter(prefix="/admin/faults")
+
+    @router.get("")
+    async def get_fault_rules():
+        return [rule.to_dict() for rule in injector.rules]
+
+    @router.put("")
+    async def set_fault_rules(request: Request):
+        try:
+            rules = parse_rules(await request.json())
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid fault rules: {e}")
+        injector.set_rules(rules)
+        return [rule.to_dict() for rule in rules]
+
+    @router.delete("")
+    async def clear_fault_rules():
+        injector.set_rules([])
+        return []
+
+    return router
+
+
+def configure_fault_injection(app, service: str, meter=None) -> FaultInjector:
+    """
+    Install a FaultInjector on every route of the app, loading its rules from the environment.
+    Must be called before the routes are declared, as FastAPI copies app-wide dependencies
+    into each route when it is added.
+    """
+    injector = FaultInjector(service, meter=meter, rules=rules_from_env())
+    if injector.rules:
+        logger.warning("Fault injection enabled for %s: %s", service, [rule.to_dict() for rule in injector.rules])
+    app.router.dependencies.append(Depends(injector))
+    if FAULT_INJECTION_ADMIN_ENABLED:
+        app.include_router(admin_router(injector))
+    return injector
@@ -0,0 +1,120 @@
+import os
+import time
+import httpx
+from opentelemetry.metrics import Observation
+from online_store.otel.otel import telemetry_enabled
+
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CLIENT_CONNECT_TIMEOUT", "2.0"))
+DEFAULT_TIMEOUT = float(os.environ.get("HTTP_CLIENT_TIMEOUT", "10.0"))
+# Longest time a request waits for a free connection when the pool is exhausted.
+DEFAULT_POOL_TIMEOUT = float(os.environ.get("HTTP_CLIENT_POOL_TIMEOUT", "5.0"))
+DEFAULT_MAX_CONNECTIONS = int(os.environ.get("HTTP_CLIENT_MAX_CONNECTIONS", "20"))
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "10"))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_CLIENT_KEEPALIVE_EXPIRY", "30.0"))
+
+
+class ServiceClient:
+    """
+    A shared async HTTP client for calls to another online store service.
+    Connections are kept alive and reused from a bounded pool, and every request is
+    traced (with the trace context propagated to the callee) and measured.
+    Create one per downstream service at module level and close it on shutdown.
+    """
+
+    def __init__(self, name: str, base_url: str, meter=None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, timeout: float = DEFAULT_TIMEOUT,
+                 pool_timeout: float = DEFAULT_POOL_TIMEOUT, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY, transport=None):
+        self.name = name
+        self.base_url = base_url
+        self._attributes = {"http.client.name": name}
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._transport = transport or httpx.AsyncHTTPTransport(limits=limits)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+            limits=limits,
+            transport=self._transport
+        )
+        if telemetry_enabled():
+            # Imported here as it is slow to import, see online_store/otel/otel.py.
+            from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+            HTTPXClientInstrumentor.instrument_client(self._client)
+
+        self._in_flight_counter = None
+        self._duration_histogram = None
+        self._pool_timeout_counter = None
+        if meter is not None:
+            self._in_flight_counter = meter.create_up_down_counter(
+                name="http_client_requests_in_flight",
+                description="Number of outgoing HTTP requests waiting for a connection or a response",
+                unit="1"
+            )
+            self._duration_histogram = meter.create_histogram(
+                name="http_client_request_duration_seconds",
+                description="Duration of outgoing HTTP requests, including the wait for a pooled connection",
+                unit="s"
+            )
+            self._pool_timeout_counter = meter.create_counter(
+                name="http_client_pool_timeouts_total",
+                description="Total number of outgoing HTTP requests that timed out waiting for a pooled connection",
+                unit="1"
+            )
+            meter.create_observable_gauge(
+                name="http_client_pool_connections",
+                callbacks=[self._observe_connections],
+                description="Open connections in the HTTP client pool, by state",
+                unit="1"
+            )
+
+    def _observe_connections(self, options):
+        # Only the default transport exposes its connection pool.
+        pool = getattr(self._transport, "_pool", None)
+        if pool is None:
+            return []
+        connections = list(pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return [
+            Observation(idle, {**self._attributes, "state": "idle"}),
+            Observation(len(connections) - idle, {**self._attributes, "state": "active"}),
+        ]
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Send a request to base_url + path, see httpx.AsyncClient.request for the arguments.
+        Raises httpx.HTTPError if no response was received.
+        """
+        if self._in_flight_counter is None:
+            return await self._client.request(method, path, **kwargs)
+
+        attributes = {**self._attributes, "http.method": method}
+        self._in_flight_counter.add(1, attributes=self._attributes)
+        start_time = time.perf_counter()
+        try:
+            response = await self._client.request(method, path, **kwargs)
+            attributes["http.status_code"] = response.status_code
+            return response
+        except httpx.PoolTimeout:
+            self._pool_timeout_counter.add(1, attributes=self._attributes)
+            attributes["error.type"] = "PoolTimeout"
+            raise
+        except httpx.HTTPError as e:
+            attributes["error.type"] = type(e).__name__
+            raise
+        finally:
+            self._in_flight_counter.add(-1, attributes=self._attributes)
+            self._duration_histogram.record(time.perf_counter() - start_time, attributes=attributes)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        await self._client.aclose()
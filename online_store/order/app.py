@@ -1,17 +1,30 @@
 # to start service run: python -m online_store.order.app from the project root folder
 import os
 import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime
-import requests
+import httpx
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from online_store.otel.otel import configure_telemetry, trace_span
+from online_store.database.pool import ConnectionPool
+from online_store.database.bootstrap import bootstrap_database
+from online_store.database.executor import DatabaseExecutor, executor_workers_from_env
+from online_store.database.idempotency import (
+    MAX_KEY_LENGTH, IdempotencyKeyReusedError, IdempotencyStore, create_idempotency_table, request_fingerprint
+)
+from online_store.http_client.client import ServiceClient
 
 SERVICE_VERSION = "1.0.0"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await cart_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 instruments = configure_telemetry(app, "Order Service", SERVICE_VERSION)
 
 # Get instruments
@@ -28,88 +41,176 @@ request_counter = meter.create_counter(
 
 # Database file for orders
 DATABASE = os.path.join(os.getcwd(), 'online_store/db/online_store.db')
+db_pool = ConnectionPool(DATABASE, "order", meter=meter)
+# Async handlers run their database work here instead of on the event loop.
+db_executor = DatabaseExecutor("order", meter=meter, max_workers=executor_workers_from_env("order"))
+# Responses of POST /orders by Idempotency-Key, so retried checkouts create one order.
+create_order_idempotency = IdempotencyStore(db_pool, "POST /orders")
 
 # Use environment variable to get Cart Service URL.
 CART_SERVICE_URL = os.environ.get("CART_SERVICE_URL", "http://127.0.0.1:5002")
+# Keep-alive connections to the Cart Service, shared by all requests.
+cart_client = ServiceClient("cart", CART_SERVICE_URL, meter=meter)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 @trace_span("init_db for Order Service", tracer)
 def init_db():
     db_dir = os.path.dirname(DATABASE)
     if not os.path.exists(db_dir):
         os.makedirs(db_dir)
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    # Orders table stores basic order info.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            order_date TEXT NOT NULL
-        )
-    ''')
-    # Order_items table stores each product in an order.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id INTEGER NOT NULL,
-            product_id TEXT NOT NULL,
-            product_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            FOREIGN KEY(order_id) REFERENCES orders(id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    journal_mode = bootstrap_database(db_pool)
+    logger.info("Database journal mode: %s", journal_mode)
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        # Orders table stores basic order info.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                order_date TEXT NOT NULL
+            )
+        ''')
+        # Order_items table stores each product in an order.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                product_id TEXT NOT NULL,
+                product_name TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                FOREIGN KEY(order_id) REFERENCES orders(id)
+            )
+        ''')
+        # Orders of a user come back in date order straight from the index.
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders (user_id, order_date)')
+        # Also serves the order_id foreign key lookups.
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_order_items_order
+            ON order_items (order_id, product_id, product_name, quantity)
+        ''')
+        create_idempotency_table(conn)
+        conn.commit()
 
 
 class OrderRequest(BaseModel):
     userId: str
 
 
-@app.get("/orders", response_model=list)
-def list_my_orders(userId: str = Query(..., description="User ID")):
+def orders_query(user_id, limit=None, before=None):
+    """
+    Build the query listing a user's orders together with their items.
+    Without limit all orders are returned oldest first. With limit, a page of the newest
+    orders older than the before cursor (an orderDate, optionally followed by
+    ",<orderId>" to resume within equal dates).
+    The orders are picked from idx_orders_user_date and their items joined from
+    idx_order_items_order in the same statement.
+    Returns the SQL and its parameters.
+    """
+    params = [user_id]
+    condition = ""
+    if before is not None:
+        before_date, _, before_id = before.partition(",")
+        if before_id:
+            # A row value comparison, unlike the equivalent OR, is a range on the index.
+            condition = "AND (order_date, id) < (?, ?)"
+            params += [before_date, int(before_id)]
+        else:
+            condition = "AND order_date < ?"
+            params.append(before_date)
+    direction = "ASC" if limit is None else "DESC"
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT ?"
+        params.append(limit)
+
+    sql = f'''
+        WITH page AS (
+            SELECT id, order_date FROM orders
+            WHERE user_id = ? {condition}
+            ORDER BY order_date {direction}, id {direction}
+            {limit_clause}
+        )
+        SELECT page.id, page.order_date, oi.product_id, oi.product_name, oi.quantity
+        FROM page
+        LEFT JOIN order_items oi ON oi.order_id = page.id
+        ORDER BY page.order_date {direction}, page.id {direction}, oi.id
+    '''
+    return sql, params
+
+def fetch_orders(user_id, limit=None, before=None):
+    """
+    Read a user's orders, grouping the joined item rows into one entry per order.
+    Returns the orders and, when a page was requested, the cursor of the next page
+    (None on the last page).
+    """
+    # One extra order tells whether another page follows.
+    sql, params = orders_query(user_id, None if limit is None else limit + 1, before)
+    with db_pool.connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    orders = []
+    for row in rows:
+        if not orders or orders[-1]['orderId'] != row['id']:
+            orders.append({
+                'orderId': row['id'],
+                'orderDate': row['order_date'],
+                'products': []
+            })
+        # Orders without items come back with NULL item columns from the LEFT JOIN.
+        if row['product_id'] is not None:
+            orders[-1]['products'].append({
+                'productId': row['product_id'],
+                'productName': row['product_name'],
+                'quantity': row['quantity']
+            })
+
+    next_cursor = None
+    if limit is not None and len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = f"{orders[-1]['orderDate']},{orders[-1]['orderId']}"
+    return orders, next_cursor
+
+
+@app.get("/orders")
+def list_my_orders(userId: str = Query(..., description="User ID"),
+                   limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+                   before: str = Query(None, description="Only return orders older than this orderDate, "
+                                                         "or the nextCursor returned by the previous page")):
     """
     ListMyOrders API.
     Expects a query parameter 'userId'.
-    Returns a list of orders. Each order includes:
+    Returns a list of orders, oldest first. Each order includes:
       - orderId
       - orderDate
       - products: a list of objects with productId, productName, and quantity.
+    With limit or before returns one page of orders, newest first:
+      - items: the orders
+      - nextCursor: the value to pass as 'before' for the next page, null on the last page
     """
-    with tracer.start_as_current_span("list_my_orders"):
+    with tracer.start_as_current_span("list_my_orders") as span:
         
         if not userId:
             raise HTTPException(status_code=400, detail="User ID is required")
 
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM orders WHERE user_id = ?', (userId,))
-        orders_rows = cursor.fetchall()
-        orders = []
-        for order in orders_rows:
-            order_id = order['id']
-            cursor.execute(
-                'SELECT product_id, product_name, quantity FROM order_items WHERE order_id = ?', (order_id,))
-            items_rows = cursor.fetchall()
-            items = []
-            for item in items_rows:
-                items.append({
-                    'productId': item['product_id'],
-                    'productName': item['product_name'],
-                    'quantity': item['quantity']
-             })
-            orders.append({
-                'orderId': order_id,
-                'orderDate': order['order_date'],
-                'products': items
-            })
-        conn.close()
+        paged = limit is not None or before is not None
+        if paged:
+            limit = limit or DEFAULT_PAGE_SIZE
+            span.set_attribute("order.page.limit", limit)
+        try:
+            orders, next_cursor = fetch_orders(userId, limit if paged else None, before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {before}")
+        span.set_attribute("order.count", len(orders))
+
+        if paged:
+            return JSONResponse(content={'items': orders, 'nextCursor': next_cursor}, status_code=200)
         return orders
 
 
 @app.post("/orders", status_code=201)
-def create_order(order_req: OrderRequest):
+async def create_order(order_req: OrderRequest, request: Request):
     """
     CreateOrder API.
     Expects a JSON payload with: userId.
@@ -118,7 +219,14 @@ def create_order(order_req: OrderRequest):
       - orderId (generated)
       - orderDate (current UTC datetime)
       - products list (each including productId, productName, and quantity)
-    If the cart is empty, returns an error.
+    The order and its items are inserted and the ordered cart items removed in one
+    transaction (the services share the database file), so the cart is emptied if and
+    only if the order is created.
+    If the cart is empty, returns an error. If some of the cart items were removed while
+    the order was being created (e.g. by a concurrent checkout), returns 409 Conflict
+    and creates nothing.
+    Requests with an Idempotency-Key header create at most one order; repeating the request
+    with the same key returns the original response with an Idempotent-Replayed header.
     """
     request_counter.add(1, attributes={"route": "/orders", "method": "POST" })
     with tracer.start_as_current_span("create_order") as span:
@@ -126,10 +234,21 @@ def create_order(order_req: OrderRequest):
         user_id = order_req.userId
         if not user_id:
             raise HTTPException(status_code=400, detail="User ID is required")
+
+        idempotency_key = request.headers.get("idempotency-key")
+        fingerprint = request_fingerprint(await request.body())
+        if idempotency_key is not None:
+            # Checked before reading the cart, which the original request has emptied.
+            replayed = await replay_create_order(idempotency_key, fingerprint)
+            if replayed is not None:
+                return replayed
         logger.info(f"Creating order for user: {user_id}")
-    # Retrieve the cart items for this user from the Cart Service.
-        cart_response = requests.get(
-            f"{CART_SERVICE_URL}/cart", params={"userId": user_id})
+        # Retrieve the cart items for this user from the Cart Service.
+        try:
+            cart_response = await cart_client.get("/cart", params={"userId": user_id})
+        except httpx.HTTPError as e:
+            logger.error(f"Error calling the Cart Service: {e!r}")
+            raise HTTPException(status_code=503, detail="Cart Service unavailable")
         if cart_response.status_code != 200:
             raise HTTPException(
                 status_code=500, detail="Failed to retrieve cart items")
@@ -138,34 +257,66 @@ def create_order(order_req: OrderRequest):
             raise HTTPException(status_code=400, detail="Cart is empty")
 
         order_date = datetime.utcnow().isoformat()
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        try:
+        content = {
+            'orderId': None,
+            'orderDate': order_date,
+            'products': cart_items
+        }
+        def insert_order(conn):
+            cursor = conn.cursor()
             cursor.execute(
                 'INSERT INTO orders (user_id, order_date) VALUES (?, ?)', (user_id, order_date))
             order_id = cursor.lastrowid
-            for item in cart_items:
-                product_id = item.get('productId')
-                product_name = item.get('productName')
-                quantity = item.get('quantity')
-                cursor.execute('''
-                    INSERT INTO order_items (order_id, product_id, product_name, quantity)
-                    VALUES (?, ?, ?, ?)
-                ''', (order_id, product_id, product_name, quantity))
-            conn.commit()
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, product_id, product_name, quantity)
+                VALUES (?, ?, ?, ?)
+            ''', [(order_id, item.get('productId'), item.get('productName'), item.get('quantity'))
+                  for item in cart_items])
+            # Matching the quantity too leaves items added to meanwhile, which the order does not cover.
+            cursor.executemany('DELETE FROM cart_items WHERE id = ? AND user_id = ? AND quantity = ?',
+                               [(item.get('id'), user_id, item.get('quantity')) for item in cart_items])
+            if cursor.rowcount != len(cart_items):
+                # Raising rolls the whole transaction back, including the order.
+                raise HTTPException(status_code=409, detail="Cart changed while creating the order, please retry")
+            content['orderId'] = order_id
+            if idempotency_key is not None:
+                create_order_idempotency.save(conn, idempotency_key, fingerprint, 201, content)
+            return order_id
+
+        try:
+            order_id = await db_executor.run(db_pool.run_write, insert_order)
+        except (HTTPException, sqlite3.IntegrityError) as e:
+            # A concurrent request with the same key emptied the cart or stored its
+            # response first, replay that response.
+            if idempotency_key is not None:
+                replayed = await replay_create_order(idempotency_key, fingerprint)
+                if replayed is not None:
+                    return replayed
+            if isinstance(e, HTTPException):
+                raise
+            logger.error(f"Error creating order: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
         except Exception as e:
-            conn.rollback()
-            conn.close()
             logger.error(f"Error creating order: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
-        conn.close()
+        span.set_attribute("order.id", order_id)
+        span.set_attribute("order.item_count", len(cart_items))
+        return JSONResponse(status_code=201, content=content)
 
-        # Optionally, you might want to clear the user's cart here.
-        return JSONResponse(status_code=201, content={
-            'orderId': order_id,
-            'orderDate': order_date,
-            'products': cart_items
-        })
+
+async def replay_create_order(idempotency_key, fingerprint):
+    """Return the stored response of an earlier POST /orders with the same key, or None."""
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    try:
+        stored = await db_executor.run(create_order_idempotency.find, idempotency_key, fingerprint)
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if stored is None:
+        return None
+    logger.info(f"Replaying response for Idempotency-Key {idempotency_key}")
+    return JSONResponse(content=stored.content, status_code=stored.status_code,
+                        headers={"Idempotent-Replayed": "true"})
 
 
 if __name__ == '__main__':
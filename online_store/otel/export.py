@@ -0,0 +1,130 @@
+import time
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor, LogExporter
+from opentelemetry.sdk.metrics.export import MetricExporter
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+
+
+class ExportMetrics:
+    """
+    Self-metrics of the telemetry pipeline: items dropped because an export queue was full,
+    and the items exported and time taken per export, by signal and result. They tell when
+    telemetry itself is the bottleneck. The instruments are created by bind(), once the
+    meter provider exists; until then nothing is recorded.
+    """
+
+    def __init__(self):
+        self._dropped_counter = None
+        self._exported_counter = None
+        self._duration_histogram = None
+
+    def bind(self, meter):
+        self._dropped_counter = meter.create_counter(
+            name="telemetry_dropped_items_total",
+            description="Total number of spans and log records dropped because the export queue was full",
+            unit="1"
+        )
+        self._exported_counter = meter.create_counter(
+            name="telemetry_exported_items_total",
+            description="Total number of spans and log records handed to the exporter, by export result",
+            unit="1"
+        )
+        self._duration_histogram = meter.create_histogram(
+            name="telemetry_export_duration_seconds",
+            description="Duration of telemetry exports to the collector, by signal and result",
+            unit="s"
+        )
+
+    def dropped(self, signal: str):
+        if self._dropped_counter is not None:
+            self._dropped_counter.add(1, attributes={"telemetry.signal": signal})
+
+    def exported(self, signal: str, items: int, result: str, duration: float):
+        if self._duration_histogram is None:
+            return
+        attributes = {"telemetry.signal": signal, "export.result": result}
+        if items:
+            self._exported_counter.add(items, attributes=attributes)
+        self._duration_histogram.record(duration, attributes=attributes)
+
+
+def _measure(metrics: ExportMetrics, signal: str, items: int, export):
+    start_time = time.perf_counter()
+    result = "FAILURE"
+    try:
+        export_result = export()
+        result = export_result.name
+        return export_result
+    finally:
+        metrics.exported(signal, items, result, time.perf_counter() - start_time)
+
+
+class MeasuredSpanExporter(SpanExporter):
+    def __init__(self, exporter: SpanExporter, metrics: ExportMetrics):
+        self._exporter = exporter
+        self._metrics = metrics
+
+    def export(self, spans):
+        return _measure(self._metrics, "traces", len(spans), lambda: self._exporter.export(spans))
+
+    def shutdown(self):
+        self._exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._exporter.force_flush(timeout_millis)
+
+
+class MeasuredLogExporter(LogExporter):
+    def __init__(self, exporter: LogExporter, metrics: ExportMetrics):
+        self._exporter = exporter
+        self._metrics = metrics
+
+    def export(self, batch):
+        return _measure(self._metrics, "logs", len(batch), lambda: self._exporter.export(batch))
+
+    def shutdown(self):
+        self._exporter.shutdown()
+
+
+class MeasuredMetricExporter(MetricExporter):
+    def __init__(self, exporter: MetricExporter, metrics: ExportMetrics):
+        super().__init__(preferred_temporality=exporter._preferred_temporality,
+                         preferred_aggregation=exporter._preferred_aggregation)
+        self._exporter = exporter
+        self._metrics = metrics
+
+    def export(self, metrics_data, timeout_millis: float = 10_000, **kwargs):
+        return _measure(self._metrics, "metrics", 0,
+                        lambda: self._exporter.export(metrics_data, timeout_millis=timeout_millis, **kwargs))
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        return self._exporter.force_flush(timeout_millis=timeout_millis)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs):
+        self._exporter.shutdown(timeout_millis=timeout_millis, **kwargs)
+
+
+class MeasuredBatchSpanProcessor(BatchSpanProcessor):
+    """A BatchSpanProcessor counting the spans it drops because its queue is full."""
+
+    def __init__(self, span_exporter: SpanExporter, metrics: ExportMetrics, **kwargs):
+        super().__init__(span_exporter, **kwargs)
+        self._metrics = metrics
+
+    def on_end(self, span):
+        # A full queue drops its oldest span to make room for this one.
+        if not self.done and span.context.trace_flags.sampled and len(self.queue) >= self.max_queue_size:
+            self._metrics.dropped("traces")
+        super().on_end(span)
+
+
+class MeasuredBatchLogRecordProcessor(BatchLogRecordProcessor):
+    """A BatchLogRecordProcessor counting the log records it drops because its queue is full."""
+
+    def __init__(self, exporter: LogExporter, metrics: ExportMetrics, **kwargs):
+        super().__init__(exporter, **kwargs)
+        self._metrics = metrics
+
+    def emit(self, log_data):
+        if not self._shutdown and len(self._queue) >= self._max_queue_size:
+            self._metrics.dropped("logs")
+        super().emit(log_data)
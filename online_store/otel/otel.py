@@ -1,40 +1,59 @@
+import inspect
 import logging
+import os
+import threading
 from functools import wraps
+from typing import TYPE_CHECKING
 import atexit
 from opentelemetry import trace, metrics
-from opentelemetry.sdk.resources import Resource, SERVICE_NAME, SERVICE_VERSION
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.sqlite3 import SQLite3Instrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
-from opentelemetry._logs import set_logger_provider
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
 
+if TYPE_CHECKING:
+    from online_store.otel.settings import TelemetrySettings
 
+# Only the OpenTelemetry API is imported here. The SDK, the OTLP exporters and the
+# instrumentors take most of a service's start-up time to import, so they are imported
+# by configure_telemetry, and not at all when telemetry is disabled.
 
+# Other modules read their settings from the environment when imported, so .env is
+# loaded as soon as telemetry, which every service imports first, is imported.
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-# Module-level dictionary to avoid duplicate instrumentation configuration
+# Instruments handed out per component, by service name
 _telemetry_configured_resources = {}
+# The providers shared by every component of the process, set up by the first configure_telemetry call
+_telemetry_lock = threading.Lock()
+_telemetry_pipeline = None
 
 
-def configure_telemetry(app, service_name: str, service_version: str, deployment_env: str = "demo"):
-    
-    global _telemetry_configured_resources
-    
-    if service_name in _telemetry_configured_resources:
-        # Return existing instruments if already configured
-        return _telemetry_configured_resources[service_name]
-    
+def telemetry_enabled() -> bool:
+    """False if the OpenTelemetry SDK is disabled with OTEL_SDK_DISABLED=true."""
+    return os.environ.get("OTEL_SDK_DISABLED", "false").strip().lower() != "true"
+
+
+def _configure_pipeline(service_name: str, service_version: str, deployment_env: str,
+                        settings: "TelemetrySettings" = None):
+    from opentelemetry._logs import set_logger_provider
+    from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
+    from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.logging import LoggingInstrumentor
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+    from opentelemetry.instrumentation.sqlite3 import SQLite3Instrumentor
+    from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource, SERVICE_NAME, SERVICE_VERSION
+    from opentelemetry.sdk.trace import TracerProvider
+    from online_store.otel.export import (
+        ExportMetrics, MeasuredBatchLogRecordProcessor, MeasuredBatchSpanProcessor, MeasuredLogExporter,
+        MeasuredMetricExporter, MeasuredSpanExporter
+    )
+    from online_store.otel.sampling import TailRescueSpanProcessor, create_sampler
+    from online_store.otel.settings import TelemetrySettings
+
+    settings = settings or TelemetrySettings.from_env()
+
     # Configure resource with service attributes
     resource = Resource.create(attributes={
         SERVICE_NAME: service_name,
@@ -42,28 +61,65 @@ def configure_telemetry(app, service_name: str, service_version: str, deployment
         "deployment.environment": deployment_env
     })
 
-    # Initialize tracing
-    trace_provider = TracerProvider(resource=resource)
-    trace_provider.add_span_processor(
-        BatchSpanProcessor(OTLPSpanExporter())
-    )
-    trace.set_tracer_provider(trace_provider)
-
     # Initialize metrics
+    export_metrics = ExportMetrics()
     meter_provider = MeterProvider(
         resource=resource,
         metric_readers=[
-            PeriodicExportingMetricReader(OTLPMetricExporter())
+            PeriodicExportingMetricReader(
+                MeasuredMetricExporter(OTLPMetricExporter(
+                    timeout=settings.metric_export_timeout_ms / 1000,
+                    compression=settings.grpc_compression
+                ), export_metrics),
+                export_interval_millis=settings.metric_export_interval_ms,
+                export_timeout_millis=settings.metric_export_timeout_ms
+            )
         ]
     )
     metrics.set_meter_provider(meter_provider)
+    export_metrics.bind(meter_provider.get_meter(__name__))
+
+    # Initialize tracing, sampled as configured in the environment (see sampling.py)
+    sampling = settings.sampling
+    trace_provider = TracerProvider(resource=resource, sampler=create_sampler(sampling))
+    span_processor = MeasuredBatchSpanProcessor(
+        MeasuredSpanExporter(OTLPSpanExporter(
+            timeout=settings.span_export_timeout_ms / 1000,
+            compression=settings.grpc_compression
+        ), export_metrics),
+        export_metrics,
+        max_queue_size=settings.span_max_queue_size,
+        max_export_batch_size=settings.span_max_export_batch_size,
+        schedule_delay_millis=settings.span_schedule_delay_ms,
+        export_timeout_millis=settings.span_export_timeout_ms
+    )
+    if sampling.rescues and not sampling.samples_everything:
+        span_processor = TailRescueSpanProcessor(
+            span_processor,
+            keep_errors=sampling.keep_errors,
+            slow_threshold_ms=sampling.slow_threshold_ms,
+            meter=meter_provider.get_meter(__name__)
+        )
+    trace_provider.add_span_processor(span_processor)
+    trace.set_tracer_provider(trace_provider)
     
     # Configure logging
     logger_provider = LoggerProvider(resource=resource)
     set_logger_provider(logger_provider)
 
-    log_exporter = OTLPLogExporter(insecure=True)
-    log_processor = BatchLogRecordProcessor(log_exporter)
+    log_exporter = OTLPLogExporter(
+        insecure=True,
+        timeout=settings.log_export_timeout_ms / 1000,
+        compression=settings.grpc_compression
+    )
+    log_processor = MeasuredBatchLogRecordProcessor(
+        MeasuredLogExporter(log_exporter, export_metrics),
+        export_metrics,
+        max_queue_size=settings.log_max_queue_size,
+        max_export_batch_size=settings.log_max_export_batch_size,
+        schedule_delay_millis=settings.log_schedule_delay_ms,
+        export_timeout_millis=settings.log_export_timeout_ms
+    )
     logger_provider.add_log_record_processor(log_processor)
 
     logging_handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
@@ -71,38 +127,190 @@ def configure_telemetry(app, service_name: str, service_version: str, deployment
     logging.getLogger().addHandler(logging_handler)
     
     # Auto-instrumentation
-    if app:
-        FastAPIInstrumentor.instrument_app(app)
     SQLite3Instrumentor().instrument()
     RequestsInstrumentor().instrument()
     LoggingInstrumentor().instrument(set_logging_format=True)
 
-    # Use a combined name for meter and tracer instead of __name__
-    identifier = f"{service_name}-{service_version}"
-    
-    _telemetry_configured_resources[service_name] = {
-        "meter": metrics.get_meter(identifier),
-        "tracer": trace.get_tracer(identifier),
-        "logger": logging.getLogger(identifier)
+    return {
+        "tracer_provider": trace_provider,
+        "meter_provider": meter_provider,
+        "logger_provider": logger_provider
     }
-    
-    return _telemetry_configured_resources[service_name]
 
 
-def trace_span(span_name, tracer):
-    """A decorator to trace function execution with a span."""
+def configure_telemetry(app, service_name: str, service_version: str, deployment_env: str = "demo",
+                        settings: "TelemetrySettings" = None):
+    """
+    Set up tracing, metrics and logging, exported to the OTEL Collector, and return the
+    meter, tracer and logger of the named component.
+    The providers, export threads and collector connections are set up once per process,
+    by the first call: its service name, version and settings (TelemetrySettings.from_env()
+    by default, see settings.py) describe the process. Later calls, e.g. from the pages of
+    the UI, share them and get instruments named after their component.
+    With OTEL_SDK_DISABLED=true nothing is set up and the instruments are no-ops.
+    """
+    global _telemetry_pipeline
+
+    with _telemetry_lock:
+        if _telemetry_pipeline is None:
+            if telemetry_enabled():
+                _telemetry_pipeline = _configure_pipeline(service_name, service_version, deployment_env, settings)
+            else:
+                logging.basicConfig(level=logging.INFO)
+                _telemetry_pipeline = {}
+        if _telemetry_pipeline and app is not None and not getattr(app, "_is_instrumented_by_opentelemetry", False):
+            from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+            FastAPIInstrumentor.instrument_app(app)
+
+        if service_name in _telemetry_configured_resources:
+            # Return existing instruments if already configured
+            return _telemetry_configured_resources[service_name]
+
+        # Use a combined name for meter and tracer instead of __name__
+        identifier = f"{service_name}-{service_version}"
+        
+        _telemetry_configured_resources[service_name] = {
+            "meter": metrics.get_meter(identifier),
+            "tracer": trace.get_tracer(identifier),
+            "logger": logging.getLogger(identifier)
+        }
+        
+        return _telemetry_configured_resources[service_name]
+
+
+def _argument_extractor(func, attributes):
+    """Returns a function computing the span attributes of a call from its arguments, see trace_span."""
+    if attributes is None:
+        return None
+    if callable(attributes):
+        return attributes
+    signature = inspect.signature(func)
+
+    def extract(*args, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        values = {attribute: bound.arguments.get(parameter) for attribute, parameter in attributes.items()}
+        # None is not a valid attribute value
+        return {attribute: value for attribute, value in values.items() if value is not None}
+    return extract
+
+
+def trace_span(span_name, tracer, attributes=None, skip_unsampled: bool = True):
+    """
+    A decorator to trace calls of a function, coroutine function, generator or async generator
+    with a span. The span is current while the function runs, or for generators while they
+    produce each item, and ends when the function returns or the generator is exhausted or
+    closed. Exceptions are recorded on the span and set its status to ERROR.
+
+    attributes sets span attributes from the arguments of each call: either a dict of attribute
+    names to parameter names, or a function called with the arguments that returns the attributes.
+    They are only computed when the span is recorded.
+
+    With skip_unsampled, no span is started inside a trace the sampler dropped without recording
+    it, which leaves a plain function call: the sampler would drop the span anyway. With the
+    samplers of sampling.py that is only the case when rescuing is off. With rescuing on, the
+    default, dropped traces are recorded so failed or slow ones can be exported after all, and
+    their spans are started as usual, see sampling.py.
+    With telemetry disabled the function is returned as is.
+    """
     def decorator(func):
+        if not telemetry_enabled():
+            return func
+        extract = _argument_extractor(func, attributes)
+
+        def start_span(args, kwargs):
+            if skip_unsampled:
+                parent = trace.get_current_span()
+                if not parent.is_recording() and parent.get_span_context().is_valid:
+                    return None
+            span = tracer.start_span(span_name)
+            if extract is not None and span.is_recording():
+                span.set_attributes(extract(*args, **kwargs))
+            return span
+
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def async_generator_wrapper(*args, **kwargs):
+                span = start_span(args, kwargs)
+                if span is None:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                    return
+                generator = func(*args, **kwargs)
+                step, value = generator.asend, None
+                try:
+                    while True:
+                        with trace.use_span(span):
+                            try:
+                                item = await step(value)
+                            except StopAsyncIteration:
+                                return
+                        step = generator.asend
+                        try:
+                            value = yield item
+                        except GeneratorExit:
+                            await generator.aclose()
+                            raise
+                        except BaseException as error:
+                            step, value = generator.athrow, error
+                finally:
+                    span.end()
+            return async_generator_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                span = start_span(args, kwargs)
+                if span is None:
+                    return (yield from func(*args, **kwargs))
+                generator = func(*args, **kwargs)
+                step, value = generator.send, None
+                try:
+                    while True:
+                        with trace.use_span(span):
+                            try:
+                                item = step(value)
+                            except StopIteration as stop:
+                                return stop.value
+                        step = generator.send
+                        try:
+                            value = yield item
+                        except GeneratorExit:
+                            generator.close()
+                            raise
+                        except BaseException as error:
+                            step, value = generator.throw, error
+                finally:
+                    span.end()
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def coroutine_wrapper(*args, **kwargs):
+                span = start_span(args, kwargs)
+                if span is None:
+                    return await func(*args, **kwargs)
+                with trace.use_span(span, end_on_exit=True):
+                    return await func(*args, **kwargs)
+            return coroutine_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            with tracer.start_as_current_span(span_name) as span:
-                span.set_attribute("function.name", func.__name__)
+            span = start_span(args, kwargs)
+            if span is None:
+                return func(*args, **kwargs)
+            with trace.use_span(span, end_on_exit=True):
                 return func(*args, **kwargs)
         return wrapper
     return decorator
 
 def shutdown_telemetry():
-    trace.get_tracer_provider().shutdown()
-    metrics.get_meter_provider().shutdown()
+    """Flush and stop the telemetry pipeline of the process, if it was set up."""
+    if not _telemetry_pipeline:
+        return
+    _telemetry_pipeline["tracer_provider"].shutdown()
+    _telemetry_pipeline["meter_provider"].shutdown()
+    _telemetry_pipeline["logger_provider"].shutdown()
     logging.getLogger().handlers.clear()
 
 atexit.register(shutdown_telemetry)
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_ON, Decision, ParentBased, Sampler, SamplingResult, StaticSampler, TraceIdRatioBased
+)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
+
+logger = logging.getLogger(__name__)
+
+# Head sampling of the traces started by a service. The settings are read from the JSON file
+# named by TRACE_SAMPLING_CONFIG_FILE if set, otherwise from the TRACE_SAMPLING_* variables:
+#
+#   {"ratio": 0.1,
+#    "routeRateLimits": {"GET /users/summary": 1, "/products": 5},
+#    "defaultRateLimit": 20,
+#    "keepErrors": true,
+#    "slowThresholdMs": 1000}
+#
+# ratio is the share of traces kept, decided on the trace id so all services agree.
+# routeRateLimits caps the traces kept per second by the root span's route ("METHOD /route"
+# or "/route"; the span name for spans without a route), defaultRateLimit caps other routes.
+# Traces dropped by those are still recorded in memory and exported after all if their
+# local root span failed or took at least slowThresholdMs, see TailRescueSpanProcessor.
+# The defaults keep every trace.
+#
+# Rescuing is on unless keepErrors is false and slowThresholdMs is 0, and it has a cost:
+# every span of a dropped trace is still recorded, attributes included, so head sampling
+# then only saves exporting the dropped traces, not recording them. Turning rescuing off
+# saves both, but failed or slow traces dropped here are lost: the tail_sampling policies
+# of the collector only see the traces that were exported.
+TRACE_SAMPLING_CONFIG_FILE = os.environ.get("TRACE_SAMPLING_CONFIG_FILE", "")
+TRACE_SAMPLING_RATIO = os.environ.get("TRACE_SAMPLING_RATIO", "1.0")
+TRACE_SAMPLING_ROUTE_RATE_LIMITS = os.environ.get("TRACE_SAMPLING_ROUTE_RATE_LIMITS", "")
+TRACE_SAMPLING_DEFAULT_RATE_LIMIT = os.environ.get("TRACE_SAMPLING_DEFAULT_RATE_LIMIT", "")
+TRACE_SAMPLING_KEEP_ERRORS = os.environ.get("TRACE_SAMPLING_KEEP_ERRORS", "true")
+TRACE_SAMPLING_SLOW_THRESHOLD_MS = os.environ.get("TRACE_SAMPLING_SLOW_THRESHOLD_MS", "1000")
+# Bounds the memory used for recorded traces waiting for their local root span to end.
+TRACE_SAMPLING_MAX_PENDING_TRACES = int(os.environ.get("TRACE_SAMPLING_MAX_PENDING_TRACES", "1000"))
+TRACE_SAMPLING_MAX_SPANS_PER_TRACE = int(os.environ.get("TRACE_SAMPLING_MAX_SPANS_PER_TRACE", "256"))
+
+RECORD_ONLY = StaticSampler(Decision.RECORD_ONLY)
+
+
+class SamplingConfig:
+    """Trace sampling settings of a service, see the comment at the top of this module."""
+
+    def __init__(self, ratio: float = 1.0, route_rate_limits: dict = None, default_rate_limit: float = None,
+                 keep_errors: bool = True, slow_threshold_ms: float = 1000):
+        if not 0 <= ratio <= 1:
+            raise ValueError("ratio must be between 0 and 1")
+        route_rate_limits = {route: float(limit) for route, limit in (route_rate_limits or {}).items()}
+        if any(limit < 0 for limit in route_rate_limits.values()) or (default_rate_limit or 0) < 0:
+            raise ValueError("Rate limits must not be negative")
+        if slow_threshold_ms < 0:
+            raise ValueError("slowThresholdMs must not be negative")
+        self.ratio = ratio
+        self.route_rate_limits = route_rate_limits
+        self.default_rate_limit = default_rate_limit
+        self.keep_errors = keep_errors
+        self.slow_threshold_ms = slow_threshold_ms
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SamplingConfig":
+        if not isinstance(data, dict):
+            raise ValueError("The sampling configuration must be a JSON object")
+        default_rate_limit = data.get("defaultRateLimit")
+        return cls(
+            ratio=float(data.get("ratio", 1.0)),
+            route_rate_limits=data.get("routeRateLimits"),
+            default_rate_limit=float(default_rate_limit) if default_rate_limit is not None else None,
+            keep_errors=bool(data.get("keepErrors", True)),
+            slow_threshold_ms=float(data.get("slowThresholdMs", 1000)),
+        )
+
+    @classmethod
+    def from_env(cls) -> "SamplingConfig":
+        if TRACE_SAMPLING_CONFIG_FILE:
+            with open(TRACE_SAMPLING_CONFIG_FILE) as f:
+                return cls.from_dict(json.load(f))
+        return cls(
+            ratio=float(TRACE_SAMPLING_RATIO),
+            route_rate_limits=json.loads(TRACE_SAMPLING_ROUTE_RATE_LIMITS) if TRACE_SAMPLING_ROUTE_RATE_LIMITS else None,
+            default_rate_limit=float(TRACE_SAMPLING_DEFAULT_RATE_LIMIT) if TRACE_SAMPLING_DEFAULT_RATE_LIMIT else None,
+            keep_errors=TRACE_SAMPLING_KEEP_ERRORS.lower() == "true",
+            slow_threshold_ms=float(TRACE_SAMPLING_SLOW_THRESHOLD_MS),
+        )
+
+    @property
+    def rescues(self) -> bool:
+        """Whether dropped traces must be recorded, to export the failed or slow ones after all."""
+        return self.keep_errors or self.slow_threshold_ms > 0
+
+    @property
+    def samples_everything(self) -> bool:
+        return self.ratio >= 1 and not self.route_rate_limits and self.default_rate_limit is None
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        # A burst of up to a second's worth of traces, a rate of 0 keeps none.
+        self.capacity = max(rate, 1.0) if rate > 0 else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RouteRateLimitingSampler(Sampler):
+    """
+    Samples root spans by trace id ratio, then caps the sampled traces per second of each route.
+    Dropped traces get the dropped decision: RECORD_ONLY to let them be rescued, or DROP.
+    """
+
+    def __init__(self, ratio: float = 1.0, route_rate_limits: dict = None, default_rate_limit: float = None,
+                 dropped: Decision = Decision.DROP):
+        self._ratio_sampler = TraceIdRatioBased(ratio)
+        self._route_rate_limits = dict(route_rate_limits or {})
+        self._default_rate_limit = default_rate_limit
+        self._dropped = dropped
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, method, route, name):
+        keys = [f"{method} {route}", route] if route else [name]
+        for key in keys:
+            if key in self._route_rate_limits:
+                return key, self._route_rate_limits[key]
+        if self._default_rate_limit is None:
+            return None, None
+        return keys[0], self._default_rate_limit
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        attributes = attributes or {}
+        sampled = self._ratio_sampler.should_sample(parent_context, trace_id, name).decision.is_sampled()
+        if sampled:
+            key, rate = self._bucket(attributes.get("http.method"), attributes.get("http.route"), name)
+            if key is not None:
+                with self._lock:
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        bucket = self._buckets[key] = _TokenBucket(rate)
+                    sampled = bucket.take(time.monotonic())
+        if sampled:
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, trace_state)
+        return SamplingResult(self._dropped, attributes if self._dropped.is_recording() else None, trace_state)
+
+    def get_description(self) -> str:
+        return (f"RouteRateLimitingSampler{{{self._ratio_sampler.get_description()}, "
+                f"routes={self._route_rate_limits}, default={self._default_rate_limit}}}")
+
+
+def create_sampler(config: SamplingConfig) -> Sampler:
+    """
+    Build the sampler of a service: new traces are sampled by RouteRateLimitingSampler and
+    spans with a parent follow the parent's decision, so a trace is kept or dropped as a whole.
+    With rescues, dropped traces are recorded rather than dropped, see the top of this module.
+    """
+    if config.samples_everything:
+        return ParentBased(ALWAYS_ON)
+    if not config.rescues:
+        return ParentBased(RouteRateLimitingSampler(config.ratio, config.route_rate_limits, config.default_rate_limit))
+    root = RouteRateLimitingSampler(config.ratio, config.route_rate_limits, config.default_rate_limit,
+                                    dropped=Decision.RECORD_ONLY)
+    return ParentBased(root, remote_parent_not_sampled=RECORD_ONLY, local_parent_not_sampled=RECORD_ONLY)
+
+
+class TailRescueSpanProcessor(SpanProcessor):
+    """
+    Passes sampled spans to the wrapped processor and holds back the recorded spans of
+    dropped traces until the trace's local root span ends (the span without a parent
+    in this process). If any of them failed, or the local root took at least the slow
+    threshold, the held spans are passed on marked as sampled; otherwise they are discarded.
+    A rescued trace only holds the spans of this service: each service rescues its own
+    part, which for a failure or a slow call is usually every service on the path.
+    """
+
+    def __init__(self, processor: SpanProcessor, keep_errors: bool = True, slow_threshold_ms: float = 1000,
+                 max_pending_traces: int = TRACE_SAMPLING_MAX_PENDING_TRACES,
+                 max_spans_per_trace: int = TRACE_SAMPLING_MAX_SPANS_PER_TRACE, meter=None):
+        self._processor = processor
+        self._keep_errors = keep_errors
+        self._slow_threshold_ns = slow_threshold_ms * 1_000_000 if slow_threshold_ms > 0 else None
+        self._max_pending_traces = max_pending_traces
+        self._max_spans_per_trace = max_spans_per_trace
+        self._lock = threading.Lock()
+        # trace id -> [failed, spans]
+        self._pending = OrderedDict()
+
+        self._rescued_counter = None
+        if meter is not None:
+            self._rescued_counter = meter.create_counter(
+                name="traces_rescued_total",
+                description="Total number of traces dropped by head sampling and exported because they failed or were slow",
+                unit="1"
+            )
+
+    def on_start(self, span, parent_context=None):
+        self._processor.on_start(span, parent_context=parent_context)
+
+    def _is_kept(self, span, failed) -> str:
+        if self._keep_errors and failed:
+            return "error"
+        if self._slow_threshold_ns is not None and span.end_time - span.start_time >= self._slow_threshold_ns:
+            return "slow"
+        return ""
+
+    def on_end(self, span: ReadableSpan):
+        if span.context.trace_flags.sampled:
+            self._processor.on_end(span)
+            return
+        if not span.context.is_valid:
+            return
+
+        trace_id = span.context.trace_id
+        failed = span.status.status_code is StatusCode.ERROR
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            pending = self._pending.get(trace_id)
+            if pending is None:
+                pending = self._pending[trace_id] = [False, []]
+                if len(self._pending) > self._max_pending_traces:
+                    self._pending.popitem(last=False)
+            pending[0] = pending[0] or failed
+            if len(pending[1]) < self._max_spans_per_trace:
+                pending[1].append(span)
+            if not is_local_root:
+                return
+            del self._pending[trace_id]
+
+        reason = self._is_kept(span, pending[0])
+        if not reason:
+            return
+        for held in pending[1]:
+            self._processor.on_end(_as_sampled(held, reason))
+        if self._rescued_counter is not None:
+            self._rescued_counter.add(1, attributes={"sampling.rescue_reason": reason})
+
+    def shutdown(self):
+        self._processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._processor.force_flush(timeout_millis)
+
+
+def _as_sampled(span: ReadableSpan, reason: str) -> ReadableSpan:
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(context.trace_id, context.span_id, context.is_remote,
+                            TraceFlags(context.trace_flags | TraceFlags.SAMPLED), context.trace_state),
+        parent=span.parent,
+        resource=span.resource,
+        attributes={**(span.attributes or {}), "sampling.rescue_reason": reason},
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
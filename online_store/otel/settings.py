@@ -0,0 +1,117 @@
+import os
+from grpc import Compression
+from online_store.otel.sampling import SamplingConfig
+
+# Export settings of the telemetry pipeline. TELEMETRY_PRESET picks one of PRESETS and the
+# standard OpenTelemetry variables override single values of it:
+#   OTEL_BSP_MAX_QUEUE_SIZE, OTEL_BSP_MAX_EXPORT_BATCH_SIZE, OTEL_BSP_SCHEDULE_DELAY, OTEL_BSP_EXPORT_TIMEOUT
+#   OTEL_BLRP_MAX_QUEUE_SIZE, OTEL_BLRP_MAX_EXPORT_BATCH_SIZE, OTEL_BLRP_SCHEDULE_DELAY, OTEL_BLRP_EXPORT_TIMEOUT
+#   OTEL_METRIC_EXPORT_INTERVAL, OTEL_METRIC_EXPORT_TIMEOUT, OTEL_EXPORTER_OTLP_COMPRESSION
+# Durations are in milliseconds.
+TELEMETRY_PRESET = os.environ.get("TELEMETRY_PRESET", "default")
+
+COMPRESSIONS = {
+    "none": Compression.NoCompression,
+    "gzip": Compression.Gzip,
+    "deflate": Compression.Deflate,
+}
+
+PRESETS = {
+    # The OpenTelemetry SDK defaults.
+    "default": {
+        "span_max_queue_size": 2048, "span_max_export_batch_size": 512,
+        "span_schedule_delay_ms": 5000, "span_export_timeout_ms": 30000,
+        "log_max_queue_size": 2048, "log_max_export_batch_size": 512,
+        "log_schedule_delay_ms": 5000, "log_export_timeout_ms": 30000,
+        "metric_export_interval_ms": 60000, "metric_export_timeout_ms": 30000,
+        "compression": "none",
+    },
+    # Absorbs request bursts without dropping telemetry: a deep queue drained often in large,
+    # compressed batches, and timeouts short enough that a stuck collector does not back up the queue.
+    "production": {
+        "span_max_queue_size": 16384, "span_max_export_batch_size": 1024,
+        "span_schedule_delay_ms": 2000, "span_export_timeout_ms": 10000,
+        "log_max_queue_size": 16384, "log_max_export_batch_size": 1024,
+        "log_schedule_delay_ms": 2000, "log_export_timeout_ms": 10000,
+        "metric_export_interval_ms": 15000, "metric_export_timeout_ms": 10000,
+        "compression": "gzip",
+    },
+    # Telemetry shows up within a second or so, for local runs and demos.
+    "development": {
+        "span_max_queue_size": 2048, "span_max_export_batch_size": 256,
+        "span_schedule_delay_ms": 500, "span_export_timeout_ms": 10000,
+        "log_max_queue_size": 2048, "log_max_export_batch_size": 256,
+        "log_schedule_delay_ms": 500, "log_export_timeout_ms": 10000,
+        "metric_export_interval_ms": 5000, "metric_export_timeout_ms": 5000,
+        "compression": "none",
+    },
+}
+
+_ENV_OVERRIDES = {
+    "span_max_queue_size": "OTEL_BSP_MAX_QUEUE_SIZE",
+    "span_max_export_batch_size": "OTEL_BSP_MAX_EXPORT_BATCH_SIZE",
+    "span_schedule_delay_ms": "OTEL_BSP_SCHEDULE_DELAY",
+    "span_export_timeout_ms": "OTEL_BSP_EXPORT_TIMEOUT",
+    "log_max_queue_size": "OTEL_BLRP_MAX_QUEUE_SIZE",
+    "log_max_export_batch_size": "OTEL_BLRP_MAX_EXPORT_BATCH_SIZE",
+    "log_schedule_delay_ms": "OTEL_BLRP_SCHEDULE_DELAY",
+    "log_export_timeout_ms": "OTEL_BLRP_EXPORT_TIMEOUT",
+    "metric_export_interval_ms": "OTEL_METRIC_EXPORT_INTERVAL",
+    "metric_export_timeout_ms": "OTEL_METRIC_EXPORT_TIMEOUT",
+    "compression": "OTEL_EXPORTER_OTLP_COMPRESSION",
+}
+
+
+class TelemetrySettings:
+    """How the telemetry of a service is sampled, batched and exported, see the comment at the top of this module."""
+
+    def __init__(self, *,
+                 span_max_queue_size: int = 2048, span_max_export_batch_size: int = 512,
+                 span_schedule_delay_ms: float = 5000, span_export_timeout_ms: float = 30000,
+                 log_max_queue_size: int = 2048, log_max_export_batch_size: int = 512,
+                 log_schedule_delay_ms: float = 5000, log_export_timeout_ms: float = 30000,
+                 metric_export_interval_ms: float = 60000, metric_export_timeout_ms: float = 30000,
+                 compression: str = "none", sampling: SamplingConfig = None):
+        for signal, queue_size, batch_size in (("span", span_max_queue_size, span_max_export_batch_size),
+                                               ("log", log_max_queue_size, log_max_export_batch_size)):
+            if batch_size <= 0 or queue_size < batch_size:
+                raise ValueError(f"{signal}_max_export_batch_size must be positive and at most {signal}_max_queue_size")
+        durations = (span_schedule_delay_ms, span_export_timeout_ms, log_schedule_delay_ms, log_export_timeout_ms,
+                     metric_export_interval_ms, metric_export_timeout_ms)
+        if any(duration <= 0 for duration in durations):
+            raise ValueError("Delays, intervals and timeouts must be positive")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}, use one of {', '.join(COMPRESSIONS)}")
+        self.span_max_queue_size = span_max_queue_size
+        self.span_max_export_batch_size = span_max_export_batch_size
+        self.span_schedule_delay_ms = span_schedule_delay_ms
+        self.span_export_timeout_ms = span_export_timeout_ms
+        self.log_max_queue_size = log_max_queue_size
+        self.log_max_export_batch_size = log_max_export_batch_size
+        self.log_schedule_delay_ms = log_schedule_delay_ms
+        self.log_export_timeout_ms = log_export_timeout_ms
+        self.metric_export_interval_ms = metric_export_interval_ms
+        self.metric_export_timeout_ms = metric_export_timeout_ms
+        self.compression = compression
+        self.sampling = sampling or SamplingConfig()
+
+    @classmethod
+    def preset(cls, name: str, sampling: SamplingConfig = None, **overrides) -> "TelemetrySettings":
+        if name not in PRESETS:
+            raise ValueError(f"Unknown telemetry preset: {name}, use one of {', '.join(PRESETS)}")
+        return cls(**{**PRESETS[name], **overrides}, sampling=sampling)
+
+    @classmethod
+    def from_env(cls) -> "TelemetrySettings":
+        overrides = {}
+        for field, variable in _ENV_OVERRIDES.items():
+            value = os.environ.get(variable)
+            if not value:
+                continue
+            default = PRESETS["default"][field]
+            overrides[field] = value.strip().lower() if isinstance(default, str) else type(default)(value)
+        return cls.preset(TELEMETRY_PRESET, sampling=SamplingConfig.from_env(), **overrides)
+
+    @property
+    def grpc_compression(self) -> Compression:
+        return COMPRESSIONS[self.compression]
@@ -1,10 +1,19 @@
 import os
+import re
 import sqlite3
 import time
-import asyncio
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from online_store.otel.otel import configure_telemetry
+from online_store.faults.injection import configure_fault_injection
+from online_store.database.pool import ConnectionPool
+from online_store.database.bootstrap import bootstrap_database
+from online_store.database.executor import DatabaseExecutor, executor_workers_from_env
+from online_store.database.cache import SnapshotCache, etag_matches
+from online_store.product.bulk_import import (
+    CSV_CONTENT_TYPES, NDJSON_CONTENT_TYPES, ImportReport, LineTooLongError,
+    iter_csv_records, iter_lines, iter_ndjson_records, validate_product, whole_number
+)
 
 SERVICE_VERSION = "1.0.0"
 
@@ -15,6 +24,8 @@ instruments = configure_telemetry(app, "Product Service", SERVICE_VERSION)
 meter = instruments["meter"]
 tracer = instruments["tracer"]
 logger = instruments["logger"]
+# Latency and errors for demos and alert testing are injected from configuration, see faults/injection.py.
+fault_injector = configure_fault_injection(app, "product", meter=meter)
 
 # Create metrics instruments
 request_counter = meter.create_counter(
@@ -32,6 +43,28 @@ request_duration_histogram = meter.create_histogram(
 
 DATABASE = os.path.join(os.getcwd(), 'online_store/db/online_store.db')
 print(f"DB=={DATABASE}")
+db_pool = ConnectionPool(DATABASE, "product", meter=meter)
+# Async handlers run their database work here instead of on the event loop.
+db_executor = DatabaseExecutor("product", meter=meter, max_workers=executor_workers_from_env("product"))
+# Serialized product catalog, invalidated by every handler that writes to the products table.
+catalog_cache = SnapshotCache("product_catalog", "productId", meter=meter)
+
+# API field name -> products table column, used for field projection.
+PRODUCT_FIELDS = {
+    'productId': 'product_id',
+    'name': 'name',
+    'description': 'description',
+    'numberItemsInStock': 'number_items_in_stock',
+    'price': 'price'
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 1000
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_QUERY_TERMS = 16
+# Rows inserted per transaction by the bulk import API.
+BULK_CHUNK_SIZE = int(os.environ.get("PRODUCT_BULK_CHUNK_SIZE", "500"))
+MAX_BULK_CHUNK_SIZE = 5000
 
 def init_db():
     """
@@ -46,61 +79,228 @@ def init_db():
     
     with tracer.start_as_current_span("init_product_db"):
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            # Create the products table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id TEXT NOT NULL UNIQUE,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    number_items_in_stock INTEGER NOT NULL,
-                    price REAL NOT NULL
-                )
-            ''')
-            conn.commit()
-            # Load the SQL script from 'populate_products.sql'
-            sql_file_path = os.path.join(os.path.dirname(__file__), 'populate_products.sql')
-            if not os.path.exists(sql_file_path):
-                logger.error(f"Init SQL script file {sql_file_path} does not exist. The products table will not be initialized.")
-                #raise Exception(f"Init SQL script file {sql_file_path} does not exist.")
-            with open(sql_file_path, 'r') as file:
-                script_content = file.read()
-            cursor.executescript(script_content)
-            conn.commit()
+            journal_mode = bootstrap_database(db_pool)
+            logger.info("Database journal mode: %s", journal_mode)
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                # Create the products table if it doesn't exist
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS products (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        product_id TEXT NOT NULL UNIQUE,
+                        name TEXT NOT NULL,
+                        description TEXT,
+                        number_items_in_stock INTEGER NOT NULL,
+                        price REAL NOT NULL
+                    )
+                ''')
+                # Supports name-prefix filtering and stock updates addressed by product name.
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)')
+                # Databases created before product_id was declared UNIQUE have no index on it.
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_product_id ON products (product_id)')
+                conn.commit()
+                create_search_index(conn)
+                # Load the SQL script from 'populate_products.sql'
+                sql_file_path = os.path.join(os.path.dirname(__file__), 'populate_products.sql')
+                if not os.path.exists(sql_file_path):
+                    logger.error(f"Init SQL script file {sql_file_path} does not exist. The products table will not be initialized.")
+                    #raise Exception(f"Init SQL script file {sql_file_path} does not exist.")
+                with open(sql_file_path, 'r') as file:
+                    script_content = file.read()
+                cursor.executescript(script_content)
+                conn.commit()
         except sqlite3.Error as e:
             logger.error("Error initializing database: %s", e)
-        finally:
-            conn.close()
 
-@app.get("/products")
-async def list_products():
+def create_search_index(conn):
     """
-    ListProducts API.
-    Returns a list of products in JSON format.
+    Create the products_fts full-text index over product names and descriptions.
+    It is an external content FTS5 table, so the text is not stored twice; triggers on
+    the products table keep it in sync. An existing catalog is indexed once, when the
+    index is first created.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'").fetchone()
+    try:
+        conn.executescript('''
+            BEGIN;
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description,
+                content='products', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END;
+            -- Stock updates do not touch the indexed columns and skip the index entirely.
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+            END;
+            COMMIT;
+        ''')
+        if not exists:
+            logger.info("Building the product search index...")
+            conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+            conn.commit()
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 still serve everything but /products/search.
+        conn.rollback()
+        logger.error("Product search index not available: %s", e)
+
+def to_match_query(text):
+    """
+    Turn free text into an FTS5 query matching all of its words, the last one as a prefix.
+    Each word is quoted, so FTS5 operators and punctuation in the input are taken literally.
+    Returns None if the text contains no words.
     """
-    with tracer.start_as_current_span("list_products"):
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
+    terms = re.findall(r"\w+", text)[:MAX_SEARCH_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+def search_products(match_query, limit, offset):
+    """
+    Read one page of products matching an FTS5 query, best matches first.
+    Matches in the name weigh more than matches in the description.
+    Returns the page items and the offset of the next page (None on the last page).
+    """
+    with db_pool.connection() as conn:
+        rows = conn.execute('''
+            SELECT p.product_id, p.name, p.description, p.number_items_in_stock, p.price
+            FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY bm25(products_fts, 10.0, 1.0)
+            LIMIT ? OFFSET ?
+        ''', (match_query, limit + 1, offset)).fetchall()
+
+    next_offset = offset + limit if len(rows) > limit else None
+    items = [{field: row[column] for field, column in PRODUCT_FIELDS.items()} for row in rows[:limit]]
+    return items, next_offset
+
+def fetch_products():
+    """Read the whole catalog from the database, used to (re)load the catalog cache."""
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT product_id, name, description, number_items_in_stock, price 
             FROM products
         ''')
         rows = cursor.fetchall()
-        conn.close()
-
-        products = []
-        for row in rows:
-            products.append({
-                'productId': row['product_id'],
-                'name': row['name'],
-                'description': row['description'],
-                'numberItemsInStock': row['number_items_in_stock'],
-                'price': row['price']
-            })
-        return JSONResponse(content=products, status_code=200)
+
+    products = []
+    for row in rows:
+        products.append({
+            'productId': row['product_id'],
+            'name': row['name'],
+            'description': row['description'],
+            'numberItemsInStock': row['number_items_in_stock'],
+            'price': row['price']
+        })
+    return products
+
+def fetch_products_page(limit, after, fields, name_prefix):
+    """
+    Read one page of products ordered by id, starting after the given id.
+    Returns the page items and the cursor of the next page (None on the last page).
+    """
+    columns = ", ".join(PRODUCT_FIELDS[field] for field in fields)
+    query = f"SELECT id, {columns} FROM products WHERE id > ?"
+    params = [after or 0]
+    if name_prefix:
+        # A range on the indexed name column instead of LIKE, which cannot use the index.
+        query += " AND name >= ? AND name < ?"
+        params += [name_prefix, name_prefix + "\U0010ffff"]
+    query += " ORDER BY id LIMIT ?"
+    # One extra row tells whether another page follows.
+    params.append(limit + 1)
+
+    with db_pool.connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    items = [{field: row[PRODUCT_FIELDS[field]] for field in fields} for row in rows[:limit]]
+    return items, next_cursor
+
+@app.get("/products")
+async def list_products(request: Request,
+                        limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+                        after: int = Query(None, ge=0, description="Cursor returned as nextCursor by the previous page"),
+                        fields: str = Query(None, description="Comma separated list of fields to return"),
+                        namePrefix: str = Query(None, description="Only return products whose name starts with this prefix")):
+    """
+    ListProducts API.
+    Without query parameters returns the whole catalog as a list of products in JSON format.
+    The response carries an ETag; if the If-None-Match header matches it,
+    304 Not Modified is returned without a body.
+    With any of limit, after, fields or namePrefix returns one page ordered by id:
+      - items: the products, restricted to the requested fields
+      - nextCursor: the value to pass as 'after' for the next page, null on the last page
+    """
+    if any(param is not None for param in (limit, after, fields, namePrefix)):
+        return await list_products_page(limit or DEFAULT_PAGE_SIZE, after, fields, namePrefix)
+
+    with tracer.start_as_current_span("list_products") as span:
+        snapshot = catalog_cache.get()
+        span.set_attribute("product.catalog_cache_hit", snapshot is not None)
+        if snapshot is None:
+            snapshot = await db_executor.run(catalog_cache.load, fetch_products)
+
+        headers = {"ETag": snapshot.etag}
+        if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=snapshot.body, status_code=200, media_type="application/json", headers=headers)
+
+async def list_products_page(limit, after, fields, name_prefix):
+    with tracer.start_as_current_span("list_products_page") as span:
+        if fields:
+            selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in selected_fields if field not in PRODUCT_FIELDS]
+            if unknown or not selected_fields:
+                raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(unknown) or fields}. "
+                                                            f"Allowed fields: {', '.join(PRODUCT_FIELDS)}")
+        else:
+            selected_fields = list(PRODUCT_FIELDS)
+
+        span.set_attribute("product.page.limit", limit)
+        span.set_attribute("product.page.after", after or 0)
+        if name_prefix:
+            span.set_attribute("product.page.name_prefix", name_prefix)
+
+        items, next_cursor = await db_executor.run(fetch_products_page, limit, after, selected_fields, name_prefix)
+        return JSONResponse(content={'items': items, 'nextCursor': next_cursor}, status_code=200)
+
+@app.get("/products/search")
+async def search_products_endpoint(q: str = Query(..., min_length=1, description="Words to search for in product names and descriptions"),
+                                   limit: int = Query(DEFAULT_SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+                                   offset: int = Query(0, ge=0, description="Offset returned as nextOffset by the previous page")):
+    """
+    SearchProducts API.
+    Full-text search over product names and descriptions. Every word of q must match,
+    the last one as a prefix so partially typed words find results.
+    Returns one page of the matches, best first:
+      - items: the matching products
+      - nextOffset: the value to pass as 'offset' for the next page, null on the last page
+    """
+    with tracer.start_as_current_span("search_products") as span:
+        span.set_attribute("product.search.query", q)
+        span.set_attribute("product.search.offset", offset)
+        match_query = to_match_query(q)
+        if match_query is None:
+            return JSONResponse(content={'items': [], 'nextOffset': None}, status_code=200)
+        try:
+            items, next_offset = await db_executor.run(search_products, match_query, limit, offset)
+        except sqlite3.Error as e:
+            logger.error("Error searching products: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to search products: {str(e)}")
+        span.set_attribute("product.search.results", len(items))
+        return JSONResponse(content={'items': items, 'nextOffset': next_offset}, status_code=200)
 
 @app.post("/products", status_code=201)
 async def add_product(request: Request):
@@ -127,76 +327,240 @@ async def add_product(request: Request):
             raise HTTPException(status_code=400, detail="Missing required fields")
         
         logger.info(f"Adding product: {product_id}, {name}, {description}, {number_items_in_stock}, {price}")
-        conn = sqlite3.connect(DATABASE)
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
+        def insert_product(conn):
+            conn.execute('''
                 INSERT INTO products (product_id, name, description, number_items_in_stock, price)
                 VALUES (?, ?, ?, ?, ?)
             ''', (product_id, name, description, number_items_in_stock, price))
-            conn.commit()
+
+        try:
+            await db_executor.run(db_pool.run_write, insert_product)
         except Exception as e:
-            conn.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to add product: {str(e)}")
-        finally:
-            conn.close()
+        catalog_cache.invalidate()
 
         return JSONResponse(content={'message': 'Product added successfully'}, status_code=201)
 
 
+def apply_stock_change(conn, product_id, product_name, qty_change):
+    """
+    Add qty_change to the stock of the product identified by product_id (or by name
+    when no product_id is given) in a single conditional UPDATE and return the new stock.
+    The update only matches while the resulting stock stays non-negative, so
+    concurrent decrements can neither lose updates nor oversell.
+    Raises HTTPException 404 if the product does not exist and 400 if the required
+    quantity is not in stock.
+    """
+    column, key = ('product_id', product_id) if product_id else ('name', product_name)
+    rows = conn.execute(f'''
+        UPDATE products SET number_items_in_stock = number_items_in_stock + ?
+        WHERE {column} = ? AND number_items_in_stock + ? >= 0
+        RETURNING number_items_in_stock
+    ''', (qty_change, key, qty_change)).fetchall()
+    if rows:
+        return rows[0]['number_items_in_stock']
+
+    if conn.execute(f'SELECT 1 FROM products WHERE {column} = ?', (key,)).fetchone() is None:
+        raise HTTPException(status_code=404, detail=f"Product {key} not found")
+    # If trying to reduce more than available
+    raise HTTPException(status_code=400, detail="The required quantity is not in stock")
+
+def insert_products_chunk(conn, chunk):
+    """
+    Insert a chunk of validated (line_number, row) pairs with a single executemany.
+    Rows whose productId already exists, in the table or earlier in the chunk, are skipped.
+    Returns the number of inserted rows and the (line_number, error) pairs of skipped ones.
+    """
+    product_ids = [row[0] for _, row in chunk]
+    placeholders = ", ".join("?" * len(product_ids))
+    existing = {row['product_id'] for row in conn.execute(
+        f"SELECT product_id FROM products WHERE product_id IN ({placeholders})", product_ids)}
+
+    rows, errors = [], []
+    for line_number, row in chunk:
+        if row[0] in existing:
+            errors.append((line_number, f"Product {row[0]} already exists"))
+            continue
+        existing.add(row[0])
+        rows.append(row)
+    conn.executemany('''
+        INSERT INTO products (product_id, name, description, number_items_in_stock, price)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows), errors
+
+@app.post("/products/bulk", status_code=200)
+async def bulk_add_products(request: Request,
+                            chunkSize: int = Query(BULK_CHUNK_SIZE, ge=1, le=MAX_BULK_CHUNK_SIZE,
+                                                   description="Rows inserted per transaction")):
+    """
+    BulkAddProducts API.
+    Streams an NDJSON (application/x-ndjson) or CSV (text/csv, with a header row) body of
+    products with the same fields as AddProduct. Rows are validated as they arrive and
+    inserted in transactions of chunkSize rows; invalid or duplicate rows are skipped.
+    Returns counts of received, inserted and failed rows and the errors per line.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        records = iter_ndjson_records(iter_lines(request.stream()))
+    elif content_type in CSV_CONTENT_TYPES:
+        records = iter_csv_records(iter_lines(request.stream()))
+    else:
+        raise HTTPException(status_code=415, detail="Expected an application/x-ndjson or text/csv body")
+
+    with tracer.start_as_current_span("bulk_add_products") as span:
+        span.set_attribute("product.bulk.content_type", content_type)
+        span.set_attribute("product.bulk.chunk_size", chunkSize)
+        report = ImportReport()
+
+        async def flush(chunk):
+            inserted, errors = await db_executor.run(db_pool.run_write, insert_products_chunk, chunk)
+            report.inserted += inserted
+            for line_number, error in errors:
+                report.add_error(line_number, error)
+
+        chunk = []
+        try:
+            async for line_number, record, error in records:
+                report.received += 1
+                if error is None:
+                    try:
+                        chunk.append((line_number, validate_product(record)))
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    report.add_error(line_number, error)
+                if len(chunk) >= chunkSize:
+                    await flush(chunk)
+                    chunk = []
+            if chunk:
+                await flush(chunk)
+        except LineTooLongError as e:
+            logger.error("Bulk import aborted: %s", e)
+            raise HTTPException(status_code=413, detail=f"{e}. {report.inserted} products were imported before the error.")
+        except Exception as e:
+            logger.error("Error importing products: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to import products: {str(e)}. "
+                                                        f"{report.inserted} products were imported before the error.")
+        finally:
+            # Chunks are committed as they go, so the catalog may have changed even on failure.
+            if report.inserted:
+                catalog_cache.invalidate()
+            span.set_attribute("product.bulk.received", report.received)
+            span.set_attribute("product.bulk.inserted", report.inserted)
+            span.set_attribute("product.bulk.failed", report.failed)
+
+        logger.info("Bulk import finished: %d received, %d inserted, %d failed",
+                    report.received, report.inserted, report.failed)
+        return JSONResponse(content=report.to_dict(), status_code=200)
+
 @app.post("/products/update_stock", status_code=200)
 async def update_stock(request: Request):
     """
     Update Product Stock API.
-    Expects a JSON payload with: productName and qty_change.
+    Expects a JSON payload with: productId or productName, and qty_change.
+    productId is preferred since it is unique; productName is kept for existing clients.
     - If qty_change is positive, the stock is increased.
     - If qty_change is negative, the stock is decreased.
+    Returns the new stock as newStock.
     """
     with tracer.start_as_current_span("update_product_stock") as span:
         data = await request.json()
+        product_id = data.get('productId')
         product_name = data.get('productName')
         qty_change = data.get('qty_change')
         
-        if not product_name or qty_change is None:
-            raise HTTPException(status_code=400, detail="Missing required fields: productName and qty_change")
+        if not (product_id or product_name) or qty_change is None:
+            raise HTTPException(status_code=400, detail="Missing required fields: productId or productName, and qty_change")
         
         try:
-            qty_change = int(qty_change)
-        except ValueError:
+            qty_change = whole_number(qty_change)
+        except (TypeError, ValueError):
             raise HTTPException(status_code=400, detail="Invalid qty_change value")
         
-        span.set_attribute("product.product_name", product_name)
+        product = product_id or product_name
+        if product_id:
+            span.set_attribute("product.product_id", product_id)
+        if product_name:
+            span.set_attribute("product.product_name", product_name)
         span.set_attribute("product.qty_change", qty_change)
-        logger.info(f"Updating stock for product {product_name} by {qty_change}")
-        
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT number_items_in_stock FROM products WHERE name = ?', (product_name,))
-        row = cursor.fetchone()
-        if row is None:
-            conn.close()
-            raise HTTPException(status_code=404, detail=f"Product {product_name} not found")
-        
-        current_stock = row['number_items_in_stock']
-        new_stock = current_stock + qty_change
-        
-        # If trying to reduce more than available
-        if new_stock < 0:
-            conn.close()
-            raise HTTPException(status_code=400, detail="The required quantity is not in stock")
-        
+        logger.info(f"Updating stock for product {product} by {qty_change}")
+
         try:
-            cursor.execute('UPDATE products SET number_items_in_stock = ? WHERE name = ?', (new_stock, product_name))
-            conn.commit()
+            new_stock = await db_executor.run(db_pool.run_write, apply_stock_change, product_id, product_name, qty_change)
+        except HTTPException:
+            raise
         except Exception as e:
-            conn.rollback()
-            logger.error("Error updating stock for %s: %s", product_name, e, exc_info=True)
+            logger.error("Error updating stock for %s: %s", product, e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to update product: {str(e)}")
-        finally:
-            conn.close()
+        catalog_cache.invalidate()
+        span.set_attribute("product.new_stock", new_stock)
         
-        return JSONResponse(content={'message': f"Stock updated successfully for {product_name}. New stock is {new_stock}."}, status_code=200)
+        return JSONResponse(content={
+            'message': f"Stock updated successfully for {product}. New stock is {new_stock}.",
+            'newStock': new_stock
+        }, status_code=200)
+
+@app.post("/products/update_stock/batch", status_code=200)
+async def update_stock_batch(request: Request):
+    """
+    Batch Update Product Stock API.
+    Expects a JSON list of items, each with productId or productName, and qty_change.
+    All changes are applied in one transaction: if any item is unknown (404) or not
+    in stock (400) nothing is changed and the error names the failing item.
+    Returns the new stock of every item, in request order.
+    """
+    with tracer.start_as_current_span("update_product_stock_batch") as span:
+        data = await request.json()
+        if not isinstance(data, list) or not data:
+            raise HTTPException(status_code=400, detail="Expected a non-empty list of stock changes")
+        if len(data) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} stock changes are allowed per batch")
+
+        changes = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=400, detail=f"Item {index}: expected an object")
+            product_id = item.get('productId')
+            product_name = item.get('productName')
+            if not (product_id or product_name) or item.get('qty_change') is None:
+                raise HTTPException(status_code=400, detail=f"Item {index}: missing required fields: productId or productName, and qty_change")
+            try:
+                qty_change = whole_number(item.get('qty_change'))
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail=f"Item {index}: invalid qty_change value")
+            changes.append((product_id, product_name, qty_change))
+
+        span.set_attribute("product.batch.size", len(changes))
+        logger.info("Updating stock for %d products in one batch", len(changes))
+
+        def apply_stock_changes(conn):
+            new_stocks = []
+            for index, (product_id, product_name, qty_change) in enumerate(changes):
+                try:
+                    new_stocks.append(apply_stock_change(conn, product_id, product_name, qty_change))
+                except HTTPException as e:
+                    raise HTTPException(status_code=e.status_code, detail=f"Item {index}: {e.detail}") from e
+            return new_stocks
+
+        try:
+            new_stocks = await db_executor.run(db_pool.run_write, apply_stock_changes)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error updating stock in batch: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to update products: {str(e)}")
+        catalog_cache.invalidate()
+
+        items = []
+        for (product_id, product_name, qty_change), new_stock in zip(changes, new_stocks):
+            items.append({
+                'productId': product_id,
+                'productName': product_name,
+                'qty_change': qty_change,
+                'newStock': new_stock
+            })
+        return JSONResponse(content={'items': items}, status_code=200)
 
 @app.delete("/products/{product_id}")
 async def delete_product(product_id: str):
@@ -207,29 +571,20 @@ async def delete_product(product_id: str):
     with tracer.start_as_current_span("delete_product") as span:
         span.set_attribute("product.product_id", product_id)
         logger.info("Deleting product: %s", product_id)
-        
-        # [SIMULATE FAILURE] Force a deletion failure if product_id is "FAIL_DELETE" for demo purposes
-        if product_id == "FAIL_DELETE":
-            logger.error("Deletion failure triggered for product_id: %s .", product_id)
-            span.set_attribute("product.deletion_failure", True)
 
-            raise HTTPException(status_code=500, detail="Deletion failure")
-        
-        conn = sqlite3.connect(DATABASE)
+        def remove_product(conn):
+            return conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,)).rowcount
+
         try:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
-            if cursor.rowcount == 0:
-                conn.close()
-                logger.error("Product %s not found.", product_id)
-                #raise HTTPException(status_code=404, detail="Product %s not found." % product_id)
-            conn.commit()
+            deleted = await db_executor.run(db_pool.run_write, remove_product)
         except Exception as e:
-            conn.rollback()
             logger.error("Error deleting product %s: %s", product_id, e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to delete product: {str(e)}")
-        finally:
-            conn.close()
+        if deleted == 0:
+            logger.error("Product %s not found.", product_id)
+            #raise HTTPException(status_code=404, detail="Product %s not found." % product_id)
+        else:
+            catalog_cache.invalidate()
         return JSONResponse(content={"message": f"Product {product_id} deleted successfully"}, status_code=200)
     
 @app.put("/products/{product_id}")
@@ -241,25 +596,24 @@ async def update_product(request: Request, product_id: str):
     # For example, if you're updating just the stock:
     new_stock = data.get("numberItemsInStock")
     
-    with tracer.start_as_current_span("update_product_slow") as span:
+    with tracer.start_as_current_span("update_product") as span:
         span.set_attribute("product.product_id", product_id)
         if new_stock is None:
             logger.error("Missing required field: numberItemsInStock")
             raise HTTPException(status_code=400, detail="Missing required field: numberItemsInStock")
-        
-        await asyncio.sleep(5)  # Simulate a long-running operation
-        conn = sqlite3.connect(DATABASE)
-        try:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE products SET number_items_in_stock = ? WHERE product_id = ?", (new_stock, product_id))
+
+        def set_stock(conn):
+            cursor = conn.execute("UPDATE products SET number_items_in_stock = ? WHERE product_id = ?", (new_stock, product_id))
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Product not found")
-            conn.commit()
+
+        try:
+            await db_executor.run(db_pool.run_write, set_stock)
+        except HTTPException:
+            raise
         except Exception as e:
-            conn.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to update product: {str(e)}")
-        finally:
-            conn.close()
+        catalog_cache.invalidate()
         duration = time.time() - start_time
         # Record the duration along with attributes
         request_duration_histogram.record(duration, 
@@ -0,0 +1,152 @@
+# Streaming parsers for the bulk product import API.
+# Bodies are decoded line by line from the request stream, so memory use is bounded
+# by the longest record rather than by the size of the payload.
+import codecs
+import csv
+import json
+import math
+import os
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+
+MAX_LINE_LENGTH = int(os.environ.get("PRODUCT_BULK_MAX_LINE_LENGTH", str(1024 * 1024)))
+# Only the first errors are reported in detail, the rest are just counted.
+MAX_REPORTED_ERRORS = int(os.environ.get("PRODUCT_BULK_MAX_REPORTED_ERRORS", "100"))
+
+
+class LineTooLongError(ValueError):
+    """Raised when a single line of the body exceeds MAX_LINE_LENGTH characters."""
+
+
+class ImportReport:
+    """Counts of an import run and the details of the first MAX_REPORTED_ERRORS row errors."""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': error})
+
+    def to_dict(self) -> dict:
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errorsTruncated': self.failed > len(self.errors)
+        }
+
+
+async def iter_lines(byte_stream):
+    """Yield (line_number, line) pairs from an async iterator of UTF-8 encoded bytes."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    line_number = 0
+    async for chunk in byte_stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip("\r")
+        if len(buffer) > MAX_LINE_LENGTH:
+            raise LineTooLongError(f"Line {line_number + 1} exceeds {MAX_LINE_LENGTH} characters")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_number + 1, buffer.rstrip("\r")
+
+
+async def iter_ndjson_records(lines):
+    """Yield (line_number, record, error) for every non-empty line of an NDJSON body."""
+    async for line_number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"Invalid JSON: {e.msg}"
+
+
+async def iter_csv_records(lines):
+    """
+    Yield (line_number, record, error) for every row of a CSV body with a header row.
+    Quoted fields may span several lines; line_number is the line the row starts on.
+    """
+    header = None
+    pending, start_line = "", 0
+    async for line_number, line in lines:
+        if pending:
+            pending += "\n" + line
+        else:
+            pending, start_line = line, line_number
+        # An odd number of quotes means a quoted field continues on the next line.
+        if pending.count('"') % 2:
+            if len(pending) > MAX_LINE_LENGTH:
+                raise LineTooLongError(f"Row starting on line {start_line} exceeds {MAX_LINE_LENGTH} characters")
+            continue
+        row_text, pending = pending, ""
+        if not row_text.strip():
+            continue
+
+        values = next(csv.reader([row_text]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start_line, dict(zip(header, values)), None
+
+    if pending:
+        yield start_line, None, "Unterminated quoted field"
+
+
+def whole_number(value) -> int:
+    """
+    Convert a JSON or CSV value to an int like int() does, but raise ValueError for
+    booleans and for floats with a fraction, which int() takes as 1 or truncates.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"Not a whole number: {value}")
+    return int(value)
+
+
+def validate_product(record) -> tuple:
+    """
+    Validate an imported product record.
+    Returns the (product_id, name, description, number_items_in_stock, price) row to insert.
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object")
+    product_id = str(record.get('productId') or '').strip()
+    name = str(record.get('name') or '').strip()
+    description = record.get('description') or ''
+    stock = record.get('numberItemsInStock')
+    price = record.get('price')
+
+    missing = [field for field, value in (('productId', product_id), ('name', name),
+                                          ('numberItemsInStock', stock), ('price', price))
+               if value is None or value == '']
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        stock = whole_number(stock)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid numberItemsInStock value: {stock}")
+    if isinstance(price, bool):
+        raise ValueError(f"Invalid price value: {price}")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid price value: {price}")
+    if not math.isfinite(price):
+        raise ValueError(f"Invalid price value: {price}")
+    if stock < 0 or price < 0:
+        raise ValueError("numberItemsInStock and price must not be negative")
+    return product_id, name, str(description), stock, price
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# The services resolve the database relative to the working directory and set up
+# telemetry when they are imported, so both are prepared before any service import.
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+_workdir = tempfile.mkdtemp(prefix="online_store_tests_")
+os.makedirs(os.path.join(_workdir, "online_store", "db"))
+os.chdir(_workdir)
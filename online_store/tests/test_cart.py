@@ -0,0 +1,104 @@
+import asyncio
+import sqlite3
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from online_store.cart import app as cart_app
+from online_store.cart.reaper import CartReaper
+from online_store.http_client.client import ServiceClient
+from online_store.product import app as product_app
+
+
+@pytest.fixture(scope="module")
+def client():
+    cart_app.init_db()
+    return TestClient(cart_app.app)
+
+
+def test_adding_a_product_again_increments_its_quantity(client):
+    user_id = uuid.uuid4().hex
+    responses = [client.post("/cart", json={
+        "userId": user_id, "productId": "A", "productName": "A", "quantity": quantity
+    }) for quantity in (1, 2, 3)]
+    assert [response.json()["quantity"] for response in responses] == [1, 3, 6]
+    assert len({response.json()["id"] for response in responses}) == 1
+
+    items = client.get("/cart", params={"userId": user_id}).json()
+    assert [(item["productId"], item["quantity"]) for item in items] == [("A", 6)]
+
+
+def test_duplicate_cart_items_are_merged_once():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE cart_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, product_id TEXT NOT NULL,
+            product_name TEXT NOT NULL, quantity INTEGER NOT NULL
+        )
+    ''')
+    conn.executemany("INSERT INTO cart_items (user_id, product_id, product_name, quantity) VALUES (?, ?, ?, ?)", [
+        ("u1", "A", "A", 1), ("u1", "B", "B", 1), ("u1", "A", "A", 2), ("u2", "A", "A", 5), ("u1", "A", "A", 3),
+    ])
+
+    assert cart_app.make_cart_items_unique(conn) == 2
+    assert conn.execute("SELECT id, user_id, product_id, quantity FROM cart_items ORDER BY id").fetchall() == [
+        (1, "u1", "A", 6), (2, "u1", "B", 1), (4, "u2", "A", 5)
+    ]
+    assert cart_app.make_cart_items_unique(conn) == 0
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO cart_items (user_id, product_id, product_name, quantity) VALUES ('u1', 'B', 'B', 1)")
+
+
+def test_reaper_deletes_abandoned_carts_and_returns_their_stock(client):
+    product_app.init_db()
+    products = TestClient(product_app.app)
+    product_id = f"TEST-{uuid.uuid4().hex[:8]}"
+    assert products.post("/products", json={
+        "productId": product_id, "name": product_id, "numberItemsInStock": 10, "price": 1.0
+    }).status_code == 201
+
+    abandoned, active = uuid.uuid4().hex, uuid.uuid4().hex
+    for user_id, item_product_id in ((abandoned, product_id), (abandoned, "GONE"), (active, product_id)):
+        client.post("/cart", json={"userId": user_id, "productId": item_product_id,
+                                   "productName": item_product_id, "quantity": 2})
+    client.post("/cart", json={"userId": active, "productId": "OTHER", "productName": "OTHER", "quantity": 1})
+    with cart_app.db_pool.connection() as conn:
+        # Everything but the active user's OTHER item is two hours old.
+        conn.execute("UPDATE cart_items SET updated_at = ? WHERE user_id IN (?, ?) AND product_id != 'OTHER'",
+                     (time.time() - 7200, abandoned, active))
+        conn.commit()
+
+    product_client = ServiceClient("product", "http://product", transport=httpx.ASGITransport(app=product_app.app))
+    reaper = CartReaper(cart_app.db_pool, cart_app.db_executor, product_client, cart_app.logger,
+                        ttl=3600, batch_size=1)
+    assert asyncio.run(reaper.reap_once()) == 2
+
+    assert client.get("/cart", params={"userId": abandoned}).json() == []
+    assert len(client.get("/cart", params={"userId": active}).json()) == 2
+    stock = products.get("/products/search", params={"q": product_id}).json()["items"][0]["numberItemsInStock"]
+    assert stock == 12
+
+
+def test_patch_applies_all_operations_or_none(client):
+    user_id = uuid.uuid4().hex
+    ids = [client.post("/cart", json={"userId": user_id, "productId": product_id,
+                                      "productName": product_id, "quantity": 1}).json()["id"]
+           for product_id in ("A", "B", "C")]
+
+    response = client.patch("/cart", json=[{"id": ids[0], "quantity": 5}, {"id": -1, "delete": True}])
+    assert response.status_code == 404
+    assert response.json()["detail"].startswith("Op 1:")
+    assert client.patch("/cart", json=[{"id": ids[0], "quantity": 0}]).status_code == 400
+    assert client.patch("/cart", json=[{"id": True, "delete": True}]).status_code == 400
+    assert client.patch("/cart", json=[{"id": ids[0], "quantity": True}]).status_code == 400
+
+    response = client.patch("/cart", json=[{"id": ids[0], "quantity": 5}, {"id": ids[1], "delete": True}])
+    assert response.json() == {"updated": 1, "deleted": 1}
+    items = client.get("/cart", params={"userId": user_id}).json()
+    assert sorted((item["productId"], item["quantity"]) for item in items) == [("A", 5), ("C", 1)]
+
+    assert client.delete("/cart", params={"userId": user_id}).json()["deleted"] == 2
+    assert client.get("/cart", params={"userId": user_id}).json() == []
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from online_store.faults import injection
+from online_store.faults.injection import FaultRule, configure_fault_injection, parse_rules
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(injection, "FAULT_INJECTION_ADMIN_ENABLED", True)
+    app = FastAPI()
+    configure_fault_injection(app, "test")
+
+    @app.delete("/items/{item_id}")
+    async def delete_item(item_id: str):
+        return {"deleted": item_id}
+
+    return TestClient(app)
+
+
+def test_no_rules_is_a_no_op(client):
+    assert client.delete("/items/a").json() == {"deleted": "a"}
+
+
+def test_error_rule_matches_route_method_and_path_params(client):
+    response = client.put("/admin/faults", json=[
+        {"method": "DELETE", "route": "/items/{item_id}", "pathParams": {"item_id": "FAIL"},
+         "errorRate": 1.0, "errorStatus": 503}
+    ])
+    assert response.status_code == 200
+    assert client.delete("/items/FAIL").status_code == 503
+    assert client.delete("/items/ok").status_code == 200
+
+    client.delete("/admin/faults")
+    assert client.delete("/items/FAIL").status_code == 200
+
+
+def test_delay_rule_delays_matching_requests(client):
+    client.put("/admin/faults", json=[{"route": "/items/{item_id}", "delayMs": 200}])
+    start = time.perf_counter()
+    assert client.delete("/items/a").status_code == 200
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_sampled_delays_respect_distribution_bounds():
+    rule = FaultRule("/x", delay_ms=100, jitter_ms=50, distribution="uniform")
+    assert all(0.05 <= rule.sample_delay() <= 0.15 for _ in range(1000))
+    rule = FaultRule("/x", delay_ms=100, distribution="exponential", max_delay_ms=300)
+    assert all(0 <= rule.sample_delay() <= 0.3 for _ in range(1000))
+    assert FaultRule("/x", delay_ms=100, probability=0).sample_delay() == 0
+
+
+def test_invalid_rules_are_rejected(client):
+    with pytest.raises(ValueError):
+        parse_rules([{"route": "/x", "distribution": "pareto"}])
+    assert client.put("/admin/faults", json={"route": "/x"}).status_code == 400
@@ -0,0 +1,73 @@
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from online_store.cart import app as cart_app
+from online_store.database.idempotency import IdempotencyStore
+from online_store.http_client.client import ServiceClient
+from online_store.order import app as order_app
+
+
+@pytest.fixture(scope="module")
+def cart_client():
+    cart_app.init_db()
+    return TestClient(cart_app.app)
+
+
+@pytest.fixture
+def order_client(monkeypatch):
+    order_app.init_db()
+    monkeypatch.setattr(order_app, "cart_client", ServiceClient(
+        "cart", "http://cart", transport=httpx.ASGITransport(app=cart_app.app)))
+    return TestClient(order_app.app)
+
+
+def add_item(cart_client, user_id, key, product_id="A"):
+    return cart_client.post("/cart", headers={"Idempotency-Key": key}, json={
+        "userId": user_id, "productId": product_id, "productName": product_id, "quantity": 1
+    })
+
+
+def test_add_cart_item_is_applied_once_per_key(cart_client):
+    user_id, key = uuid.uuid4().hex, uuid.uuid4().hex
+    first, retry = add_item(cart_client, user_id, key), add_item(cart_client, user_id, key)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(cart_client.get("/cart", params={"userId": user_id}).json()) == 1
+
+    assert add_item(cart_client, user_id, key, product_id="B").status_code == 422
+    assert add_item(cart_client, user_id, "x" * 256).status_code == 400
+
+
+def test_create_order_is_replayed_after_the_cart_was_emptied(cart_client, order_client):
+    user_id, key = uuid.uuid4().hex, uuid.uuid4().hex
+    add_item(cart_client, user_id, uuid.uuid4().hex)
+
+    first = order_client.post("/orders", headers={"Idempotency-Key": key}, json={"userId": user_id})
+    retry = order_client.post("/orders", headers={"Idempotency-Key": key}, json={"userId": user_id})
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert len(order_client.get("/orders", params={"userId": user_id}).json()) == 1
+
+
+def test_expired_keys_are_reused_and_compacted(cart_client):
+    store = IdempotencyStore(cart_app.db_pool, f"test {uuid.uuid4().hex}", ttl=0.05)
+    with cart_app.db_pool.connection() as conn:
+        store.save(conn, "key", "fingerprint", 201, {"n": 1})
+        conn.commit()
+    assert store.find("key", "fingerprint").content == {"n": 1}
+
+    time.sleep(0.1)
+    assert store.find("key", "other") is None
+    with cart_app.db_pool.connection() as conn:
+        store.save(conn, "key", "other", 201, {"n": 2})
+        store.save(conn, "stale", "fingerprint", 201, {})
+        conn.commit()
+    time.sleep(0.1)
+    with cart_app.db_pool.connection() as conn:
+        assert store.compact(conn) == 2
+        conn.commit()
@@ -0,0 +1,112 @@
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from online_store.cart import app as cart_app
+from online_store.http_client.client import ServiceClient
+from online_store.order import app as order_app
+
+
+@pytest.fixture(scope="module")
+def client():
+    order_app.init_db()
+    return TestClient(order_app.app)
+
+
+@pytest.fixture
+def cart_client(monkeypatch):
+    # The Order Service reads carts over HTTP; route those calls to an in-process Cart Service.
+    cart_app.init_db()
+    monkeypatch.setattr(order_app, "cart_client", ServiceClient(
+        "cart", "http://cart", meter=order_app.meter, transport=httpx.ASGITransport(app=cart_app.app)))
+    return TestClient(cart_app.app)
+
+
+def add_order(user_id, order_date, products):
+    with order_app.db_pool.connection() as conn:
+        order_id = conn.execute("INSERT INTO orders (user_id, order_date) VALUES (?, ?)",
+                                (user_id, order_date)).lastrowid
+        conn.executemany("INSERT INTO order_items (order_id, product_id, product_name, quantity) VALUES (?, ?, ?, ?)",
+                         [(order_id, product_id, f"Product {product_id}", 1) for product_id in products])
+        conn.commit()
+    return order_id
+
+
+def test_list_orders_groups_items_and_pages_newest_first(client):
+    user_id = uuid.uuid4().hex
+    first = add_order(user_id, "2025-01-01T00:00:00", ["A", "B"])
+    second = add_order(user_id, "2025-01-02T00:00:00", [])
+    third = add_order(user_id, "2025-01-02T00:00:00", ["C"])
+    add_order(uuid.uuid4().hex, "2025-01-03T00:00:00", ["D"])
+
+    orders = client.get("/orders", params={"userId": user_id}).json()
+    assert [order["orderId"] for order in orders] == [first, second, third]
+    assert [p["productId"] for p in orders[0]["products"]] == ["A", "B"]
+    assert orders[1]["products"] == []
+
+    page = client.get("/orders", params={"userId": user_id, "limit": 1}).json()
+    assert [order["orderId"] for order in page["items"]] == [third]
+    page = client.get("/orders", params={"userId": user_id, "limit": 1, "before": page["nextCursor"]}).json()
+    assert [order["orderId"] for order in page["items"]] == [second]
+    page = client.get("/orders", params={"userId": user_id, "limit": 5, "before": page["nextCursor"]}).json()
+    assert [order["orderId"] for order in page["items"]] == [first]
+    assert page["nextCursor"] is None
+
+    page = client.get("/orders", params={"userId": user_id, "before": "2025-01-02"}).json()
+    assert [order["orderId"] for order in page["items"]] == [first]
+    assert client.get("/orders", params={"userId": user_id, "before": "2025-01-02,x"}).status_code == 400
+
+
+def test_create_order_empties_the_cart_in_the_same_transaction(client, cart_client):
+    user_id = uuid.uuid4().hex
+    for product_id in ("A", "B", "C"):
+        response = cart_client.post("/cart", json={
+            "userId": user_id, "productId": product_id, "productName": f"Product {product_id}", "quantity": 2
+        })
+        assert response.status_code == 201
+
+    response = client.post("/orders", json={"userId": user_id})
+    assert response.status_code == 201
+    assert cart_client.get("/cart", params={"userId": user_id}).json() == []
+    orders = client.get("/orders", params={"userId": user_id}).json()
+    assert [p["productId"] for p in orders[0]["products"]] == ["A", "B", "C"]
+    assert client.post("/orders", json={"userId": user_id}).status_code == 400
+
+
+def test_create_order_conflicts_when_the_cart_changed(client, cart_client, monkeypatch):
+    user_id = uuid.uuid4().hex
+    cart_client.post("/cart", json={"userId": user_id, "productId": "A", "productName": "A", "quantity": 1})
+    stale_cart = cart_client.get("/cart", params={"userId": user_id})
+    item_id = stale_cart.json()[0]["id"]
+    cart_client.delete(f"/cart/{item_id}")
+
+    async def get_stale_cart(*args, **kwargs):
+        return stale_cart
+    monkeypatch.setattr(order_app.cart_client, "get", get_stale_cart)
+
+    assert client.post("/orders", json={"userId": user_id}).status_code == 409
+    assert client.get("/orders", params={"userId": user_id}).json() == []
+
+
+def test_create_order_conflicts_when_a_cart_item_quantity_changed(client, cart_client, monkeypatch):
+    user_id = uuid.uuid4().hex
+    cart_client.post("/cart", json={"userId": user_id, "productId": "A", "productName": "A", "quantity": 1})
+    stale_cart = cart_client.get("/cart", params={"userId": user_id})
+    # Adding the product again raises the quantity of the same cart item.
+    cart_client.post("/cart", json={"userId": user_id, "productId": "A", "productName": "A", "quantity": 2})
+
+    async def get_stale_cart(*args, **kwargs):
+        return stale_cart
+    monkeypatch.setattr(order_app.cart_client, "get", get_stale_cart)
+
+    assert client.post("/orders", json={"userId": user_id}).status_code == 409
+    assert client.get("/orders", params={"userId": user_id}).json() == []
+    cart_items = cart_client.get("/cart", params={"userId": user_id}).json()
+    assert [(item["id"], item["quantity"]) for item in cart_items] == [(stale_cart.json()[0]["id"], 3)]
+
+
+def test_create_order_reports_an_unreachable_cart_service(client, monkeypatch):
+    monkeypatch.setattr(order_app, "cart_client", ServiceClient("cart", "http://127.0.0.1:9", connect_timeout=0.5))
+    assert client.post("/orders", json={"userId": "nobody"}).status_code == 503
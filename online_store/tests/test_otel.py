@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased
+from opentelemetry.trace import StatusCode
+
+from online_store.otel import otel
+from online_store.otel.sampling import SamplingConfig, TailRescueSpanProcessor, create_sampler
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Configures telemetry for three components of one process and reports what it set up.
+# os._exit skips the atexit shutdown, which would try to reach a collector.
+CONFIGURE_COMPONENTS = """
+import json, logging, os, sys
+from fastapi import FastAPI
+from online_store.otel import otel
+app = FastAPI()
+for name in ("Online Store UI", "Order UI", "Cart UI"):
+    instruments = otel.configure_telemetry(app, name, "1.0.0")
+print(json.dumps({
+    "modules": sorted(name for name in sys.modules if name.startswith(("opentelemetry.sdk", "opentelemetry.instrumentation", "grpc"))),
+    "handlers": sum(1 for handler in logging.getLogger().handlers if type(handler).__name__ == "LoggingHandler"),
+    "middleware": sum(1 for middleware in app.user_middleware if "OpenTelemetry" in middleware.cls.__name__),
+    "tracer": type(instruments["tracer"]).__name__,
+}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def configure_in_subprocess(tmp_path, enabled):
+    env = {**os.environ, "PYTHONPATH": PROJECT_ROOT, "OTEL_SDK_DISABLED": "false" if enabled else "true",
+           "OTEL_EXPORTER_OTLP_ENDPOINT": "http://127.0.0.1:9"}
+    result = subprocess.run([sys.executable, "-c", CONFIGURE_COMPONENTS], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_components_share_one_telemetry_pipeline(tmp_path):
+    instruments = otel.configure_telemetry(None, "Test UI", "1.0.0")
+    assert instruments is otel.configure_telemetry(None, "Test UI", "1.0.0")
+    assert instruments["logger"].name == "Test UI-1.0.0"
+
+    report = configure_in_subprocess(tmp_path, enabled=True)
+    assert report["handlers"] == 1
+    assert report["middleware"] == 1
+    assert report["tracer"] != "NoOpTracer"
+
+
+def test_disabled_telemetry_imports_neither_sdk_nor_instrumentation(tmp_path):
+    report = configure_in_subprocess(tmp_path, enabled=False)
+    assert report["modules"] == []
+    assert report["handlers"] == 0
+    assert report["middleware"] == 0
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    # The test session disables the SDK, so trace_span would return functions as they are.
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ParentBased(ALWAYS_ON))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer(__name__), exporter
+
+
+def test_trace_span_covers_functions_coroutines_and_generators(traced):
+    tracer, exporter = traced
+
+    @otel.trace_span("add", tracer, attributes={"add.left": "left", "add.right": "right"})
+    def add(left, right=2):
+        assert trace.get_current_span().is_recording()
+        return left + right
+
+    @otel.trace_span("fetch", tracer, attributes=lambda key: {"fetch.key": key})
+    async def fetch(key):
+        await asyncio.sleep(0)
+        assert trace.get_current_span().is_recording()
+        raise KeyError(key)
+
+    @otel.trace_span("count", tracer)
+    def count(limit):
+        for number in range(limit):
+            assert trace.get_current_span().is_recording()
+            yield number
+
+    @otel.trace_span("stream", tracer)
+    async def stream(limit):
+        for number in range(limit):
+            yield number
+
+    async def collect():
+        return [number async for number in stream(2)]
+
+    assert add(1) == 3
+    with pytest.raises(KeyError):
+        asyncio.run(fetch("missing"))
+    numbers = count(3)
+    assert next(numbers) == 0
+    # The span of a generator is not current while its consumer runs
+    assert not trace.get_current_span().is_recording()
+    assert list(numbers) == [1, 2]
+    assert asyncio.run(collect()) == [0, 1]
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert dict(spans["add"].attributes) == {"add.left": 1, "add.right": 2}
+    assert spans["fetch"].attributes["fetch.key"] == "missing"
+    assert spans["fetch"].status.status_code == StatusCode.ERROR
+    assert spans["fetch"].events[0].name == "exception"
+    assert spans["count"].status.status_code == StatusCode.UNSET
+    assert "stream" in spans
+
+
+def test_trace_span_skips_spans_of_dropped_traces(traced):
+    tracer, exporter = traced
+    calls = []
+
+    @otel.trace_span("work", tracer, attributes=lambda: calls.append("extracted") or {})
+    def work():
+        calls.append("called")
+
+    dropped = trace.NonRecordingSpan(trace.SpanContext(1, 1, is_remote=True, trace_flags=trace.TraceFlags(0)))
+    with trace.use_span(dropped):
+        work()
+    assert calls == ["called"]
+    assert exporter.get_finished_spans() == ()
+
+    work()
+    assert calls == ["called", "extracted", "called"]
+    assert [span.name for span in exporter.get_finished_spans()] == ["work"]
+
+
+@pytest.mark.parametrize("rescues", [False, True])
+def test_trace_span_in_traces_dropped_by_the_service_sampler(monkeypatch, rescues):
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+    config = SamplingConfig(ratio=0.0, keep_errors=rescues, slow_threshold_ms=0)
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=create_sampler(config))
+    provider.add_span_processor(TailRescueSpanProcessor(
+        SimpleSpanProcessor(exporter), keep_errors=config.keep_errors, slow_threshold_ms=config.slow_threshold_ms))
+    tracer = provider.get_tracer(__name__)
+    extracted = []
+
+    @otel.trace_span("work", tracer, attributes=lambda fail: extracted.append(fail) or {"work.fail": fail})
+    def work(fail):
+        if fail:
+            raise ValueError("failed")
+
+    with tracer.start_as_current_span("GET /orders"):
+        work(False)
+    with pytest.raises(ValueError):
+        with tracer.start_as_current_span("GET /orders"):
+            work(True)
+
+    spans = exporter.get_finished_spans()
+    if rescues:
+        # Recorded so the failed trace can be rescued, with its attributes
+        assert extracted == [False, True]
+        assert sorted(span.name for span in spans) == ["GET /orders", "work"]
+        assert [span.attributes["work.fail"] for span in spans if span.name == "work"] == [True]
+    else:
+        assert extracted == []
+        assert spans == ()
@@ -0,0 +1,229 @@
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from online_store.product import app as product_app
+
+WRITERS = 16
+
+
+@pytest.fixture(scope="module")
+def client():
+    product_app.init_db()
+    return TestClient(product_app.app)
+
+
+def add_product(client, stock):
+    product_id = f"TEST-{uuid.uuid4().hex[:8]}"
+    response = client.post("/products", json={
+        "productId": product_id,
+        "name": f"Load test {product_id}",
+        "numberItemsInStock": stock,
+        "price": 1.0
+    })
+    assert response.status_code == 201
+    return product_id
+
+
+def get_stock(client, product_id):
+    products = client.get("/products").json()
+    return next(p["numberItemsInStock"] for p in products if p["productId"] == product_id)
+
+
+def update_stock(client, product_id, qty_change):
+    return client.post("/products/update_stock", json={"productId": product_id, "qty_change": qty_change})
+
+
+def test_update_stock_returns_new_stock(client):
+    product_id = add_product(client, 10)
+    response = update_stock(client, product_id, -3)
+    assert response.status_code == 200
+    assert response.json()["newStock"] == 7
+    assert get_stock(client, product_id) == 7
+
+
+def test_update_stock_by_name_and_errors(client):
+    product_id = add_product(client, 1)
+    name = f"Load test {product_id}"
+    assert client.post("/products/update_stock", json={"productName": name, "qty_change": 2}).json()["newStock"] == 3
+    assert update_stock(client, product_id, -4).status_code == 400
+    assert update_stock(client, "NO-SUCH-PRODUCT", 1).status_code == 404
+    assert client.put("/products/NO-SUCH-PRODUCT", json={"numberItemsInStock": 1}).status_code == 404
+    assert get_stock(client, product_id) == 3
+
+
+def test_concurrent_increments_are_not_lost(client):
+    product_id = add_product(client, 1)
+    with ThreadPoolExecutor(WRITERS) as executor:
+        statuses = list(executor.map(lambda _: update_stock(client, product_id, 1).status_code, range(200)))
+    assert statuses == [200] * 200
+    assert get_stock(client, product_id) == 201
+
+
+def test_concurrent_decrements_never_oversell(client):
+    product_id = add_product(client, 50)
+    with ThreadPoolExecutor(WRITERS) as executor:
+        statuses = list(executor.map(lambda _: update_stock(client, product_id, -1).status_code, range(120)))
+    assert statuses.count(200) == 50
+    assert statuses.count(400) == 70
+    assert get_stock(client, product_id) == 0
+
+
+def test_batch_update_is_all_or_nothing(client):
+    first, second = add_product(client, 5), add_product(client, 2)
+
+    response = client.post("/products/update_stock/batch", json=[
+        {"productId": first, "qty_change": -2},
+        {"productId": second, "qty_change": -3},
+    ])
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Item 1:")
+    assert get_stock(client, first) == 5
+
+    response = client.post("/products/update_stock/batch", json=[
+        {"productId": first, "qty_change": -2},
+        {"productName": f"Load test {second}", "qty_change": 4},
+    ])
+    assert response.status_code == 200
+    assert [item["newStock"] for item in response.json()["items"]] == [3, 6]
+
+
+@pytest.mark.parametrize("qty_change", [-2.9, True])
+def test_stock_updates_reject_fractional_and_boolean_changes(client, qty_change):
+    product_id = add_product(client, 5)
+    assert update_stock(client, product_id, qty_change).status_code == 400
+
+    response = client.post("/products/update_stock/batch", json=[
+        {"productId": product_id, "qty_change": -1},
+        {"productId": product_id, "qty_change": qty_change},
+    ])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Item 1: invalid qty_change value"
+    assert update_stock(client, product_id, -2.0).json()["newStock"] == 3
+
+
+def test_bulk_import_streams_ndjson_and_csv(client):
+    base = uuid.uuid4().hex[:8]
+    ndjson = "\n".join([
+        json.dumps({"productId": f"{base}-1", "name": "Bulk 1", "numberItemsInStock": 3, "price": 1.5}),
+        "{not json",
+        json.dumps({"productId": f"{base}-2", "name": "Bulk 2", "numberItemsInStock": -1, "price": 1}),
+        json.dumps({"productId": f"{base}-1", "name": "Bulk 1 again", "numberItemsInStock": 1, "price": 1}),
+        json.dumps({"productId": f"{base}-5", "name": "Bulk 5", "numberItemsInStock": 2.9, "price": 1}),
+        json.dumps({"productId": f"{base}-6", "name": "Bulk 6", "numberItemsInStock": True, "price": 1}),
+        json.dumps({"productId": f"{base}-7", "name": "Bulk 7", "numberItemsInStock": 4.0, "price": 1}),
+    ])
+    response = client.post("/products/bulk?chunkSize=2", content=ndjson,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["failed"]) == (7, 2, 5)
+    assert [error["line"] for error in report["errors"]] == [2, 3, 4, 5, 6]
+    assert get_stock(client, f"{base}-1") == 3
+    assert get_stock(client, f"{base}-7") == 4
+
+    csv_body = ("productId,name,description,numberItemsInStock,price\n"
+                f'{base}-3,Bulk 3,"two\nlines",7,2.5\n'
+                f"{base}-4,Bulk 4,,1\n")
+    response = client.post("/products/bulk", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["failed"]) == (2, 1, 1)
+    assert report["errors"][0]["line"] == 4
+    assert get_stock(client, f"{base}-3") == 7
+
+    response = client.post("/products/bulk", content="x", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 415
+
+
+def catalog_after_change(client, etag):
+    """Asserts that the catalog changed since etag was served, returns its new ETag and products by id."""
+    response = client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    return response.headers["ETag"], {product["productId"]: product for product in response.json()}
+
+
+def test_catalog_etag_changes_with_every_write(client):
+    response = client.get("/products")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get("/products", headers={"If-None-Match": etag}).status_code == 304
+
+    product_id = add_product(client, 10)
+    etag, products = catalog_after_change(client, etag)
+    assert products[product_id]["numberItemsInStock"] == 10
+    assert client.get("/products", headers={"If-None-Match": etag}).status_code == 304
+
+    # A client still holding the previous ETag gets the new stock, not 304.
+    update_stock(client, product_id, -3)
+    etag, products = catalog_after_change(client, etag)
+    assert products[product_id]["numberItemsInStock"] == 7
+
+    client.post("/products/update_stock/batch", json=[{"productId": product_id, "qty_change": 2}])
+    etag, products = catalog_after_change(client, etag)
+    assert products[product_id]["numberItemsInStock"] == 9
+
+    client.put(f"/products/{product_id}", json={"numberItemsInStock": 4})
+    etag, products = catalog_after_change(client, etag)
+    assert products[product_id]["numberItemsInStock"] == 4
+
+    client.delete(f"/products/{product_id}")
+    etag, products = catalog_after_change(client, etag)
+    assert product_id not in products
+
+
+def test_products_are_paged_by_cursor_with_selected_fields(client):
+    tag = f"Zq{uuid.uuid4().hex[:8]}"
+    product_ids = []
+    for i in range(3):
+        product_ids.append(f"{tag}-{i}")
+        response = client.post("/products", json={"productId": f"{tag}-{i}", "name": f"{tag} {i}",
+                                                  "numberItemsInStock": i + 1, "price": 1.0})
+        assert response.status_code == 201
+    add_product(client, 1)
+
+    params = {"namePrefix": tag, "limit": 2, "fields": "productId,numberItemsInStock"}
+    page = client.get("/products", params=params).json()
+    assert page["items"] == [{"productId": product_ids[0], "numberItemsInStock": 1},
+                             {"productId": product_ids[1], "numberItemsInStock": 2}]
+    page = client.get("/products", params={**params, "after": page["nextCursor"]}).json()
+    assert page == {"items": [{"productId": product_ids[2], "numberItemsInStock": 3}], "nextCursor": None}
+
+    page = client.get("/products", params={"namePrefix": tag.lower()}).json()
+    assert page["items"] == []
+    page = client.get("/products", params={"namePrefix": tag}).json()
+    assert [item["name"] for item in page["items"]] == [f"{tag} {i}" for i in range(3)]
+    assert set(page["items"][0]) == {"productId", "name", "description", "numberItemsInStock", "price"}
+
+    assert client.get("/products", params={"fields": "productId,cost"}).status_code == 400
+    assert client.get("/products", params={"limit": 0}).status_code == 422
+
+
+def test_search_ranks_name_matches_and_follows_updates(client):
+    word = f"zq{uuid.uuid4().hex[:6]}"
+    by_description = add_product(client, 1)
+    client.put(f"/products/{by_description}", json={"numberItemsInStock": 2})
+    with product_app.db_pool.connection() as conn:
+        conn.execute("UPDATE products SET description = ? WHERE product_id = ?", (f"about {word}s", by_description))
+        conn.commit()
+    response = client.post("/products", json={
+        "productId": f"TEST-{word}", "name": f"{word.upper()} widget", "numberItemsInStock": 1, "price": 1.0
+    })
+    assert response.status_code == 201
+
+    page = client.get("/products/search", params={"q": word[:-2], "limit": 1}).json()
+    assert [item["productId"] for item in page["items"]] == [f"TEST-{word}"]
+    page = client.get("/products/search", params={"q": word[:-2], "limit": 1, "offset": page["nextOffset"]}).json()
+    assert [item["productId"] for item in page["items"]] == [by_description]
+    assert page["nextOffset"] is None
+
+    client.delete(f"/products/TEST-{word}")
+    items = client.get("/products/search", params={"q": word}).json()["items"]
+    assert [item["productId"] for item in items] == [by_description]
+    # FTS5 syntax in the input is searched for literally instead of failing the query.
+    assert client.get("/products/search", params={"q": f'{word} NEAR( "'}).status_code == 200
+    assert client.get("/products/search", params={"q": "*"}).json() == {"items": [], "nextOffset": None}
@@ -0,0 +1,31 @@
+import pytest
+
+from online_store.cart import app as cart_app
+from online_store.order import app as order_app
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    cart_app.init_db()
+    order_app.init_db()
+
+
+def query_plan(db_pool, query, params):
+    with db_pool.connection() as conn:
+        return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def test_cart_listing_uses_covering_index():
+    plan = query_plan(cart_app.db_pool, cart_app.CART_ITEMS_BY_USER_QUERY, ("user",))
+    assert len(plan) == 1, plan
+    assert plan[0].startswith("SEARCH") and "USING COVERING INDEX idx_cart_items_user " in plan[0], plan
+
+
+@pytest.mark.parametrize("limit, before", [(None, None), (10, None), (10, "2025-01-01T00:00:00,42")])
+def test_order_listing_searches_indexes_only(limit, before):
+    plan = query_plan(order_app.db_pool, *order_app.orders_query("user", limit, before))
+    assert any(step.startswith("SEARCH orders USING COVERING INDEX idx_orders_user_date ") for step in plan), plan
+    assert any(step.startswith("SEARCH oi USING COVERING INDEX idx_order_items_order ") for step in plan), plan
+    assert not any(step.startswith(("SCAN orders", "SCAN oi")) for step in plan), plan
+    if before is not None:
+        assert any("order_date<?" in step for step in plan), plan
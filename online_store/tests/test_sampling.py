@@ -0,0 +1,54 @@
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+from online_store.otel.sampling import SamplingConfig, TailRescueSpanProcessor, create_sampler
+
+
+@pytest.fixture(autouse=True)
+def sdk_enabled(monkeypatch):
+    # The test session disables the SDK, these tests need a real tracer provider.
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+
+
+def tracer_for(config):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=create_sampler(config))
+    provider.add_span_processor(TailRescueSpanProcessor(
+        SimpleSpanProcessor(exporter), keep_errors=config.keep_errors, slow_threshold_ms=config.slow_threshold_ms))
+    return provider.get_tracer(__name__), exporter
+
+
+def test_route_rate_limits_cap_sampled_traces():
+    config = SamplingConfig(route_rate_limits={"GET /users/summary": 0, "/products": 2}, keep_errors=False,
+                            slow_threshold_ms=0)
+    tracer, exporter = tracer_for(config)
+    for route, method in [("/users/summary", "GET")] * 3 + [("/products", "POST")] * 3 + [("/orders", "GET")] * 3:
+        with tracer.start_as_current_span(f"{method} {route}", attributes={"http.route": route, "http.method": method}):
+            with tracer.start_as_current_span("child"):
+                pass
+    names = [span.name for span in exporter.get_finished_spans()]
+    assert names == ["child", "POST /products"] * 2 + ["child", "GET /orders"] * 3
+
+
+@pytest.mark.parametrize("fail, duration_ms, reason", [(True, 1, "error"), (False, 1500, "slow"), (False, 1, None)])
+def test_dropped_traces_are_rescued_when_failed_or_slow(fail, duration_ms, reason):
+    tracer, exporter = tracer_for(SamplingConfig(ratio=0.0, slow_threshold_ms=1000))
+    root = tracer.start_span("GET /orders", start_time=1_000_000_000)
+    assert root.is_recording() and not root.get_span_context().trace_flags.sampled
+    with tracer.start_as_current_span("child", context=trace.set_span_in_context(root)) as child:
+        if fail:
+            child.set_status(Status(StatusCode.ERROR))
+    root.end(end_time=1_000_000_000 + duration_ms * 1_000_000)
+
+    spans = exporter.get_finished_spans()
+    if reason is None:
+        assert spans == ()
+    else:
+        assert sorted(span.name for span in spans) == ["GET /orders", "child"]
+        assert all(span.context.trace_flags.sampled for span in spans)
+        assert all(span.attributes["sampling.rescue_reason"] == reason for span in spans)
+
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from online_store.otel import settings as telemetry_settings
+from online_store.otel.export import ExportMetrics, MeasuredBatchSpanProcessor, MeasuredSpanExporter
+from online_store.otel.settings import TelemetrySettings
+
+
+@pytest.fixture(autouse=True)
+def sdk_enabled(monkeypatch):
+    # The test session disables the SDK, these tests need real providers.
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+
+
+def test_settings_start_from_the_preset_and_take_env_overrides(monkeypatch):
+    monkeypatch.setattr(telemetry_settings, "TELEMETRY_PRESET", "production")
+    monkeypatch.setenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")
+    monkeypatch.setenv("OTEL_EXPORTER_OTLP_COMPRESSION", "deflate")
+    settings = TelemetrySettings.from_env()
+    assert settings.span_max_queue_size == 4096
+    assert settings.span_max_export_batch_size == telemetry_settings.PRESETS["production"]["span_max_export_batch_size"]
+    assert settings.metric_export_interval_ms == telemetry_settings.PRESETS["production"]["metric_export_interval_ms"]
+    assert settings.compression == "deflate"
+
+    with pytest.raises(ValueError):
+        TelemetrySettings.preset("production", span_max_queue_size=16, span_max_export_batch_size=32)
+    with pytest.raises(ValueError):
+        TelemetrySettings.preset("fastest")
+
+
+class BlockingExporter(SpanExporter):
+    def __init__(self):
+        self.exporting = threading.Event()
+        self.release = threading.Event()
+
+    def export(self, spans):
+        self.exporting.set()
+        self.release.wait(10)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        self.release.set()
+
+
+def metric_points(reader):
+    points = {}
+    for resource_metrics in reader.get_metrics_data().resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                for point in metric.data.data_points:
+                    points[(metric.name, point.attributes.get("export.result"))] = point
+    return points
+
+
+def test_span_processor_reports_dropped_and_exported_spans():
+    reader = InMemoryMetricReader()
+    export_metrics = ExportMetrics()
+    export_metrics.bind(MeterProvider(metric_readers=[reader]).get_meter(__name__))
+    exporter = BlockingExporter()
+    processor = MeasuredBatchSpanProcessor(MeasuredSpanExporter(exporter, export_metrics), export_metrics,
+                                           max_queue_size=4, max_export_batch_size=4, schedule_delay_millis=60000)
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(processor)
+    tracer = tracer_provider.get_tracer(__name__)
+
+    def spans(count):
+        for i in range(count):
+            tracer.start_span(f"span {i}").end()
+
+    # The first batch keeps the worker busy exporting while the queue fills up behind it.
+    spans(4)
+    assert exporter.exporting.wait(10)
+    spans(6)
+    exporter.release.set()
+    tracer_provider.shutdown()
+
+    points = metric_points(reader)
+    assert points[("telemetry_dropped_items_total", None)].value == 2
+    assert points[("telemetry_exported_items_total", "SUCCESS")].value == 8
+    assert points[("telemetry_export_duration_seconds", "SUCCESS")].count == 2
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from werkzeug.security import check_password_hash
+
+from online_store.user import app as user_app
+from online_store.user.hashing import PasswordHasher
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Runs the service entry point as python -m online_store.user does, but instead of serving
+# asks a password hashing worker whether it imported the service.
+RUN_SERVICE = """
+import runpy, uvicorn
+def run(app, **kwargs):
+    from online_store.user import app as user_app
+    executor = user_app.password_hasher._get_executor()
+    # The service's modules, whether imported by name or as the worker's __mp_main__
+    print(executor.submit(eval, "sorted({'fastapi', 'uvicorn', 'online_store.user.app'} & set(__import__('sys').modules))").result())
+    user_app.password_hasher.shutdown()
+uvicorn.run = run
+runpy.run_module("online_store.user", run_name="__main__", alter_sys=True)
+"""
+
+
+@pytest.fixture(scope="module")
+def client():
+    user_app.init_db()
+    return TestClient(user_app.app)
+
+
+def stored_password(user_id):
+    with user_app.db_pool.connection() as conn:
+        return conn.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()["password"]
+
+
+def test_add_and_update_user_store_password_hashes(client):
+    last_name = uuid.uuid4().hex
+    response = client.post("/users", json={
+        "firstName": "Test", "lastName": last_name, "userAlias": "t", "password": "first"
+    })
+    assert response.status_code == 201
+    user_id = response.json()["id"]
+    assert check_password_hash(stored_password(user_id), "first")
+
+    response = client.put("/users", json={
+        "id": user_id, "firstName": "Test", "lastName": last_name, "userAlias": "t", "password": "second"
+    })
+    assert response.status_code == 200
+    assert check_password_hash(stored_password(user_id), "second")
+
+    response = client.put("/users", json={
+        "id": 999999999, "firstName": "Test", "lastName": last_name, "userAlias": "t"
+    })
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("max_workers", [0, 2])
+def test_hasher_uses_the_configured_method(max_workers):
+    hasher = PasswordHasher(max_workers=max_workers, method="pbkdf2:sha256:1000")
+
+    async def hash_all():
+        return await asyncio.gather(*(hasher.hash(f"secret{i}") for i in range(4)))
+    try:
+        hashes = asyncio.run(hash_all())
+    finally:
+        hasher.shutdown()
+    assert all(h.startswith("pbkdf2:sha256:1000$") for h in hashes)
+    assert check_password_hash(hashes[3], "secret3")
+
+
+def add_user(client, first_name, last_name, alias):
+    response = client.post("/users", json={
+        "firstName": first_name, "lastName": last_name, "userAlias": alias, "password": "secret"
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_user_summaries_are_paged_and_searchable(client):
+    tag = uuid.uuid4().hex[:8]
+    ids = [add_user(client, f"Zq{tag}", f"Last {i} {tag}", f"alias{i}") for i in range(3)]
+    alias_id = add_user(client, "Other", f"Person {tag}", f"ZQ{tag}-alias")
+
+    response = client.get("/users/summary", params={"q": f"zq{tag}", "limit": 2})
+    assert response.status_code == 200
+    page = response.json()
+    assert page["items"] == [{"id": ids[0], "name": f"Zq{tag} Last 0 {tag}"},
+                             {"id": ids[1], "name": f"Zq{tag} Last 1 {tag}"}]
+    response = client.get("/users/summary", params={"q": f"zq{tag}", "limit": 2, "after": page["nextCursor"]})
+    page = response.json()
+    assert [item["id"] for item in page["items"]] == [ids[2], alias_id]
+    assert page["nextCursor"] is None
+
+    response = client.get("/users", params={"q": f"Person {tag}"})
+    assert [user["userAlias"] for user in response.json()["items"]] == [f"ZQ{tag}-alias"]
+
+
+def test_user_list_etag_changes_with_users(client):
+    response = client.get("/users/summary")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get("/users/summary", headers={"If-None-Match": etag}).status_code == 304
+
+    user_id = add_user(client, "Etag", uuid.uuid4().hex, "e")
+    response = client.get("/users/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[-1]["id"] == user_id
+    assert client.get("/users").json()[-1]["id"] == user_id
+
+
+def test_user_search_uses_the_name_indexes(client):
+    query, params = user_app.users_page_query(10, 5, "jo")
+    with user_app.db_pool.connection() as conn:
+        plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    for column in user_app.USER_SEARCH_COLUMNS:
+        assert any(f"USING COVERING INDEX idx_users_{column} " in step for step in plan), plan
+    assert not any(step.startswith("SCAN") or "TEMP B-TREE" in step for step in plan), plan
+
+
+def test_hashing_workers_do_not_import_the_service():
+    env = {**os.environ, "PYTHONPATH": PROJECT_ROOT, "PASSWORD_HASH_WORKERS": "1"}
+    result = subprocess.run([sys.executable, "-c", RUN_SERVICE], env=env, capture_output=True, text=True,
+                            timeout=60, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
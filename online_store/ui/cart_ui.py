@@ -4,6 +4,8 @@ import streamlit as st
 import requests
 import pandas as pd
 from online_store.otel.otel import configure_telemetry, trace_span
+from user_options import fetch_user_options
+from idempotency import finish_operation, idempotency_key
 
 SERVICE_VERSION = "1.0.0"
 instruments = configure_telemetry(None, "Cart UI", SERVICE_VERSION)
@@ -14,7 +16,6 @@ logger = instruments["logger"]
 
 # Service URLs from environment variables (with defaults)
 CART_SERVICE_URL = os.environ.get("CART_SERVICE_URL", "http://127.0.0.1:5002")
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://127.0.0.1:5000")
 PRODUCT_SERVICE_URL = os.environ.get("PRODUCT_SERVICE_URL", "http://127.0.0.1:5001")
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://127.0.0.1:5003")
 
@@ -36,16 +37,16 @@ def run_cart_ui():
             st.subheader("List Cart Items")
 
             # CHANGED: Create a child span for fetching user info
+            user_query = st.text_input("Search users", key="cart_user_query").strip()
             with tracer.start_as_current_span("fetch_users") as fetch_users_span:
                 try:
                     headers = {}
                     propagate.inject(headers)  # CHANGED: Propagate current context
-                    user_response = requests.get(f"{USER_SERVICE_URL}/users", timeout=10, headers=headers)
-                    if user_response.status_code != 200:
-                        st.error("Error fetching users: " + user_response.text)
+                    user_options, error = fetch_user_options(headers, user_query)
+                    if error is not None:
+                        st.error("Error fetching users: " + error)
                         return
-                    users_list = user_response.json()
-                    if not users_list:
+                    if not user_options:
                         st.error("No users found.")
                         return
                 except Exception as e:
@@ -54,9 +55,8 @@ def run_cart_ui():
                     return
 
             # Build user select box
-            user_options = [f"{u['id']}: {u['firstName']} {u['lastName']}" for u in users_list]
             selected_user = st.selectbox("Select User", user_options)
-            user_id = selected_user.split(":")[0].strip()
+            user_id, full_name = [part.strip() for part in selected_user.split(":", 1)]
             st.session_state["cart_user_id"] = user_id
 
             # CHANGED: Create a child span for fetching cart items
@@ -71,8 +71,6 @@ def run_cart_ui():
                     return
                 items = cart_response.json()
 
-            user_detail = next((u for u in users_list if str(u.get("id")) == user_id), {})
-            full_name = f"{user_detail.get('firstName', 'Unknown')} {user_detail.get('lastName', '')}"
             st.markdown(f"### Cart Items for {full_name}")
 
             if not items:
@@ -121,6 +119,9 @@ def run_cart_ui():
                 full_df = st.session_state["cart_df_full"]
                 changes_done = False
 
+                # Collect the edited rows first, so all stock changes go out in one batch.
+                # Deleted items return their quantity to stock, changed items the difference.
+                cart_changes = []
                 for idx, edited_row in edited_df.iterrows():
                     try:
                         cart_item_id = full_df.iloc[idx]["id"]
@@ -129,82 +130,61 @@ def run_cart_ui():
                         logger.error("Row index out of range. Please do not add new rows.")
                         continue
 
-                    # If Delete is checked, add stock back, then delete cart item
                     if edited_row["Delete"]:
-                        with tracer.start_as_current_span("delete_cart_item") as delete_span:  # CHANGED
-                            update_payload = {
-                                "productName": edited_row["productName"],
-                                "qty_change": int(edited_row["quantity"])
-                            }
-                            headers = {}
-                            propagate.inject(headers)  # CHANGED
-                            r_stock = requests.post(
-                                f"{PRODUCT_SERVICE_URL}/products/update_stock",
-                                json=update_payload, timeout=10, headers=headers
-                            )
-                            if r_stock.status_code != 200:
-                                error_msg = r_stock.json().get("error", r_stock.text)
-                                logger.error(f"Failed to update stock for product {edited_row['productName']}: {error_msg}")
-                                st.error(f"Failed to update stock for product {edited_row['productName']}: {error_msg}")
-                                continue
-
-                            headers = {}
-                            propagate.inject(headers)
-                            r = requests.delete(
-                                f"{CART_SERVICE_URL}/cart/{cart_item_id}",
-                                timeout=60,
-                                headers=headers
-                            )
-                            if r.status_code != 200:
-                                logger.error(f"Failed to delete cart item with ID {cart_item_id}: {r.text}")
-                                st.error(f"Failed to delete cart item with ID {cart_item_id}")
-                                break
-                            changes_done = True
-
-                    # Otherwise, if quantity changed, update stock + cart item
+                        cart_changes.append((cart_item_id, edited_row, None, int(edited_row["quantity"])))
                     elif edited_row["quantity"] != original_df_display.iloc[idx]["quantity"]:
                         old_qty = int(original_df_display.iloc[idx]["quantity"])
                         new_qty = int(edited_row["quantity"])
-                        diff = new_qty - old_qty
-                        with tracer.start_as_current_span("update_cart_item") as update_cart_item_span: 
-                           
-                            update_payload = {
+                        cart_changes.append((cart_item_id, edited_row, new_qty, old_qty - new_qty))
+
+                stock_updated = True
+                if cart_changes:
+                    with tracer.start_as_current_span("update_stock_batch") as update_stock_span:
+                        update_stock_span.set_attribute("batch_size", len(cart_changes))
+                        update_payload = [
+                            {
+                                "productId": edited_row["productId"],
                                 "productName": edited_row["productName"],
-                                "qty_change": -diff
+                                "qty_change": qty_change
                             }
-                            update_cart_item_span.set_attribute("product_name", edited_row["productName"])
-                            update_cart_item_span.set_attribute("quantity_change", -diff)
-                            headers = {}
-                            propagate.inject(headers)
-                            r_stock = requests.post(
-                                f"{PRODUCT_SERVICE_URL}/products/update_stock",
-                                json=update_payload, timeout=10, headers=headers
-                            )
-                            if r_stock.status_code != 200:
-                                error_msg = r_stock.json().get("error", r_stock.text)
-                                logger.error(f"Failed to update stock for product {edited_row['productName']}: {error_msg}",exc_info=True) 
-                                st.error(f"Failed to update stock for product {edited_row['productName']}: {error_msg}")
-                                break
-
-                            # Update the cart item quantity
-                            payload = {"quantity": new_qty}
-                            headers = {}
-                            propagate.inject(headers)
-                            r = requests.put(
-                                f"{CART_SERVICE_URL}/cart/{cart_item_id}",
-                                json=payload,
-                                timeout=60,
-                                headers=headers
-                            )
-                            if r.status_code != 200:
-                                logger.error(f"Failed to update cart item with ID {cart_item_id}: {r.text}")
-                                st.error(f"Failed to update cart item with ID {cart_item_id}")
-                                break
+                            for _, edited_row, _, qty_change in cart_changes
+                        ]
+                        headers = {}
+                        propagate.inject(headers)
+                        r_stock = requests.post(
+                            f"{PRODUCT_SERVICE_URL}/products/update_stock/batch",
+                            json=update_payload, timeout=10, headers=headers
+                        )
+                        if r_stock.status_code != 200:
+                            error_msg = r_stock.json().get("detail", r_stock.text)
+                            logger.error(f"Failed to update stock for cart changes: {error_msg}")
+                            st.error(f"Failed to update stock: {error_msg}")
+                            stock_updated = False
+                            # Nothing was reserved, so leave the cart untouched.
+                            cart_changes = []
+
+                if cart_changes:
+                    # All deletes and quantity changes are applied by one request in one transaction.
+                    with tracer.start_as_current_span("update_cart_items") as update_cart_items_span:
+                        update_cart_items_span.set_attribute("batch_size", len(cart_changes))
+                        # A quantity changed to 0 removes the item as well.
+                        ops = [
+                            {"id": int(cart_item_id), "delete": True} if not new_qty
+                            else {"id": int(cart_item_id), "quantity": new_qty}
+                            for cart_item_id, _, new_qty, _ in cart_changes
+                        ]
+                        headers = {}
+                        propagate.inject(headers)
+                        r = requests.patch(f"{CART_SERVICE_URL}/cart", json=ops, timeout=60, headers=headers)
+                        if r.status_code != 200:
+                            logger.error(f"Failed to update cart items: {r.text}")
+                            st.error(f"Failed to update cart items: {r.text}")
+                        else:
                             changes_done = True
 
                 if changes_done:
                     st.success("Changes saved successfully!")
-                else:
+                elif stock_updated:
                     st.info("No changes to save.")
 
                 # Clear cart-related session state so the grid reloads next time.
@@ -220,7 +200,10 @@ def run_cart_ui():
                 if "cart_user_id" not in st.session_state:
                     st.error("User ID not found in session state.")
                 else:
-                    headers = {}
+                    # Until the order is created or refused, clicking again retries with the same
+                    # key, so an order whose response was lost is not created twice.
+                    operation = f"create_order:{st.session_state['cart_user_id']}"
+                    headers = {"Idempotency-Key": idempotency_key(operation)}
                     propagate.inject(headers)  # CHANGED
                     payload = {"userId": st.session_state["cart_user_id"]}
 
@@ -233,31 +216,18 @@ def run_cart_ui():
                             headers=headers,
                             timeout=10
                         )
+                    finish_operation(operation, response)
 
                     if response.status_code == 201:
                         order_details = response.json()
                         st.success(f"Order created successfully! Order ID: {order_details.get('orderId')}")
 
-                        # Child span for deleting cart items post-order
-                        with tracer.start_as_current_span("cleanup_cart_items") as cart_cleanup_span:
-                            if "cart_df_full" in st.session_state:
-                                df_full = st.session_state["cart_df_full"]
-                                for idx, row in df_full.iterrows():
-                                    cart_item_id = row["id"]
-                                    headers = {}
-                                    propagate.inject(headers)  
-                                    r_del = requests.delete(
-                                        f"{CART_SERVICE_URL}/cart/{cart_item_id}",
-                                        headers=headers,
-                                        timeout=10
-                                    )
-                                    if r_del.status_code != 200:
-                                        st.error(f"Failed to delete cart item with ID {cart_item_id}")
-                                # Clear cart-related session state.
-                                for key in list(st.session_state.keys()):
-                                    if key.startswith("cart_"):
-                                        del st.session_state[key]
-                            st.info("Cart cleared successfully.")
+                        # The Order Service empties the cart together with creating the order,
+                        # only the cart-related session state is left to clear.
+                        for key in list(st.session_state.keys()):
+                            if key.startswith("cart_"):
+                                del st.session_state[key]
+                        st.info("Cart cleared successfully.")
                     else:
                         try:
                             error_msg = response.json().get("error", response.text)
@@ -304,6 +274,7 @@ def run_cart_ui():
                             if response.status_code == 201:
                                 # Update product stock by removing the quantity.
                                 update_payload = {
+                                    "productId": product_id,
                                     "productName": product_name,
                                     "qty_change": -quantity
                                 }
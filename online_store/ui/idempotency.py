@@ -0,0 +1,22 @@
+import uuid
+import streamlit as st
+
+
+def idempotency_key(operation: str) -> str:
+    """
+    The Idempotency-Key header value of an operation, e.g. "create_order:12".
+    It is kept in the session and reused by every attempt at the operation, clicks
+    and reruns included, so a retry after a timeout or a server error is applied only
+    once. Call finish_operation once a response settles the operation.
+    """
+    keys = st.session_state.setdefault("idempotency_keys", {})
+    return keys.setdefault(operation, str(uuid.uuid4()))
+
+
+def finish_operation(operation: str, response):
+    """
+    Forget the key of an operation answered with a 2xx or 4xx status, so the next
+    attempt is a new operation. On 5xx the outcome is unknown and the key is kept.
+    """
+    if response.status_code < 500:
+        st.session_state.get("idempotency_keys", {}).pop(operation, None)
@@ -12,15 +12,18 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
     
 from online_store.otel.otel import configure_telemetry
+
+SERVICE_VERSION = "1.0.0"
+# Configured before the pages are imported, so the process reports as the Online Store UI
+# and the pages get their own tracers and loggers on its telemetry pipeline.
+instruments = configure_telemetry(None, "Online Store UI", SERVICE_VERSION)
+
 from db_init import initialize_db
 from order_ui import run_order_ui
 from cart_ui import run_cart_ui
 from product_ui import run_product_ui
 from user_ui import run_user_ui
 
-SERVICE_VERSION = "1.0.0"
-instruments = configure_telemetry(None, "Online Store UI", SERVICE_VERSION)
-
 # Get instruments
 tracer = instruments["tracer"]
 logger = instruments["logger"]
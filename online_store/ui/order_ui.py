@@ -3,6 +3,7 @@ import streamlit as st
 import requests
 import pandas as pd
 from online_store.otel.otel import configure_telemetry, trace_span
+from user_options import fetch_user_options
 
 
 SERVICE_VERSION = "1.0.0"
@@ -14,8 +15,8 @@ logger = instruments["logger"]
 
 # Order Service URL (default to port 5003)
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://127.0.0.1:5003")
-# [NEW] User Service URL (default to port 5000)
-USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://127.0.0.1:5000")
+# Number of most recent orders shown for a user.
+ORDER_PAGE_SIZE = int(os.environ.get("ORDER_PAGE_SIZE", "50"))
 
 @trace_span("run_order_ui", tracer)
 def run_order_ui():
@@ -24,19 +25,18 @@ def run_order_ui():
     st.subheader("List My Orders", divider="blue")
 
     # [NEW] Fetch users from the User Service
+    user_query = st.text_input("Search users", key="order_user_query").strip()
     try:
-        user_response = requests.get(f"{USER_SERVICE_URL}/users", timeout=10)
-        if user_response.status_code != 200:
-            st.error("Error fetching users: " + user_response.text)
-            logger.error(f"Error fetching users: {user_response.text}")
+        # Options like "12: John Doe"
+        user_options, error = fetch_user_options({}, user_query)
+        if error is not None:
+            st.error("Error fetching users: " + error)
+            logger.error(f"Error fetching users: {error}")
             return
-        users_list = user_response.json()
-        if not users_list:
+        if not user_options:
             st.error("No users found.")
             logger.info("No users found.")
             return
-        # Build options like "12: John Doe"
-        user_options = [f"{u['id']}: {u['firstName']} {u['lastName']}" for u in users_list]
     except Exception as e:
         st.error("Error retrieving users: " + str(e))
         logger.error(f"Error retrieving users: {e}")
@@ -54,18 +54,22 @@ def run_order_ui():
             return
 
         logger.info(f"Calling Order Service for user ID: {user_id}")
-        # Call the Order service to list orders for this user.
-        response = requests.get(f"{ORDER_SERVICE_URL}/orders", params={"userId": user_id}, timeout=10)
+        # Call the Order service to list the most recent orders for this user.
+        response = requests.get(f"{ORDER_SERVICE_URL}/orders", params={"userId": user_id, "limit": ORDER_PAGE_SIZE},
+                                timeout=10)
         if response.status_code != 200:
             logger.error(f"Error fetching orders for user ID {user_id}: {response.text}")
             st.error("Error fetching orders: " + response.text)
             return
 
-        orders = response.json()
+        page = response.json()
+        orders = page["items"]
         if not orders:
             st.info("No orders found for this user.")
             logger.info(f"No orders found for user ID {user_id}.")
             return
+        if page["nextCursor"] is not None:
+            st.info(f"Showing the {len(orders)} most recent orders.")
 
         # Instead of combining product details into one cell,
         # iterate over orders and display each order in an expander.
@@ -5,6 +5,8 @@ import requests
 import pandas as pd
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 from online_store.otel.otel import configure_telemetry, trace_span
+from user_options import fetch_user_options
+from idempotency import finish_operation, idempotency_key
 
 
 SERVICE_VERSION = "1.0.0"
@@ -16,7 +18,56 @@ logger = instruments["logger"]
 
 PRODUCT_SERVICE_URL = os.environ.get('PRODUCT_SERVICE_URL', 'http://127.0.0.1:5001')
 CART_SERVICE_URL = os.environ.get('CART_SERVICE_URL', 'http://127.0.0.1:5002')
-USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://127.0.0.1:5000')
+PRODUCT_PAGE_SIZE = int(os.environ.get('PRODUCT_PAGE_SIZE', '50'))
+
+def fetch_products(headers):
+    """
+    Fetch the product catalog.
+    The last catalog and its ETag are kept in the session, so on reruns the Product
+    Service answers 304 Not Modified instead of re-sending an unchanged catalog.
+    Returns a tuple of (products, error_text), error_text is None on success.
+    """
+    cached = st.session_state.get("product_catalog")
+    if cached:
+        headers = {**headers, "If-None-Match": cached["etag"]}
+    response = requests.get(f"{PRODUCT_SERVICE_URL}/products", timeout=10, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached["products"], None
+    if response.status_code != 200:
+        return None, response.text
+    products = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        st.session_state["product_catalog"] = {"etag": etag, "products": products}
+    return products, None
+
+def fetch_products_page(headers, after=None):
+    """
+    Fetch one page of the product catalog, starting after the given cursor.
+    Returns a tuple of (products, next_cursor, error_text), error_text is None on success.
+    """
+    params = {"limit": PRODUCT_PAGE_SIZE}
+    if after is not None:
+        params["after"] = after
+    response = requests.get(f"{PRODUCT_SERVICE_URL}/products", params=params, timeout=10, headers=headers)
+    if response.status_code != 200:
+        return None, None, response.text
+    page = response.json()
+    return page["items"], page["nextCursor"], None
+
+def search_products(headers, query, offset=None):
+    """
+    Search the product catalog, best matches first, starting at the given offset.
+    Returns a tuple of (products, next_offset, error_text), error_text is None on success.
+    """
+    params = {"q": query, "limit": PRODUCT_PAGE_SIZE}
+    if offset is not None:
+        params["offset"] = offset
+    response = requests.get(f"{PRODUCT_SERVICE_URL}/products/search", params=params, timeout=10, headers=headers)
+    if response.status_code != 200:
+        return None, None, response.text
+    page = response.json()
+    return page["items"], page["nextOffset"], None
 
 @trace_span("run_product_ui", tracer)
 def run_product_ui():
@@ -75,14 +126,25 @@ def run_product_ui():
         logger.info("Product UI - List Products.")
         st.subheader("List and Select Products")
 
+        search_query = st.text_input("Search products").strip()
+        # Paging starts over whenever the search changes.
+        if st.session_state.get("product_page_query") != search_query:
+            st.session_state["product_page_query"] = search_query
+            st.session_state["product_page_cursors"] = [None]
+
+        # Cursors (search offsets while searching) of the pages visited so far, the last one is the current page.
+        page_cursors = st.session_state.setdefault("product_page_cursors", [None])
+
         # Create a span around the fetch-product flow
         with tracer.start_as_current_span("fetch_products_flow") as fetch_span:
             headers = {}
             propagate.inject(headers)  # CHANGED
-            response = requests.get(f"{PRODUCT_SERVICE_URL}/products", timeout=10, headers=headers)
+            if search_query:
+                products, next_cursor, error = search_products(headers, search_query, offset=page_cursors[-1])
+            else:
+                products, next_cursor, error = fetch_products_page(headers, after=page_cursors[-1])
 
-        if response.status_code == 200:
-            products = response.json()
+        if error is None:
             if products:
                 df = pd.DataFrame(products, columns=[
                     'productId',
@@ -105,6 +167,15 @@ def run_product_ui():
                     height=300
                 )
 
+                prev_col, page_col, next_col = st.columns([1, 2, 1])
+                page_col.write(f"Page {len(page_cursors)}")
+                if prev_col.button("Previous page", disabled=len(page_cursors) == 1):
+                    page_cursors.pop()
+                    st.rerun()
+                if next_col.button("Next page", disabled=next_cursor is None):
+                    page_cursors.append(next_cursor)
+                    st.rerun()
+
                 # Ensure selected_rows is a list
                 selected_rows = grid_response.get("selected_rows")
                 if isinstance(selected_rows, pd.DataFrame):
@@ -125,19 +196,18 @@ def run_product_ui():
                     )
 
                     # CHANGED: Create a span around user fetching
+                    user_query = st.text_input("Search users", key="product_user_query").strip()
                     with tracer.start_as_current_span("fetch_users_flow") as users_span:
                         headers = {}
                         propagate.inject(headers)
                         try:
-                            user_response = requests.get(f"{USER_SERVICE_URL}/users", timeout=10, headers=headers)
-                            if user_response.status_code != 200:
-                                st.error("Error fetching users: " + user_response.text)
-                                logger.error("Error fetching users: %s", user_response.text, exc_info=True)
+                            user_options, error = fetch_user_options(headers, user_query)
+                            if error is not None:
+                                st.error("Error fetching users: " + error)
+                                logger.error("Error fetching users: %s", error, exc_info=True)
                                 return
                             else:
-                                users_list = user_response.json()
-                                if users_list:
-                                    user_options = [f"{u['id']}: {u['firstName']} {u['lastName']}" for u in users_list]
+                                if user_options:
                                     selected_user = st.selectbox("Select User", user_options)
                                     user_id = selected_user.split(":")[0].strip()
                                 else:
@@ -170,13 +240,18 @@ def run_product_ui():
                                     add_cart_span.set_attribute("product_name", selected_product['name'])
                                     add_cart_span.set_attribute("quantity", quantity)
 
-                                    headers = {}
+                                    # Until the item is added or refused, submitting it again retries with
+                                    # the same key, so an item whose response was lost is not added twice.
+                                    operation = f"add_to_cart:{user_id}:{selected_product['productId']}:{quantity}"
+                                    headers = {"Idempotency-Key": idempotency_key(operation)}
                                     propagate.inject(headers)
                                     try:
                                         cart_response = requests.post(f"{CART_SERVICE_URL}/cart", json=cart_payload, timeout=10, headers=headers)
+                                        finish_operation(operation, cart_response)
                                         if cart_response.status_code == 201:
                                             #  Update product stock
                                             update_stock_payload = {
+                                                "productId": selected_product['productId'],
                                                 "productName": selected_product['name'],
                                                 "qty_change": -quantity   # Negative value to decrease stock
                                             }
@@ -208,8 +283,8 @@ def run_product_ui():
                 st.info("No products found.")
                 logger.info("No products found in the Product Service.")
         else:
-            st.error("Error fetching products: " + response.text)
-            logger.error("Error fetching products: %s", response.text, exc_info=True)
+            st.error("Error fetching products: " + error)
+            logger.error("Error fetching products: %s", error, exc_info=True)
 
     # ----------------------------------------------------------------
     # UPDATE PRODUCT
@@ -222,10 +297,9 @@ def run_product_ui():
         with tracer.start_as_current_span("fetch_products_for_update") as fetch_update_span:
             headers = {}
             propagate.inject(headers)
-            response = requests.get(f"{PRODUCT_SERVICE_URL}/products", timeout=10, headers=headers)
+            products, error = fetch_products(headers)
 
-        if response.status_code == 200:
-            products = response.json()
+        if error is None:
             if products:
                 df = pd.DataFrame(products, columns=[
                     'productId',
@@ -289,8 +363,8 @@ def run_product_ui():
                 st.info("No products available for update.")
                 logger.info("No products available for update.")
         else:
-            st.error("Error fetching products: " + response.text)
-            logger.error("Error fetching products: %s", response.text, exc_info=True)
+            st.error("Error fetching products: " + error)
+            logger.error("Error fetching products: %s", error, exc_info=True)
 
     # ----------------------------------------------------------------
     # DELETE PRODUCT
@@ -303,10 +377,9 @@ def run_product_ui():
         with tracer.start_as_current_span("fetch_products_for_delete"):
             headers = {}
             propagate.inject(headers)
-            response = requests.get(f"{PRODUCT_SERVICE_URL}/products", timeout=10, headers=headers)
+            products, error = fetch_products(headers)
 
-        if response.status_code == 200:
-            products = response.json()
+        if error is None:
             if products:
                 df = pd.DataFrame(products, columns=[
                     'productId',
@@ -370,8 +443,8 @@ def run_product_ui():
                 st.info("No products available for deletion.")
                 logger.info("No products available for deletion.")
         else:
-            st.error("Error fetching products: " + response.text)
-            logger.error("Error fetching products: %s", response.text, exc_info=True)
+            st.error("Error fetching products: " + error)
+            logger.error("Error fetching products: %s", error, exc_info=True)
 
 def main():
     logger.info("Product UI - main.")
@@ -0,0 +1,34 @@
+import os
+import streamlit as st
+import requests
+
+USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://127.0.0.1:5000")
+# Users offered in a user selectbox, the search box narrows them down.
+USER_OPTIONS_LIMIT = int(os.environ.get("USER_OPTIONS_LIMIT", "100"))
+
+def fetch_user_options(headers, query=""):
+    """
+    Fetch the id and name of the first USER_OPTIONS_LIMIT users whose first name, last name
+    or alias starts with query, as selectbox options like "12: John Doe".
+    The last result and its ETag are kept in the session, so on reruns the User
+    Service answers 304 Not Modified instead of re-sending unchanged users.
+    Returns a tuple of (options, error_text), error_text is None on success.
+    """
+    params = {"limit": USER_OPTIONS_LIMIT}
+    if query:
+        params["q"] = query
+    cached = st.session_state.get("user_options")
+    if cached and cached["query"] == query:
+        headers = {**headers, "If-None-Match": cached["etag"]}
+    else:
+        cached = None
+    response = requests.get(f"{USER_SERVICE_URL}/users/summary", params=params, timeout=10, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached["options"], None
+    if response.status_code != 200:
+        return None, response.text
+    options = [f"{u['id']}: {u['name']}" for u in response.json()["items"]]
+    etag = response.headers.get("ETag")
+    if etag:
+        st.session_state["user_options"] = {"query": query, "etag": etag, "options": options}
+    return options, None
@@ -14,6 +14,7 @@ logger = instruments["logger"]
 
 # Use environment variable with a fallback default (adjust port as needed)
 BASE_URL = os.environ.get('USER_SERVICE_URL', 'http://127.0.0.1:5000')
+USER_PAGE_SIZE = int(os.environ.get('USER_PAGE_SIZE', '50'))
 
 @trace_span("run_user_ui", tracer)
 def run_user_ui():
@@ -58,14 +59,36 @@ def run_user_ui():
                 logger.info("User UI - Add New User form not submitted.")
     elif action == "User List":
         logger.info("User UI - User List.")
-        # if st.button("Refresh User List"):
-        response = requests.get(f"{BASE_URL}/users", timeout=10)
+        search_query = st.text_input("Search users").strip()
+        # Paging starts over whenever the search changes.
+        if st.session_state.get("user_page_query") != search_query:
+            st.session_state["user_page_query"] = search_query
+            st.session_state["user_page_cursors"] = [None]
+
+        # Cursors of the pages visited so far, the last one is the current page.
+        page_cursors = st.session_state.setdefault("user_page_cursors", [None])
+        params = {"limit": USER_PAGE_SIZE}
+        if search_query:
+            params["q"] = search_query
+        if page_cursors[-1] is not None:
+            params["after"] = page_cursors[-1]
+        response = requests.get(f"{BASE_URL}/users", params=params, timeout=10)
         if response.status_code == 200:
-            users = response.json()
+            page = response.json()
+            users = page["items"]
             if users:
                 df = pd.DataFrame(
                     users, columns=['id', 'firstName', 'lastName', 'userAlias'])
                 st.markdown(df.to_html(index=False), unsafe_allow_html=True)
+
+                prev_col, page_col, next_col = st.columns([1, 2, 1])
+                page_col.write(f"Page {len(page_cursors)}")
+                if prev_col.button("Previous page", disabled=len(page_cursors) == 1):
+                    page_cursors.pop()
+                    st.rerun()
+                if next_col.button("Next page", disabled=page["nextCursor"] is None):
+                    page_cursors.append(page["nextCursor"])
+                    st.rerun()
             else:
                 st.info("No users found.")
         else:
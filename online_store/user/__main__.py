@@ -0,0 +1,10 @@
+# Start the service from the project root folder: python -m online_store.user
+# Started from here rather than from app.py, so the spawned password hashing workers
+# do not import the whole service, see hashing.py.
+import uvicorn
+
+from online_store.user.app import app, init_db
+
+if __name__ == '__main__':
+    init_db()
+    uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -1,14 +1,24 @@
 import os
 import sqlite3
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from werkzeug.security import generate_password_hash
 from online_store.otel.otel import configure_telemetry
+from online_store.database.pool import ConnectionPool
+from online_store.database.bootstrap import bootstrap_database
+from online_store.database.executor import DatabaseExecutor, executor_workers_from_env
+from online_store.database.cache import SnapshotCache, compute_etag, etag_matches, serialize_json
+from online_store.user.hashing import PasswordHasher
 
 SERVICE_VERSION = "1.0.0"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 instruments = configure_telemetry(app, "User Service", SERVICE_VERSION)
 
 # Get instruments
@@ -25,6 +35,19 @@ request_counter = meter.create_counter(
 
 DATABASE = os.path.join(os.getcwd(), 'online_store/db/online_store.db')
 print(f"DB=={DATABASE}")
+db_pool = ConnectionPool(DATABASE, "user", meter=meter)
+# Async handlers run their database work here instead of on the event loop.
+db_executor = DatabaseExecutor("user", meter=meter, max_workers=executor_workers_from_env("user"))
+# Password hashing is CPU bound and runs on its own process pool, see hashing.py.
+password_hasher = PasswordHasher(meter=meter)
+# The full user list and the user summaries, serialized once per change.
+users_cache = SnapshotCache("users", "id", meter=meter)
+user_summaries_cache = SnapshotCache("user_summaries", "id", meter=meter)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Columns matched by the q prefix search, each has a case-insensitive index.
+USER_SEARCH_COLUMNS = ('first_name', 'last_name', 'user_alias')
 
 def init_db():
     logger.info("Initializing User service database...")
@@ -35,33 +58,35 @@ def init_db():
     with tracer.start_as_current_span("init_db for User service") as span:
         logger.info("Creating database connection...")
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    first_name TEXT NOT NULL,
-                    last_name TEXT NOT NULL UNIQUE,
-                    user_alias TEXT NOT NULL,
-                    password TEXT NOT NULL
-                )
-            ''')
-            conn.commit()
-            
-            # Load and execute the SQL script from 'populate_users.sql'
-            sql_file_path = os.path.join(os.path.dirname(__file__), 'populate_users.sql')
-            if not os.path.exists(sql_file_path):
-                logger.error("SQL init users file not found: %s.  The users table will not be initialized.", sql_file_path)
-                #raise HTTPException(status_code=500, detail="SQL init users file not found")
-            with open(sql_file_path, 'r') as file:
-                script_content = file.read()
-            cursor.executescript(script_content)
-            conn.commit()
+            journal_mode = bootstrap_database(db_pool)
+            logger.info("Database journal mode: %s", journal_mode)
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        first_name TEXT NOT NULL,
+                        last_name TEXT NOT NULL UNIQUE,
+                        user_alias TEXT NOT NULL,
+                        password TEXT NOT NULL
+                    )
+                ''')
+                for column in USER_SEARCH_COLUMNS:
+                    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_users_{column} ON users ({column} COLLATE NOCASE)')
+                conn.commit()
+
+                # Load and execute the SQL script from 'populate_users.sql'
+                sql_file_path = os.path.join(os.path.dirname(__file__), 'populate_users.sql')
+                if not os.path.exists(sql_file_path):
+                    logger.error("SQL init users file not found: %s.  The users table will not be initialized.", sql_file_path)
+                    #raise HTTPException(status_code=500, detail="SQL init users file not found")
+                with open(sql_file_path, 'r') as file:
+                    script_content = file.read()
+                cursor.executescript(script_content)
+                conn.commit()
         except sqlite3.Error as e:
             logger.error("Error initializing database: %s", e)
             #raise HTTPException(status_code=500, detail="User database initialization failed") from e
-        finally:
-            conn.close()
         
         span.add_event("User service database initialized successfully.")
         logger.info("Database initialized successfully.")
@@ -86,35 +111,33 @@ class UpdateUserRequest(BaseModel):
     password: str = None
 
 @app.post("/users", status_code=201)
-def add_user(user: AddUserRequest):
+async def add_user(user: AddUserRequest):
     if not all([user.firstName, user.lastName, user.userAlias, user.password]):
         logger.error("Missing required fields in request body for adding user.")
         raise HTTPException(status_code=400, detail="Missing required fields")
     
     request_counter.add(1, attributes={"route": "/users", "method": "POST" })
-    hashed_password = generate_password_hash(user.password)
-    
     with tracer.start_as_current_span("add_user") as span:
+        with tracer.start_as_current_span("hash_password"):
+            hashed_password = await password_hasher.hash(user.password)
         span.set_attribute("user.first_name", user.firstName)
         span.set_attribute("user.last_name", user.lastName)
         span.set_attribute("user.user_alias", user.userAlias)
         
         logger.info(f"Adding user: {user.firstName} {user.lastName} with alias {user.userAlias}")
-        conn = sqlite3.connect(DATABASE)
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
+        def insert_user(conn):
+            cursor = conn.execute('''
                 INSERT INTO users (first_name, last_name, user_alias, password)
                 VALUES (?, ?, ?, ?)
             ''', (user.firstName, user.lastName, user.userAlias, hashed_password))
-            conn.commit()
-            user_id = cursor.lastrowid
+            return cursor.lastrowid
+
+        try:
+            user_id = await db_executor.run(db_pool.run_write, insert_user)
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error adding user: {e}")
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            conn.close()
+        invalidate_user_caches()
 
         return JSONResponse(status_code=201, content={
             'id': user_id,
@@ -123,27 +146,115 @@ def add_user(user: AddUserRequest):
             'userAlias': user.userAlias
         })
 
+def user_item(row):
+    return {
+        'id': row['id'],
+        'firstName': row['first_name'],
+        'lastName': row['last_name'],
+        'userAlias': row['user_alias']
+    }
+
+def user_summary(row):
+    return {'id': row['id'], 'name': f"{row['first_name']} {row['last_name']}"}
+
+def fetch_users():
+    """Read all users, used to (re)load the users cache."""
+    with db_pool.connection() as conn:
+        rows = conn.execute('SELECT id, first_name, last_name, user_alias FROM users ORDER BY id').fetchall()
+    return [user_item(row) for row in rows]
+
+def fetch_user_summaries():
+    """Read the id and name of all users, used to (re)load the user summaries cache."""
+    with db_pool.connection() as conn:
+        rows = conn.execute('SELECT id, first_name, last_name FROM users ORDER BY id').fetchall()
+    return [user_summary(row) for row in rows]
+
+def users_page_query(limit, after, prefix):
+    """
+    Return the query and parameters reading one page of users ordered by id, starting after
+    the given id. With a prefix only users whose first name, last name or alias starts with
+    it (ignoring ASCII case) are read. One extra row tells whether another page follows.
+    """
+    query = 'SELECT id, first_name, last_name, user_alias FROM users WHERE id > ?'
+    params = [after or 0]
+    if prefix:
+        # One index range per column instead of LIKE, which cannot use the indexes.
+        matches = ' UNION ALL '.join(
+            f'SELECT id FROM users WHERE {column} >= ? COLLATE NOCASE AND {column} < ? COLLATE NOCASE'
+            for column in USER_SEARCH_COLUMNS)
+        query += f' AND id IN ({matches})'
+        params += [prefix, prefix + "\U0010ffff"] * len(USER_SEARCH_COLUMNS)
+    query += ' ORDER BY id LIMIT ?'
+    params.append(limit + 1)
+    return query, params
+
+def fetch_users_page(limit, after, prefix, to_item):
+    """Read one page of users, returns the items built by to_item and the cursor of the next page (None on the last page)."""
+    with db_pool.connection() as conn:
+        rows = conn.execute(*users_page_query(limit, after, prefix)).fetchall()
+
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    return [to_item(row) for row in rows[:limit]], next_cursor
+
+def etag_response(request, body, etag):
+    """Return the JSON body with its ETag, or 304 Not Modified if the client already has it."""
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, status_code=200, media_type="application/json", headers=headers)
+
+async def list_users(request, span, cache, loader, to_item, limit, after, prefix):
+    if limit is None and after is None and not prefix:
+        snapshot = cache.get()
+        span.set_attribute("user.cache_hit", snapshot is not None)
+        if snapshot is None:
+            snapshot = await db_executor.run(cache.load, loader)
+        return etag_response(request, snapshot.body, snapshot.etag)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    span.set_attribute("user.page.limit", limit)
+    span.set_attribute("user.page.after", after or 0)
+    if prefix:
+        span.set_attribute("user.page.prefix", prefix)
+    items, next_cursor = await db_executor.run(fetch_users_page, limit, after, prefix, to_item)
+    body = serialize_json({'items': items, 'nextCursor': next_cursor})
+    return etag_response(request, body, compute_etag(body))
+
 @app.get("/users")
-def get_users():
+async def get_users(request: Request,
+                    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+                    after: int = Query(None, ge=0, description="Cursor returned as nextCursor by the previous page"),
+                    q: str = Query(None, description="Only return users whose first name, last name or alias starts with this prefix")):
+    """
+    Without query parameters returns all users as a list.
+    With any of limit, after or q returns one page ordered by id:
+      - items: the users
+      - nextCursor: the value to pass as 'after' for the next page, null on the last page
+    Responses carry an ETag; if the If-None-Match header matches it,
+    304 Not Modified is returned without a body.
+    """
     request_counter.add(1, attributes={"route": "/users", "method": "GET"})
-    logger.info("Fetching all users")
+    logger.info("Fetching users")
     with tracer.start_as_current_span("get_users") as span:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, first_name, last_name, user_alias FROM users')
-        rows = cursor.fetchall()
-        conn.close()
-
-        users = []
-        for row in rows:
-            users.append({
-                'id': row['id'],
-                'firstName': row['first_name'],
-                'lastName': row['last_name'],
-                'userAlias': row['user_alias']
-            })
-        return JSONResponse(content=users)
+        return await list_users(request, span, users_cache, fetch_users, user_item, limit, after, q)
+
+@app.get("/users/summary")
+async def get_user_summaries(request: Request,
+                             limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+                             after: int = Query(None, ge=0, description="Cursor returned as nextCursor by the previous page"),
+                             q: str = Query(None, description="Only return users whose first name, last name or alias starts with this prefix")):
+    """
+    Like GET /users, but returns every user as just its id and display name,
+    e.g. {"id": 12, "name": "John Doe"}, for user pickers.
+    """
+    request_counter.add(1, attributes={"route": "/users/summary", "method": "GET"})
+    with tracer.start_as_current_span("get_user_summaries") as span:
+        return await list_users(request, span, user_summaries_cache, fetch_user_summaries, user_summary,
+                                limit, after, q)
+
+def invalidate_user_caches():
+    users_cache.invalidate()
+    user_summaries_cache.invalidate()
 
 @app.delete("/users")
 def remove_user(user: RemoveUserRequest):
@@ -158,31 +269,29 @@ def remove_user(user: RemoveUserRequest):
         span.set_attribute("user.last_name", user.lastName)
         logger.info(f"Removing user: {user.firstName} {user.lastName}")
         
-        conn = sqlite3.connect(DATABASE)
-        changes = 0
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
+        def delete_user(conn):
+            cursor = conn.execute('''
                 DELETE FROM users 
                 WHERE first_name = ? AND last_name = ?
             ''', (user.firstName, user.lastName))
-            conn.commit()
-            changes = conn.total_changes
+            # total_changes is cumulative for a pooled connection, use the statement's row count.
+            return cursor.rowcount
+
+        try:
+            changes = db_pool.run_write(delete_user)
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error removing user: {e}")
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            conn.close()
 
         if changes == 0:
             logger.error(f"No user found with name: {user.firstName} {user.lastName}") 
             raise HTTPException(status_code=404, detail="No user found with given firstName and lastName")
         else:
+            invalidate_user_caches()
             return JSONResponse(content={'message': 'User removed successfully'})
 
 @app.put("/users")
-def update_user(user: UpdateUserRequest):
+async def update_user(user: UpdateUserRequest):
     if not user.id:
         logger.error("Missing user id in request body for updating user.")
         raise HTTPException(status_code=400, detail="Missing user id")
@@ -197,11 +306,14 @@ def update_user(user: UpdateUserRequest):
         span.set_attribute("user.user_alias", user.userAlias)
         
         logger.info(f"Updating user: {user.id} {user.firstName} {user.lastName} with alias {user.userAlias}")
-        conn = sqlite3.connect(DATABASE)
-        try:    
+        hashed_password = None
+        if user.password:
+            with tracer.start_as_current_span("hash_password"):
+                hashed_password = await password_hasher.hash(user.password)
+
+        def modify_user(conn):
             cursor = conn.cursor()
-            if user.password:
-                hashed_password = generate_password_hash(user.password)
+            if hashed_password:
                 cursor.execute('''
                     UPDATE users 
                     SET first_name = ?, last_name = ?, user_alias = ?, password = ?
@@ -213,20 +325,17 @@ def update_user(user: UpdateUserRequest):
                     SET first_name = ?, last_name = ?, user_alias = ?
                     WHERE id = ?
                 ''', (user.firstName, user.lastName, user.userAlias, user.id))
-            conn.commit()
             if cursor.rowcount == 0:
                 logger.error("No user found with id: %s", user.id)
                 raise HTTPException(status_code=404, detail="User not found")
+
+        try:    
+            await db_executor.run(db_pool.run_write, modify_user)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error updating user: {e}")
-            conn.rollback()
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            conn.close()
+        invalidate_user_caches()
         return JSONResponse(content={'message': 'User updated successfully'})
-#start the service run from the project root folder: python -m online_store.user.app
-if __name__ == '__main__':
-    init_db()
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
-    
\ No newline at end of file
+# The service is started by online_store/user/__main__.py: python -m online_store.user
@@ -0,0 +1,70 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+
+# Passed to werkzeug's generate_password_hash, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Empty uses werkzeug's default. Changing it only affects newly hashed passwords,
+# check_password_hash reads the method from the stored hash.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "")
+# Processes hashing passwords. 0 hashes on a thread instead, which keeps the event loop
+# free but competes with request handling for the GIL.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+
+def hash_password(password: str, method: str) -> str:
+    if method:
+        return generate_password_hash(password, method=method)
+    return generate_password_hash(password)
+
+
+class PasswordHasher:
+    """
+    Hashes passwords on a dedicated process pool, so the CPU-bound key derivation
+    neither blocks the event loop nor holds the GIL while other requests are served.
+    The pool is started on first use.
+    """
+
+    def __init__(self, meter=None, max_workers: int = PASSWORD_HASH_WORKERS, method: str = PASSWORD_HASH_METHOD):
+        if max_workers < 0:
+            raise ValueError("max_workers must not be negative")
+        self.max_workers = max_workers
+        self.method = method
+        self._executor = None
+        self._attributes = {"password.hash.method": method.split(":")[0] or "default"}
+
+        self._duration_histogram = None
+        if meter is not None:
+            self._duration_histogram = meter.create_histogram(
+                name="password_hash_duration_seconds",
+                description="Time to hash a password, including the wait for a free hashing worker",
+                unit="s"
+            )
+
+    def _get_executor(self):
+        if self._executor is None and self.max_workers > 0:
+            # Forking a process that runs exporter threads is unsafe, so workers are spawned. A spawned
+            # worker imports the parent's main module, which is why the service is started from
+            # online_store/user/__main__.py: spawn skips __main__ modules of packages, so workers only
+            # import this module and not the whole service.
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        start_time = time.perf_counter()
+        executor = self._get_executor()
+        if executor is None:
+            hashed = await asyncio.to_thread(hash_password, password, self.method)
+        else:
+            hashed = await asyncio.get_running_loop().run_in_executor(executor, hash_password, password, self.method)
+        if self._duration_histogram is not None:
+            self._duration_histogram.record(time.perf_counter() - start_time, attributes=self._attributes)
+        return hashed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,98 @@
+"""
+Measure POST /users throughput of the User Service for different password hashing pool sizes,
+and the latency of GET /users served meanwhile.
+
+The service runs in-process against a throwaway database, so only hashing and the
+service itself are measured. Run from the project root:
+
+    python scripts/benchmark_password_hashing.py --pool-sizes 0 1 2 4 --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+# Set up in main(): hashing workers are spawned and re-import this module, they must not load the service.
+user_app = None
+
+
+async def signup(client, semaphore):
+    async with semaphore:
+        suffix = uuid.uuid4().hex
+        response = await client.post("/users", json={
+            "firstName": "Bench", "lastName": f"User {suffix}", "userAlias": suffix[:8], "password": suffix
+        })
+        response.raise_for_status()
+
+
+async def read_users(client, stop, latencies):
+    while not stop.is_set():
+        start_time = time.perf_counter()
+        response = await client.get("/users")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start_time)
+        await asyncio.sleep(0.01)
+
+
+async def run(pool_size, requests, concurrency, method):
+    from online_store.user.hashing import PasswordHasher
+    user_app.password_hasher = PasswordHasher(max_workers=pool_size, method=method)
+    transport = httpx.ASGITransport(app=user_app.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://user") as client:
+            # Start the pool's workers before measuring.
+            await user_app.password_hasher.hash("warm up")
+            semaphore = asyncio.Semaphore(concurrency)
+            stop = asyncio.Event()
+            latencies = []
+            reader = asyncio.create_task(read_users(client, stop, latencies))
+            start_time = time.perf_counter()
+            await asyncio.gather(*(signup(client, semaphore) for _ in range(requests)))
+            elapsed = time.perf_counter() - start_time
+            stop.set()
+            await reader
+    finally:
+        user_app.password_hasher.shutdown()
+
+    p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+    p99 = max(latencies) * 1000 if len(latencies) < 100 else statistics.quantiles(latencies, n=100)[98] * 1000
+    print(f"{pool_size:>9} {requests / elapsed:>12.1f} {p50:>15.1f} {p99:>15.1f}")
+
+
+def main():
+    global user_app
+    # The service resolves its database relative to the working directory when imported.
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    workdir = tempfile.mkdtemp(prefix="online_store_benchmark_")
+    os.makedirs(os.path.join(workdir, "online_store", "db"))
+    os.chdir(workdir)
+    from online_store.user import app as user_app
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user_app.logger.setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="PASSWORD_HASH_WORKERS values to compare, 0 hashes on a thread")
+    parser.add_argument("--requests", type=int, default=200, help="POST /users requests per pool size")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent POST /users requests")
+    parser.add_argument("--method", default=os.environ.get("PASSWORD_HASH_METHOD", ""),
+                        help="Hash method, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000 (default: werkzeug's)")
+    args = parser.parse_args()
+
+    user_app.init_db()
+    print(f"method={args.method or 'default'} requests={args.requests} concurrency={args.concurrency}")
+    print(f"{'pool size':>9} {'signups/s':>12} {'GET p50 (ms)':>15} {'GET p99 (ms)':>15}")
+    for pool_size in args.pool_sizes:
+        asyncio.run(run(pool_size, args.requests, args.concurrency, args.method))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Measure how long importing each service takes, with telemetry disabled and enabled, using
+python -X importtime, and list the modules taking most of it.
+
+Every run imports the service in a fresh interpreter from a throwaway working directory, so
+nothing is cached between runs but the bytecode. Run from the project root:
+
+    python scripts/benchmark_startup.py --services product cart order user --runs 5 --top 10
+
+The report of the last run is checked in as scripts/startup_importtime.md, regenerate it with
+--output scripts/startup_importtime.md to compare a change against it.
+"""
+import argparse
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# os._exit skips the atexit telemetry shutdown, which would wait on an unreachable collector.
+IMPORT_SERVICE = "import os, online_store.{service}.app; os._exit(0)"
+
+
+def import_times(service, telemetry, workdir):
+    """Returns the self and cumulative import time in microseconds of every module the service imports."""
+    env = {**os.environ, "PYTHONPATH": PROJECT_ROOT, "OTEL_SDK_DISABLED": "false" if telemetry else "true",
+           "OTEL_EXPORTER_OTLP_ENDPOINT": "http://127.0.0.1:9"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_SERVICE.format(service=service)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(service, telemetry, runs, top, workdir):
+    """Returns the median and minimum import time of the service in ms, and its slowest packages."""
+    totals = []
+    cumulative = {}
+    for _ in range(runs):
+        times = import_times(service, telemetry, workdir)
+        totals.append(times[f"online_store.{service}.app"][1])
+        for name, (_, cumulative_us) in times.items():
+            cumulative.setdefault(name, []).append(cumulative_us)
+    # Top level packages only, their submodules are part of their cumulative time.
+    packages = {name: statistics.median(values) / 1000 for name, values in cumulative.items()
+                if ("." not in name or name.startswith("online_store.")) and name != f"online_store.{service}.app"}
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return statistics.median(totals) / 1000, min(totals) / 1000, slowest
+
+
+def environment():
+    from importlib.metadata import version
+    packages = ", ".join(f"{package} {version(package)}" for package in ("fastapi", "httpx", "opentelemetry-sdk"))
+    return f"Python {platform.python_version()} on {platform.platform()}, CPU count {os.cpu_count()}; {packages}"
+
+
+def markdown_report(results, runs):
+    lines = [
+        "# Service start-up import times",
+        "",
+        "Generated by `python " + " ".join(["scripts/benchmark_startup.py"] + sys.argv[1:]) + "`",
+        f"from the project root, {runs} runs per service and telemetry mode, with warm bytecode caches.",
+        f"Environment: {environment()}.",
+        "",
+        "| Service | Telemetry | Median (ms) | Min (ms) |",
+        "|---|---|---:|---:|",
+    ]
+    lines += [f"| {service} | {telemetry} | {median:.0f} | {minimum:.0f} |"
+              for service, telemetry, median, minimum, _ in results]
+    for service, telemetry, _, _, slowest in results:
+        lines += ["", f"## {service}, telemetry {telemetry}", "", "| Package | Cumulative (ms) |", "|---|---:|"]
+        lines += [f"| {name} | {cumulative_ms:.1f} |" for name, cumulative_ms in slowest]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--services", nargs="+", default=["product", "cart", "order", "user"],
+                        choices=["product", "cart", "order", "user"], help="Services to import")
+    parser.add_argument("--runs", type=int, default=5, help="Imports per service and telemetry mode")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list per service")
+    parser.add_argument("--telemetry", nargs="+", default=["off", "on"], choices=["off", "on"],
+                        help="Telemetry modes to compare")
+    parser.add_argument("--output", help="Also write the report as Markdown to this file, "
+                                         "e.g. scripts/startup_importtime.md")
+    args = parser.parse_args()
+
+    # The services resolve their database relative to the working directory when imported.
+    workdir = tempfile.mkdtemp(prefix="online_store_benchmark_")
+    os.makedirs(os.path.join(workdir, "online_store", "db"))
+    results = []
+    for service in args.services:
+        for telemetry in args.telemetry:
+            median, minimum, slowest = measure(service, telemetry == "on", args.runs, args.top, workdir)
+            results.append((service, telemetry, median, minimum, slowest))
+            print(f"{service} (telemetry {telemetry}): median {median:.0f} ms, min {minimum:.0f} ms over {args.runs} runs")
+            for name, cumulative_ms in slowest:
+                print(f"    {cumulative_ms:>8.1f} ms  {name}")
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(markdown_report(results, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure the per-call overhead of the trace_span decorator: for a plain function, with telemetry
+disabled, in a sampled trace, and in a trace the sampler dropped with and without skip_unsampled.
+
+The tracer provider has no span processor, so only the cost of creating sampled spans is
+measured, not their export. Run from the project root:
+
+    python scripts/benchmark_trace_span.py --calls 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased
+
+
+def work(user_id, quantity=1):
+    return quantity
+
+
+async def async_work(user_id, quantity=1):
+    return quantity
+
+
+def per_call_ns(func, calls):
+    start_time = time.perf_counter_ns()
+    for _ in range(calls):
+        func("user", quantity=2)
+    return (time.perf_counter_ns() - start_time) / calls
+
+
+def async_per_call_ns(func, calls):
+    async def run():
+        start_time = time.perf_counter_ns()
+        for _ in range(calls):
+            await func("user", quantity=2)
+        return (time.perf_counter_ns() - start_time) / calls
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100_000, help="Calls per case")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from online_store.otel.otel import trace_span
+
+    tracer = TracerProvider(sampler=ParentBased(ALWAYS_ON)).get_tracer(__name__)
+    attributes = {"cart.user_id": "user_id", "cart.quantity": "quantity"}
+    dropped = trace.NonRecordingSpan(trace.SpanContext(1, 1, is_remote=True, trace_flags=trace.TraceFlags(0)))
+
+    os.environ["OTEL_SDK_DISABLED"] = "true"
+    disabled, async_disabled = trace_span("work", tracer)(work), trace_span("work", tracer)(async_work)
+    os.environ["OTEL_SDK_DISABLED"] = "false"
+    cases = [
+        ("plain function", work, async_work, None),
+        ("telemetry disabled", disabled, async_disabled, None),
+        ("sampled", trace_span("work", tracer)(work), trace_span("work", tracer)(async_work), None),
+        ("sampled, attributes", trace_span("work", tracer, attributes=attributes)(work),
+         trace_span("work", tracer, attributes=attributes)(async_work), None),
+        ("dropped, attributes", trace_span("work", tracer, attributes=attributes, skip_unsampled=False)(work),
+         trace_span("work", tracer, attributes=attributes, skip_unsampled=False)(async_work), dropped),
+        ("dropped, skip_unsampled", trace_span("work", tracer, attributes=attributes)(work),
+         trace_span("work", tracer, attributes=attributes)(async_work), dropped),
+    ]
+
+    print(f"calls={args.calls}")
+    print(f"{'case':<25} {'sync (ns/call)':>15} {'async (ns/call)':>16}")
+    for name, func, async_func, parent in cases:
+        with trace.use_span(parent or trace.INVALID_SPAN):
+            sync_ns = per_call_ns(func, args.calls)
+            async_ns = async_per_call_ns(async_func, args.calls)
+        print(f"{name:<25} {sync_ns:>15.0f} {async_ns:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()